@@ -14,6 +14,15 @@ from routes.payments import blp as PaymentsBLP
 from routes.promotions import blp as PromotionsBLP  
 from routes.reports import blp as ReportsBLP
 from oauth_client import register_oauth
+from cli import register_commands
+from metrics import init_metrics
+from query_profiler import init_profiler
+from replicas import configure_binds, init_replicas
+from passwords import init_passwords
+from response_compression import init_compression
+from scheduler import init_scheduler
+from serialization import FastJSONProvider
+import rollups  # Registra los listeners que mantienen los reportes al día
 
 def create_app():
     app = Flask(__name__)
@@ -28,7 +37,13 @@ def create_app():
     app.config["API_VERSION"] = config.API_VERSION
     app.config["OPENAPI_VERSION"] = config.OPENAPI_VERSION
 
+    # JSON con orjson cuando está instalado (init_metrics lo cambia por la versión que mide tiempos)
+    app.json = FastJSONProvider(app)
+
+    # Réplicas de lectura (binds replica_N) para los handlers @read_only
+    configure_binds(app)
     db.init_app(app)
+    init_replicas(app)
     
     # Inicializar Migrate correctamente ahora que está importado
     migrate = Migrate(app, db)
@@ -37,6 +52,22 @@ def create_app():
 
     # Inicializar OAuth (SSO)
     register_oauth(app)
+
+    # Comandos de mantenimiento (flask geo-backfill, etc.)
+    register_commands(app)
+
+    # Latencias, SQL y tamaños por endpoint en /metrics
+    init_metrics(app)
+    init_profiler(app)
+
+    # gzip/brotli/zstd según Accept-Encoding (después de init_metrics para medir el tamaño final)
+    init_compression(app)
+
+    # Hash de contraseñas fuera del worker (503 si el pool está lleno)
+    init_passwords(app)
+
+    # Calendario de capacidad al bloque actual y reservas vencidas (un solo worker a la vez)
+    init_scheduler(app)
     
     api = Api(app)
     
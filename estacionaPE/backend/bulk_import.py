@@ -0,0 +1,230 @@
+import csv
+import json
+from itertools import islice
+from marshmallow import ValidationError
+from sqlalchemy import select, bindparam, text
+from sqlalchemy.exc import SQLAlchemyError
+from db import db
+from models import Parking, ParkingSearchTerm
+from schemas import ParkingCreate
+from geo import cell_for
+import text_search
+import signals
+
+# ============================================================
+# IMPORTACIÓN MASIVA DE COCHERAS (CSV / NDJSON)
+# ============================================================
+# Lee el archivo como stream, valida por lotes con ParkingCreate y escribe
+# cada lote con un solo INSERT/UPDATE tipo executemany en su propia
+# transacción. Una fila inválida solo se reporta; no detiene el resto.
+# Las filas sin `id` necesitan el id generado para sus trigramas: se
+# insertan con RETURNING donde existe y en MySQL con INSERT de varias filas,
+# deduciendo los ids desde el primero (ver _insert_returning_ids).
+# Con upsert=True las filas que traen `id` existente se actualizan.
+# Si la base rechaza el lote (owner_id inexistente, id repetido) se reintenta
+# de a una fila con savepoints y solo se reportan las que fallan.
+#
+# Los INSERT de Core no pasan por los listeners del modelo, así que aquí
+# mismo se calcula geo_cell y se escriben los trigramas del buscador.
+
+DEFAULT_CHUNK = 1000
+MAX_REPORTED_ERRORS = 1000
+MULTI_VALUES_ROWS = 1000        # Filas por INSERT de varias filas (MySQL)
+
+_parkings = Parking.__table__
+_terms = ParkingSearchTerm.__table__
+
+
+def iter_records(text_stream, fmt):
+    """Genera (número de fila, dict) sin cargar el archivo completo"""
+    if fmt == "csv":
+        for n, row in enumerate(csv.DictReader(text_stream), start=2):
+            # En CSV una celda vacía significa "sin dato"
+            yield n, {k.strip(): v for k, v in row.items() if k and v not in ("", None)}
+    elif fmt == "ndjson":
+        for n, line in enumerate(text_stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield n, json.loads(line)
+            except ValueError as e:
+                yield n, e
+    else:
+        raise ValueError("Formato no soportado (usa csv o ndjson)")
+
+
+def _validate(rows, schema, upsert):
+    valid, errors = [], []
+    for n, record in rows:
+        if isinstance(record, Exception):
+            errors.append({"row": n, "errors": {"_json": [str(record)]}})
+            continue
+        try:
+            raw_id = record.pop("id", None) if isinstance(record, dict) else None
+            data = schema.load(record)
+        except ValidationError as e:
+            errors.append({"row": n, "errors": e.messages})
+            continue
+        if data["available"] > data["capacity"]:
+            data["available"] = data["capacity"]
+        data["geo_cell"] = cell_for(data["lat"], data["lng"])
+        if upsert and raw_id not in (None, ""):
+            try:
+                data["id"] = int(raw_id)
+            except (TypeError, ValueError):
+                errors.append({"row": n, "errors": {"id": ["Not a valid integer."]}})
+                continue
+        valid.append((n, data))
+    return valid, errors
+
+
+def _term_rows(parking_id, data):
+    return [{"parking_id": parking_id, "term": t} for t in text_search.parking_terms(_Row(data))]
+
+
+class _Row:
+    def __init__(self, data):
+        self.__dict__.update(data)
+
+    def __getattr__(self, name):
+        return None
+
+
+def _insert_returning_ids(rows):
+    """INSERT de filas sin id; devuelve los ids generados en el mismo orden"""
+    dialect = db.session.connection().dialect
+    if dialect.insert_executemany_returning_sort_by_parameter_order:
+        return list(db.session.scalars(
+            _parkings.insert().returning(_parkings.c.id, sort_by_parameter_order=True), rows))
+    # MySQL no tiene RETURNING: un INSERT de varias filas deja en lastrowid el
+    # id de la primera y las demás siguen de a @@auto_increment_increment,
+    # salvo que otro INSERT concurrente se intercale (innodb_autoinc_lock_mode=2).
+    # Se comprueba releyendo esos ids; si alguno no es la fila esperada, ese
+    # tramo se deshace (savepoint) y va de a una fila.
+    step = db.session.execute(text("SELECT @@auto_increment_increment")).scalar()
+    ids = []
+    for i in range(0, len(rows), MULTI_VALUES_ROWS):
+        part = rows[i:i + MULTI_VALUES_ROWS]
+        savepoint = db.session.begin_nested()
+        first = db.session.execute(_parkings.insert().values(part)).lastrowid
+        expected = [first + n * step for n in range(len(part))]
+        stored = {r.id: tuple(r[1:]) for r in db.session.execute(
+            select(_parkings.c.id, *(_parkings.c[f] for f in text_search.SEARCH_FIELDS))
+            .where(_parkings.c.id.between(expected[0], expected[-1]))
+        )}
+        if all(stored.get(pid) == tuple(d.get(f) for f in text_search.SEARCH_FIELDS)
+               for pid, d in zip(expected, part)):
+            savepoint.commit()
+            ids += expected
+        else:
+            savepoint.rollback()
+            ids += [db.session.execute(_parkings.insert(), d).inserted_primary_key[0] for d in part]
+    return ids
+
+
+def _write_chunk(valid):
+    """Inserta/actualiza un lote sin confirmar. Devuelve (insertados, actualizados, ids)"""
+    with_id = [d for _, d in valid if "id" in d]
+    existing = set()
+    if with_id:
+        existing = set(db.session.scalars(
+            select(Parking.id).where(Parking.id.in_([d["id"] for d in with_id]))
+        ))
+
+    to_update = [d for d in with_id if d["id"] in existing]
+    to_insert_with_id = [d for d in with_id if d["id"] not in existing]
+    # Copias: reciben el id generado y el lote puede reintentarse fila por fila
+    to_insert = [dict(d) for _, d in valid if "id" not in d]
+
+    touched_ids = []
+
+    # UPDATE por lotes (agrupando filas con las mismas columnas)
+    by_keys = {}
+    for d in to_update:
+        by_keys.setdefault(tuple(sorted(d)), []).append(d)
+    for keys, rows in by_keys.items():
+        cols = [k for k in keys if k != "id"]
+        db.session.execute(
+            _parkings.update().where(_parkings.c.id == bindparam("b_id"))
+            .values({k: bindparam("b_" + k) for k in cols}),
+            [{"b_" + k: v for k, v in d.items()} for d in rows]
+        )
+    if to_update:
+        ids = [d["id"] for d in to_update]
+        db.session.execute(_terms.delete().where(_terms.c.parking_id.in_(ids)))
+        touched_ids += ids
+
+    # INSERT por lotes; las filas sin id necesitan el id generado para sus trigramas
+    by_keys = {}
+    for d in to_insert_with_id:
+        by_keys.setdefault(tuple(sorted(d)), []).append(d)
+    for group in by_keys.values():
+        db.session.execute(_parkings.insert(), group)
+    by_keys = {}
+    for d in to_insert:
+        by_keys.setdefault(tuple(sorted(d)), []).append(d)
+    for group in by_keys.values():
+        for d, new_id in zip(group, _insert_returning_ids(group)):
+            d["id"] = new_id
+
+    terms = []
+    for d in to_update + to_insert_with_id + to_insert:
+        terms += _term_rows(d["id"], d)
+    touched_ids += [d["id"] for d in to_insert_with_id + to_insert]
+
+    if terms:
+        db.session.execute(_terms.insert(), terms)
+    return len(to_insert) + len(to_insert_with_id), len(to_update), touched_ids
+
+
+def _write_rows(valid):
+    """Como _write_chunk pero cada fila en su savepoint. Devuelve (insertados, actualizados, ids, errores)"""
+    inserted = updated = 0
+    ids, errors = [], []
+    for n, d in valid:
+        savepoint = db.session.begin_nested()
+        try:
+            i, u, touched = _write_chunk([(n, d)])
+        except SQLAlchemyError as e:
+            savepoint.rollback()
+            errors.append({"row": n, "errors": {"_db": [str(getattr(e, "orig", e))]}})
+            continue
+        savepoint.commit()
+        inserted, updated, ids = inserted + i, updated + u, ids + touched
+    db.session.commit()
+    return inserted, updated, ids, errors
+
+
+def import_parkings(text_stream, fmt, chunk_size=DEFAULT_CHUNK, upsert=False):
+    """Importa cocheras desde un stream de texto. Devuelve un resumen con errores por fila."""
+    schema = ParkingCreate()
+    records = iter_records(text_stream, fmt)
+    summary = {"inserted": 0, "updated": 0, "failed": 0, "errors": []}
+
+    def report(errors):
+        summary["failed"] += len(errors)
+        room = MAX_REPORTED_ERRORS - len(summary["errors"])
+        summary["errors"].extend(errors[:max(room, 0)])
+
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            break
+        valid, errors = _validate(chunk, schema, upsert)
+        report(errors)
+        if not valid:
+            continue
+        try:
+            inserted, updated, ids = _write_chunk(valid)
+            db.session.commit()
+        except SQLAlchemyError:
+            db.session.rollback()
+            inserted, updated, ids, errors = _write_rows(valid)
+            report(errors)
+        summary["inserted"] += inserted
+        summary["updated"] += updated
+        if ids:
+            signals.parking_changed.send("bulk_import", parking_ids=ids)
+
+    return summary
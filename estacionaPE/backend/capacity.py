@@ -0,0 +1,248 @@
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import bindparam, case, func, select
+from db import db
+from models import CapacityBucket, CapacityRoll, Parking, Reservation
+import slots
+import signals
+
+# ============================================================
+# CALENDARIO DE CAPACIDAD POR BLOQUES DE TIEMPO
+# ============================================================
+# Cada cochera tiene un contador de espacios reservados por bloque de 15
+# minutos (`parking_capacity_buckets`). Reservar una ventana es incrementar
+# sus bloques con un solo UPDATE condicional (reserved < capacity), sin
+# recorrer la tabla de reservas.
+#
+# `Parking.available` sigue siendo el contador en vivo (entradas/salidas).
+# Refleja el bloque guardado en `capacity_roll`; `roll()` lo avanza al bloque
+# actual aplicando la diferencia de reservas entre ambos bloques (un worker lo
+# corre cada SCHEDULER_INTERVAL_S, ver scheduler.py).
+# `rebuild()` rehace el calendario y deja available en capacidad - reservas
+# del bloque actual - autos sin reserva (entrypoint.sh la corre la primera vez).
+
+BUCKET_MINUTES = 15
+RETENTION_BUCKETS = 96          # Bloques pasados que se conservan (1 día)
+ACTIVE_STATUSES = ("reserved", "paid", "pending")
+MAX_WINDOW = timedelta(days=31)  # Ventana máxima de una reserva o consulta de disponibilidad
+
+_EPOCH = datetime(2000, 1, 1)
+_table = CapacityBucket.__table__
+
+
+def bucket_of(dt):
+    """Número de bloque que contiene la fecha"""
+    return int((dt - _EPOCH).total_seconds() // (BUCKET_MINUTES * 60))
+
+
+def bucket_start(bucket):
+    return _EPOCH + timedelta(minutes=bucket * BUCKET_MINUTES)
+
+
+def window_buckets(start, end):
+    """Bloques que ocupa la ventana [start, end)"""
+    if end is None or end <= start:
+        return [bucket_of(start)]
+    return list(range(bucket_of(start), bucket_of(end - timedelta(microseconds=1)) + 1))
+
+
+def window_error(start, end):
+    """Mensaje de error si la ventana excede MAX_WINDOW, o None"""
+    if end is not None and end - start > MAX_WINDOW:
+        return f"La ventana no puede superar {MAX_WINDOW.days} días."
+    return None
+
+
+def live_bucket(now):
+    """Bloque que refleja hoy Parking.available (se inicializa la primera vez)"""
+    state = db.session.get(CapacityRoll, 1)
+    if state is not None:
+        return state.last_bucket
+    # Otro worker puede estar creándola a la vez: el que llega segundo no la
+    # pisa y lee la ya confirmada (lectura con bloqueo, no la foto de la transacción)
+    roll_table = CapacityRoll.__table__
+    db.session.execute(
+        roll_table.insert().prefix_with("IGNORE", dialect="mysql").prefix_with("OR IGNORE", dialect="sqlite")
+        .values(id=1, last_bucket=bucket_of(now))
+    )
+    return db.session.execute(
+        select(roll_table.c.last_bucket).where(roll_table.c.id == 1).with_for_update()
+    ).scalar_one()
+
+
+def book(parking, start, end):
+    """Suma la reserva a sus bloques. False si algún bloque ya está lleno."""
+    buckets = window_buckets(start, end)
+    db.session.execute(
+        _table.insert().prefix_with("IGNORE", dialect="mysql").prefix_with("OR IGNORE", dialect="sqlite"),
+        [{"parking_id": parking.id, "bucket": b, "reserved": 0} for b in buckets]
+    )
+    result = db.session.execute(
+        _table.update()
+        .where(_table.c.parking_id == parking.id,
+               _table.c.bucket.in_(buckets),
+               _table.c.reserved < parking.capacity)
+        .values(reserved=_table.c.reserved + 1)
+    )
+    return result.rowcount == len(buckets)
+
+
+def unbook(parking_id, start, end):
+    db.session.execute(
+        _table.update()
+        .where(_table.c.parking_id == parking_id,
+               _table.c.bucket.in_(window_buckets(start, end)),
+               _table.c.reserved > 0)
+        .values(reserved=_table.c.reserved - 1)
+    )
+
+
+def reserve(parking, start, end, now):
+    """Reserva la ventana en el calendario y, si ya está en curso, ocupa el espacio en vivo.
+    Devuelve un mensaje de error o None."""
+    error = window_error(start, end)
+    if error:
+        return error
+    if not book(parking, start, end):
+        return "No hay espacios libres en ese horario."
+    if live_bucket(now) in window_buckets(start, end) and not slots.take(parking.id):
+        return "La cochera está llena (0 espacios disponibles)."
+    return None
+
+
+def cancel(parking_id, start, end, now):
+    """Quita la ventana del calendario y libera el espacio en vivo si estaba en curso"""
+    unbook(parking_id, start, end)
+    if live_bucket(now) in window_buckets(start, end):
+        slots.release(parking_id)
+
+
+def release_live(counts, bucket):
+    """Libera ya los espacios de reservas que terminan dentro del bloque en vivo.
+    counts: {parking_id: reservas}. También las descuenta del bloque para que
+    roll() no vuelva a liberarlas al pasar al siguiente."""
+    by_count = defaultdict(list)
+    for parking_id, n in counts.items():
+        by_count[n].append(parking_id)
+    for n, parking_ids in by_count.items():
+        db.session.execute(
+            _table.update()
+            .where(_table.c.parking_id.in_(parking_ids), _table.c.bucket == bucket)
+            .values(reserved=case((_table.c.reserved > n, _table.c.reserved - n), else_=0))
+        )
+        slots.adjust_many(parking_ids, n)
+
+
+def free_capacity(parking, start, end):
+    """Espacios libres en toda la ventana y ocupación por bloque"""
+    buckets = window_buckets(start, end)
+    reserved = dict(
+        db.session.query(CapacityBucket.bucket, CapacityBucket.reserved)
+        .filter(CapacityBucket.parking_id == parking.id, CapacityBucket.bucket.in_(buckets))
+        .all()
+    )
+    detail = [{"start": bucket_start(b).isoformat(), "reserved": reserved.get(b, 0)} for b in buckets]
+    free = parking.capacity - max(d["reserved"] for d in detail)
+    return max(free, 0), detail
+
+
+def roll(now):
+    """Avanza Parking.available al bloque actual. Devuelve cuántas cocheras cambiaron."""
+    last = live_bucket(now)
+    current = bucket_of(now)
+    if current <= last:
+        # Confirma la fila de capacity_roll si live_bucket acaba de crearla
+        db.session.commit()
+        return 0
+
+    # Solo un proceso puede avanzar el mismo paso (bloqueo optimista)
+    claimed = db.session.execute(
+        CapacityRoll.__table__.update()
+        .where(CapacityRoll.id == 1, CapacityRoll.last_bucket == last)
+        .values(last_bucket=current)
+    ).rowcount
+    if not claimed:
+        db.session.rollback()
+        return 0
+
+    delta = defaultdict(int)
+    rows = db.session.query(CapacityBucket.parking_id, CapacityBucket.bucket, CapacityBucket.reserved)\
+        .filter(CapacityBucket.bucket.in_([last, current])).all()
+    for parking_id, bucket, reserved in rows:
+        # Reservas que empiezan ocupan un espacio, las que terminan lo liberan
+        delta[parking_id] += -reserved if bucket == current else reserved
+
+    by_delta = defaultdict(list)
+    for parking_id, d in delta.items():
+        if d:
+            by_delta[d].append(parking_id)
+    for d, parking_ids in by_delta.items():
+        slots.adjust_many(parking_ids, d)
+
+    db.session.execute(_table.delete().where(_table.c.bucket < current - RETENTION_BUCKETS))
+    db.session.commit()
+
+    changed = [pid for ids in by_delta.values() for pid in ids]
+    if changed:
+        signals.parking_changed.send("capacity_roll", parking_ids=changed)
+    return len(changed)
+
+
+def rebuild(now, batch=5000):
+    """Recalcula el calendario desde las reservas activas y ajusta Parking.available
+    al bloque actual. Devuelve los bloques escritos."""
+    desde = now - timedelta(minutes=BUCKET_MINUTES * RETENTION_BUCKETS)
+    live = bucket_of(now)
+
+    # Espacios ocupados por reservas que hoy están descontados de available; el
+    # resto de lo ocupado son autos sin reserva (entradas/salidas) y se conserva
+    state = db.session.get(CapacityRoll, 1)
+    if state is not None:
+        counted = dict(db.session.query(CapacityBucket.parking_id, CapacityBucket.reserved)
+                       .filter(CapacityBucket.bucket == state.last_bucket).all())
+    else:
+        # Antes del calendario cada reserva activa descontaba un espacio al crearse
+        counted = dict(db.session.query(Reservation.parking_id, func.count())
+                       .filter(Reservation.status.in_(ACTIVE_STATUSES))
+                       .group_by(Reservation.parking_id).all())
+
+    counts, last_id = Counter(), 0
+    while True:
+        rows = db.session.query(Reservation.id, Reservation.parking_id,
+                                Reservation.start_time, Reservation.end_time)\
+            .filter(Reservation.id > last_id,
+                    Reservation.status.in_(ACTIVE_STATUSES),
+                    Reservation.end_time >= desde)\
+            .order_by(Reservation.id).limit(batch).all()
+        if not rows:
+            break
+        for r in rows:
+            for b in window_buckets(r.start_time, r.end_time):
+                counts[(r.parking_id, b)] += 1
+        last_id = rows[-1].id
+
+    CapacityBucket.query.delete()
+    items = [{"parking_id": pid, "bucket": b, "reserved": n} for (pid, b), n in counts.items()]
+    for i in range(0, len(items), batch):
+        db.session.execute(_table.insert(), items[i:i + batch])
+
+    # available = capacidad - reservas del bloque actual - autos sin reserva
+    changes = []
+    for pid, cap, available in db.session.query(Parking.id, Parking.capacity, Parking.available):
+        walk_ins = max(cap - available - counted.get(pid, 0), 0)
+        value = min(max(cap - counts[(pid, live)] - walk_ins, 0), cap)
+        if value != available:
+            changes.append({"pid": pid, "value": value})
+    parkings = Parking.__table__
+    for i in range(0, len(changes), batch):
+        db.session.execute(
+            parkings.update().where(parkings.c.id == bindparam("pid")).values(available=bindparam("value")),
+            changes[i:i + batch]
+        )
+
+    CapacityRoll.query.delete()
+    db.session.add(CapacityRoll(id=1, last_bucket=live))
+    db.session.commit()
+    if changes:
+        signals.parking_changed.send("capacity_rebuild", parking_ids=[c["pid"] for c in changes])
+    return len(items)
@@ -0,0 +1,101 @@
+import click
+from db import db
+from models import CapacityRoll, DailyParkingStats, ParkingSearchTerm
+from routes.reservations import get_lima_now
+import capacity
+import rollups
+import bulk_import
+import replicas
+import scheduler
+import schema_upgrade
+
+# ============================================================
+# COMANDOS DE MANTENIMIENTO (flask <comando>)
+# ============================================================
+
+def register_commands(app):
+
+    @app.cli.command("schema-upgrade")
+    def schema_upgrade_cmd():
+        """Crea las tablas, columnas e índices que falten (no borra nada; se corre en cada arranque)"""
+        done, skipped = schema_upgrade.upgrade()
+        for d in done:
+            click.echo(f"Agregado: {d}")
+        for s in skipped:
+            click.echo(f"Omitido: {s}")
+        click.echo(f"Esquema al día ({len(done)} cambio(s))")
+
+    @app.cli.command("geo-backfill")
+    @click.option("--batch", default=1000, help="Cocheras por lote")
+    def geo_backfill(batch):
+        """Calcula geo_cell para las cocheras que aún no la tienen"""
+        click.echo(f"Cocheras indexadas: {schema_upgrade.backfill_geo_cells(batch)}")
+
+    @app.cli.command("search-reindex")
+    @click.option("--batch", default=1000, help="Cocheras por lote")
+    @click.option("--if-empty", is_flag=True, help="Solo si parking_search_terms está vacía (primer despliegue)")
+    def search_reindex(batch, if_empty):
+        """Reconstruye el índice de trigramas del buscador"""
+        if if_empty and db.session.query(ParkingSearchTerm.parking_id).first() is not None:
+            click.echo("El índice del buscador ya existe; no se hizo nada.")
+            return
+        click.echo(f"Cocheras reindexadas: {schema_upgrade.reindex_search_terms(batch)}")
+
+    @app.cli.command("capacity-roll")
+    def capacity_roll():
+        """Avanza Parking.available al bloque actual del calendario (los workers lo hacen solos)"""
+        changed = capacity.roll(get_lima_now())
+        click.echo(f"Cocheras actualizadas: {changed}")
+
+    @app.cli.command("reservations-expire")
+    def reservations_expire():
+        """Una vuelta de las tareas periódicas (el hilo de los workers lo hace solo)"""
+        done = scheduler.tick(get_lima_now())
+        if done is None:
+            click.echo("Otro proceso tiene la lease; no se hizo nada.")
+        else:
+            click.echo(f"Reservas completadas: {done}")
+
+    @app.cli.command("capacity-rebuild")
+    @click.option("--batch", default=5000, help="Reservas por lote")
+    @click.option("--if-empty", is_flag=True, help="Solo si el calendario nunca se armó (primer despliegue)")
+    def capacity_rebuild(batch, if_empty):
+        """Reconstruye el calendario de capacidad a partir de las reservas activas y ajusta available"""
+        if if_empty and db.session.get(CapacityRoll, 1) is not None:
+            click.echo("El calendario ya existe; no se hizo nada.")
+            return
+        click.echo(f"Bloques reconstruidos: {capacity.rebuild(get_lima_now(), batch)}")
+
+    @app.cli.command("reports-rebuild")
+    @click.option("--if-empty", is_flag=True, help="Solo si daily_parking_stats está vacía (primer despliegue)")
+    def reports_rebuild(if_empty):
+        """Recalcula los rollups diarios de los reportes desde reservas y pagos"""
+        if if_empty and db.session.query(DailyParkingStats.parking_id).first() is not None:
+            click.echo("Los rollups ya existen; no se hizo nada.")
+            return
+        click.echo(f"Filas de rollup escritas: {rollups.rebuild()}")
+
+    @app.cli.command("parkings-import")
+    @click.argument("path", type=click.Path(exists=True, dir_okay=False))
+    @click.option("--format", "fmt", type=click.Choice(["csv", "ndjson"]), help="Por defecto según la extensión")
+    @click.option("--chunk", default=bulk_import.DEFAULT_CHUNK, type=click.IntRange(min=1), help="Filas por transacción")
+    @click.option("--upsert", is_flag=True, help="Actualizar las filas que traen id existente")
+    def parkings_import(path, fmt, chunk, upsert):
+        """Importa cocheras desde un archivo CSV o NDJSON"""
+        fmt = fmt or ("ndjson" if path.endswith((".ndjson", ".jsonl")) else "csv")
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            summary = bulk_import.import_parkings(f, fmt, chunk_size=chunk, upsert=upsert)
+        click.echo(f"Insertadas: {summary['inserted']}  Actualizadas: {summary['updated']}  "
+                   f"Con error: {summary['failed']}")
+        for e in summary["errors"][:20]:
+            click.echo(f"  fila {e['row']}: {e['errors']}")
+
+    @app.cli.command("replicas-status")
+    def replicas_status():
+        """Revisa las réplicas de lectura (conexión y retraso)"""
+        estados = replicas.check_all()
+        if not estados:
+            click.echo("No hay réplicas configuradas (DATABASE_REPLICA_URLS)")
+        for s in estados:
+            estado = "ok" if s["healthy"] else f"FUERA ({s['error'] or 'retraso'})"
+            click.echo(f"{s['name']}: {estado}  retraso={s['lag_s']}")
@@ -0,0 +1,370 @@
+import math
+import threading
+import time
+from decimal import Decimal
+from flask import current_app
+import config
+from db import db
+from models import Parking
+import live_updates
+import signals
+
+# ============================================================
+# CLUSTERS DE COCHERAS POR ZOOM (ESTILO SUPERCLUSTER)
+# ============================================================
+# En zoom de ciudad la app recibía miles de pines y los agrupaba en el
+# celular. Aquí cada worker arma en memoria una jerarquía de clusters:
+#
+# - Las coordenadas se proyectan a Web Mercator normalizado (0..1).
+# - Desde MAX_ZOOM hacia MIN_ZOOM, cada nivel agrupa los nodos del nivel de
+#   abajo que están a menos de RADIUS_PX píxeles (en ese zoom) de un nodo
+#   semilla; el cluster queda en el centroide ponderado y guarda cantidad,
+#   suma de disponibles y precio mínimo. Una cochera sin vecinos sube como
+#   nodo de un solo hijo.
+# - Cada nivel tiene una grilla con celdas del tamaño de un tile de ese zoom:
+#   la consulta por bbox y la búsqueda de vecinos miran pocas celdas.
+#
+# Cambios: el índice se suscribe al broker de live_updates (el mismo que
+# alimenta /stream), así que se entera de los cambios de todos los workers.
+# Disponibilidad y precio se actualizan subiendo por los padres (un nodo por
+# zoom); una cochera nueva o movida se engancha al cluster más cercano de
+# cada nivel y una borrada llega como tombstone (deleted) y se quita. Cada
+# CLUSTER_REBUILD_S se reconstruye todo en segundo plano para volver a la
+# agrupación óptima.
+
+MIN_ZOOM = 5
+MAX_ZOOM = 16            # Más cerca ya se muestran las cocheras sueltas
+RADIUS_PX = 60
+TILE_PX = 256
+MAX_QUERY_CELLS = 4096   # Más celdas que esto: recorrer el nivel entero
+
+
+# --- Proyección ---
+
+def project(lat, lng):
+    sin = math.sin(math.radians(max(min(lat, 85.0511), -85.0511)))
+    y = 0.5 - 0.25 * math.log((1 + sin) / (1 - sin)) / math.pi
+    return lng / 360.0 + 0.5, min(max(y, 0.0), 1.0)
+
+
+def unproject(x, y):
+    lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y))))
+    return lat, (x - 0.5) * 360.0
+
+
+def radius_at(z):
+    return RADIUS_PX / (TILE_PX * 2 ** z)
+
+
+class Node:
+    __slots__ = ("x", "y", "zoom", "count", "available", "min_price", "children", "parent", "parking_id")
+
+    def __init__(self, x, y, zoom, count=1, available=0, min_price=None, parking_id=None):
+        self.x, self.y, self.zoom = x, y, zoom
+        self.count = count
+        self.available = available
+        self.min_price = min_price
+        self.children = []
+        self.parent = None
+        self.parking_id = parking_id
+
+    def to_dict(self):
+        lat, lng = unproject(self.x, self.y)
+        if self.count == 1:
+            leaf = self
+            while leaf.children:
+                leaf = leaf.children[0]
+            return {"parking_id": leaf.parking_id, "count": 1, "lat": round(lat, 6), "lng": round(lng, 6),
+                    "available": self.available, "price_per_hour": format(self.min_price, "f")}
+        return {"count": self.count, "lat": round(lat, 6), "lng": round(lng, 6),
+                "available": self.available, "min_price": format(self.min_price, "f"),
+                "expansion_zoom": self.expansion_zoom()}
+
+    def expansion_zoom(self):
+        """Zoom en el que el cluster se abre en más de un nodo"""
+        node = self
+        while len(node.children) == 1 and node.children[0].children:
+            node = node.children[0]
+        return min(node.zoom + 1, MAX_ZOOM + 1)
+
+
+class ClusterIndex:
+
+    def __init__(self):
+        self.grids = {z: {} for z in range(MIN_ZOOM, MAX_ZOOM + 2)}
+        self.leaves = {}
+        self.built_at = time.monotonic()
+
+    # --- Grilla ---
+
+    @staticmethod
+    def _cell(node):
+        n = 1 << node.zoom
+        return int(node.x * n), int(node.y * n)
+
+    def _grid_add(self, node):
+        self.grids[node.zoom].setdefault(self._cell(node), []).append(node)
+
+    def _grid_remove(self, node, cell=None):
+        grid = self.grids[node.zoom]
+        cell = cell or self._cell(node)
+        bucket = grid.get(cell)
+        if bucket is not None:
+            bucket.remove(node)
+            if not bucket:
+                del grid[cell]
+
+    def _around(self, zoom, x, y):
+        """Nodos de las 3x3 celdas alrededor de (x, y) en el nivel `zoom`"""
+        grid = self.grids[zoom]
+        n = 1 << zoom
+        cx, cy = int(x * n), int(y * n)
+        for i in (cx - 1, cx, cx + 1):
+            for j in (cy - 1, cy, cy + 1):
+                yield from grid.get((i, j), ())
+
+    # --- Construcción completa ---
+
+    def load(self, rows):
+        """rows: (id, lat, lng, available, price_per_hour)"""
+        nodes = []
+        for pid, lat, lng, available, price in rows:
+            x, y = project(lat, lng)
+            leaf = Node(x, y, MAX_ZOOM + 1, 1, available or 0, Decimal(price or 0), pid)
+            self.leaves[pid] = leaf
+            self._grid_add(leaf)
+            nodes.append(leaf)
+        for z in range(MAX_ZOOM, MIN_ZOOM - 1, -1):
+            nodes = self._cluster_level(nodes, z)
+        self.built_at = time.monotonic()
+        return self
+
+    def _cluster_level(self, nodes, z):
+        r2 = radius_at(z) ** 2
+        used = set()
+        out = []
+        for seed in nodes:
+            if id(seed) in used:
+                continue
+            used.add(id(seed))
+            members = [seed]
+            for other in self._around(seed.zoom, seed.x, seed.y):
+                if id(other) not in used and (other.x - seed.x) ** 2 + (other.y - seed.y) ** 2 <= r2:
+                    used.add(id(other))
+                    members.append(other)
+            count = sum(m.count for m in members)
+            parent = Node(sum(m.x * m.count for m in members) / count,
+                          sum(m.y * m.count for m in members) / count, z, count,
+                          sum(m.available for m in members), min(m.min_price for m in members))
+            parent.children = members
+            for m in members:
+                m.parent = parent
+            self._grid_add(parent)
+            out.append(parent)
+        return out
+
+    # --- Consultas ---
+
+    def query(self, bbox, zoom):
+        """Nodos del nivel `zoom` dentro del bbox (min_lat, min_lng, max_lat, max_lng)"""
+        zoom = min(max(zoom, MIN_ZOOM), MAX_ZOOM + 1)
+        min_lat, min_lng, max_lat, max_lng = bbox
+        x0, y1 = project(min_lat, min_lng)
+        x1, y0 = project(max_lat, max_lng)
+        grid = self.grids[zoom]
+        n = 1 << zoom
+        cx0, cx1, cy0, cy1 = int(x0 * n), int(x1 * n), int(y0 * n), int(y1 * n)
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > MAX_QUERY_CELLS:
+            candidates = (node for bucket in grid.values() for node in bucket)
+        else:
+            candidates = (node for i in range(cx0, cx1 + 1) for j in range(cy0, cy1 + 1)
+                          for node in grid.get((i, j), ()))
+        return [node for node in candidates if x0 <= node.x <= x1 and y0 <= node.y <= y1]
+
+    # --- Cambios incrementales ---
+
+    def upsert(self, pid, lat, lng, available, price):
+        available, price = available or 0, Decimal(price or 0)
+        leaf = self.leaves.get(pid)
+        if leaf is not None:
+            x, y = project(lat, lng)
+            if abs(leaf.x - x) < 1e-12 and abs(leaf.y - y) < 1e-12:
+                self._update_values(leaf, available, price)
+                return
+            self.remove(pid)
+        self._insert(pid, lat, lng, available, price)
+
+    def _update_values(self, leaf, available, price):
+        delta = available - leaf.available
+        old_price = leaf.min_price
+        node = leaf
+        while node is not None:
+            node.available += delta
+            if node is leaf:
+                node.min_price = price
+            elif price < node.min_price:
+                node.min_price = price
+            elif old_price == node.min_price and price != old_price:
+                node.min_price = min(c.min_price for c in node.children)
+            node = node.parent
+
+    def _insert(self, pid, lat, lng, available, price):
+        x, y = project(lat, lng)
+        child = Node(x, y, MAX_ZOOM + 1, 1, available, price, pid)
+        self.leaves[pid] = child
+        self._grid_add(child)
+        leaf = child
+        for z in range(MAX_ZOOM, MIN_ZOOM - 1, -1):
+            r2 = radius_at(z) ** 2
+            best, best_d = None, r2
+            for node in self._around(z, x, y):
+                d = (node.x - x) ** 2 + (node.y - y) ** 2
+                if d <= best_d:
+                    best, best_d = node, d
+            if best is not None:
+                # Se une al cluster más cercano; sus ancestros suman la cochera
+                best.children.append(child)
+                child.parent = best
+                node = best
+                while node is not None:
+                    self._add_leaf(node, leaf, 1)
+                    node = node.parent
+                return
+            parent = Node(x, y, z, 1, available, price)
+            parent.children = [child]
+            child.parent = parent
+            self._grid_add(parent)
+            child = parent
+
+    def _add_leaf(self, node, leaf, sign):
+        """Suma (sign=1) o resta (sign=-1) una cochera a los totales de un nodo"""
+        cell = self._cell(node)
+        count = node.count + sign
+        if count > 0:
+            node.x = (node.x * node.count + sign * leaf.x) / count
+            node.y = (node.y * node.count + sign * leaf.y) / count
+        node.count = count
+        node.available += sign * leaf.available
+        if sign > 0:
+            node.min_price = min(node.min_price, leaf.min_price)
+        elif node.children:
+            node.min_price = min(c.min_price for c in node.children)
+        if count > 0 and self._cell(node) != cell:
+            self._grid_remove(node, cell)
+            self._grid_add(node)
+        return cell
+
+    def remove(self, pid):
+        leaf = self.leaves.pop(pid, None)
+        if leaf is None:
+            return
+        self._grid_remove(leaf)
+        child, node = leaf, leaf.parent
+        while node is not None:
+            if child.count == 0 or child is leaf:
+                node.children.remove(child)
+            cell = self._add_leaf(node, leaf, -1)
+            if node.count == 0:
+                self._grid_remove(node, cell)
+            child, node = node, node.parent
+
+
+# --- Índice por worker ---
+
+_index = None
+_building = False
+_pending = []           # Cambios que llegan mientras se reconstruye
+_lock = threading.Lock()
+_build_lock = threading.Lock()
+_subscribed = False
+
+
+class _Feed:
+    """Suscriptor del broker de live_updates que aplica cada cambio al índice"""
+
+    def matches(self, delta):
+        return True
+
+    def push(self, delta):
+        with _lock:
+            if _building:
+                _pending.append(delta)
+            if _index is not None:
+                _apply(_index, delta)
+
+
+def _apply(index, delta):
+    if delta.get("deleted"):
+        index.remove(delta["id"])
+        return
+    index.upsert(delta["id"], delta["lat"], delta["lng"], delta["available"], delta["price_per_hour"])
+
+
+def rebuild():
+    """Reconstruye el índice desde la base (necesita app context)"""
+    global _index, _building
+    with _lock:
+        _building = True
+        _pending.clear()
+    try:
+        rows = db.session.query(Parking.id, Parking.lat, Parking.lng,
+                                Parking.available, Parking.price_per_hour).all()
+        index = ClusterIndex().load(rows)
+        with _lock:
+            # Los cambios que llegaron durante la carga traen valores absolutos
+            for delta in _pending:
+                _apply(index, delta)
+            _index = index
+    finally:
+        with _lock:
+            _building = False
+            _pending.clear()
+    return _index
+
+
+def _rebuild_in_background(app):
+    def run():
+        with app.app_context():
+            try:
+                rebuild()
+            except Exception:
+                app.logger.exception("Error reconstruyendo los clusters")
+            finally:
+                db.session.remove()
+    threading.Thread(target=run, daemon=True, name="clusters-rebuild").start()
+
+
+def get_index():
+    global _subscribed
+    if _index is None:
+        with _build_lock:
+            if not _subscribed:
+                # Suscribirse antes de leer la base para no perder cambios
+                live_updates.get_broker().subscribe(_Feed())
+                _subscribed = True
+            if _index is None:
+                rebuild()
+    elif time.monotonic() - _index.built_at > config.CLUSTER_REBUILD_S and not _building:
+        with _lock:
+            stale = not _building
+            if stale:
+                _index.built_at = time.monotonic()      # Un solo rebuild a la vez
+        if stale:
+            _rebuild_in_background(current_app._get_current_object())
+    return _index
+
+
+def clusters(bbox, zoom):
+    index = get_index()
+    with _lock:
+        return [node.to_dict() for node in index.query(bbox, zoom)]
+
+
+@signals.parking_changed.connect
+def _on_parking_changed(sender, parking_ids=(), **kwargs):
+    # Las bajas de este worker se aplican sin esperar al broker; las de los
+    # demás llegan como tombstone por live_updates
+    if sender == "parking_delete" and _index is not None:
+        with _lock:
+            for pid in parking_ids:
+                _index.remove(pid)
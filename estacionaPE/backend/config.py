@@ -9,7 +9,8 @@ DB_HOST = os.getenv("DB_HOST")
 DB_PORT = os.getenv("DB_PORT")
 DB_NAME = os.getenv("DB_NAME")
 
-SQLALCHEMY_DATABASE_URI = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# DATABASE_URL permite apuntar a otra base (ej. sqlite:///local.db para benchmarks)
+SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL") or f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 SQLALCHEMY_TRACK_MODIFICATIONS = False
 SECRET_KEY = os.getenv("SECRET_KEY")
 
@@ -20,3 +21,76 @@ OPENAPI_VERSION = os.getenv("OPENAPI_VERSION", "3.0.3")
 OPENAPI_URL_PREFIX = os.getenv("OPENAPI_URL_PREFIX", "/docs")
 OPENAPI_SWAGGER_UI_PATH = os.getenv("OPENAPI_SWAGGER_UI_PATH", "/")
 OPENAPI_SWAGGER_UI_URL = os.getenv("OPENAPI_SWAGGER_UI_URL", "https://cdn.jsdelivr.net/npm/swagger-ui-dist/")
+
+# Paginación de listados (cursor por id); `limit` se recorta a PAGE_MAX_LIMIT
+PAGE_DEFAULT_LIMIT = int(os.getenv("PAGE_DEFAULT_LIMIT", "100"))
+PAGE_MAX_LIMIT = int(os.getenv("PAGE_MAX_LIMIT", "500"))
+
+# Tareas periódicas (scheduler.py): un worker (lease en la base) avanza el calendario de capacidad
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "1") == "1"
+SCHEDULER_INTERVAL_S = float(os.getenv("SCHEDULER_INTERVAL_S", "15"))
+SCHEDULER_LEASE_S = int(os.getenv("SCHEDULER_LEASE_S", "60"))
+
+# Stream de disponibilidad: "db" (entre workers de gunicorn) o "local" (un proceso / tests)
+LIVE_BROKER = os.getenv("LIVE_BROKER", "db")
+# Streams abiertos por worker; cada uno ocupa un hilo de gunicorn para siempre, así que
+# debe quedar por debajo de --threads o la API deja de responder (los demás reciben 503)
+LIVE_MAX_STREAMS = int(os.getenv("LIVE_MAX_STREAMS", "8"))
+LIVE_RETRY_AFTER_S = int(os.getenv("LIVE_RETRY_AFTER_S", "30"))
+
+# Caché de respuestas de los GET públicos (por worker)
+RESPONSE_CACHE_TTL_S = int(os.getenv("RESPONSE_CACHE_TTL_S", "60"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "512"))
+# Los cambios de disponibilidad (reservas, entradas/salidas) invalidan el caché como mucho
+# una vez cada tantos segundos por worker; 0 = en cada cambio
+RESPONSE_CACHE_BUMP_S = float(os.getenv("RESPONSE_CACHE_BUMP_S", "2"))
+
+# Métricas Prometheus en /metrics (cada worker vuelca a METRICS_DIR y se suman)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_DIR = os.getenv("METRICS_DIR", "/tmp/estacionape-metrics")
+# Prometheus lo envía como "Authorization: Bearer <token>"; vacío = /metrics responde 403
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Perfilador de consultas por petición (solo desarrollo): avisa N+1 y presupuestos
+QUERY_PROFILER = os.getenv("QUERY_PROFILER", "0") == "1"
+
+# Réplicas de lectura (URLs separadas por coma); vacío = todo va al primario
+DATABASE_REPLICA_URLS = [u.strip() for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if u.strip()]
+REPLICA_MAX_LAG_S = float(os.getenv("REPLICA_MAX_LAG_S", "5"))
+REPLICA_CHECK_INTERVAL_S = float(os.getenv("REPLICA_CHECK_INTERVAL_S", "5"))
+
+# SSO (Google / Microsoft): discovery y JWKS en caché, timeouts del HTTP saliente
+SSO_GOOGLE_METADATA_URL = os.getenv("SSO_GOOGLE_METADATA_URL", "https://accounts.google.com/.well-known/openid-configuration")
+SSO_MICROSOFT_METADATA_URL = os.getenv("SSO_MICROSOFT_METADATA_URL", "https://login.microsoftonline.com/common/v2.0/.well-known/openid-configuration")
+SSO_METADATA_TTL_S = int(os.getenv("SSO_METADATA_TTL_S", "3600"))
+SSO_JWKS_TTL_S = int(os.getenv("SSO_JWKS_TTL_S", "3600"))
+SSO_JWKS_MIN_REFRESH_S = int(os.getenv("SSO_JWKS_MIN_REFRESH_S", "60"))
+SSO_CONNECT_TIMEOUT_S = float(os.getenv("SSO_CONNECT_TIMEOUT_S", "2"))
+SSO_READ_TIMEOUT_S = float(os.getenv("SSO_READ_TIMEOUT_S", "5"))
+SSO_HTTP_POOL_SIZE = int(os.getenv("SSO_HTTP_POOL_SIZE", "16"))
+
+# Hashing de contraseñas en un pool de procesos por worker (0 = en línea)
+PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+PASSWORD_POOL_WORKERS = int(os.getenv("PASSWORD_POOL_WORKERS", "1"))
+PASSWORD_POOL_MAX_PENDING = int(os.getenv("PASSWORD_POOL_MAX_PENDING", "8"))
+PASSWORD_QUEUE_TIMEOUT_S = float(os.getenv("PASSWORD_QUEUE_TIMEOUT_S", "2"))
+PASSWORD_RETRY_AFTER_S = int(os.getenv("PASSWORD_RETRY_AFTER_S", "2"))
+
+# Serialización rápida (dumpers precompilados + orjson si está instalado); 0 = marshmallow/json puros
+FAST_SERIALIZATION = os.getenv("FAST_SERIALIZATION", "1") == "1"
+
+# Clusters del mapa por zoom: cada cuánto se reconstruye el índice de cada worker
+CLUSTER_REBUILD_S = int(os.getenv("CLUSTER_REBUILD_S", "600"))
+
+# Vencimiento de reservas (lo corre scheduler.py): reservas completadas por lote
+EXPIRY_BATCH = int(os.getenv("EXPIRY_BATCH", "1000"))
+
+# Idempotency-Key en reservar/pagar: vida de la respuesta guardada, espera de duplicados y limpieza
+IDEMPOTENCY_TTL_S = int(os.getenv("IDEMPOTENCY_TTL_S", "86400"))
+IDEMPOTENCY_LOCK_S = int(os.getenv("IDEMPOTENCY_LOCK_S", "30"))
+IDEMPOTENCY_WAIT_S = float(os.getenv("IDEMPOTENCY_WAIT_S", "5"))
+IDEMPOTENCY_PURGE_S = int(os.getenv("IDEMPOTENCY_PURGE_S", "300"))
+
+# Compresión de respuestas según Accept-Encoding (gzip; brotli/zstd si están instalados)
+COMPRESS_ENABLED = os.getenv("COMPRESS_ENABLED", "1") == "1"
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
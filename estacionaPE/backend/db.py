@@ -1,2 +1,17 @@
 from flask_sqlalchemy import SQLAlchemy
-db = SQLAlchemy()
\ No newline at end of file
+from flask_sqlalchemy.session import Session
+
+
+class RoutingSession(Session):
+    """Session que puede mandar las lecturas a una réplica (ver replicas.py)"""
+    router = None
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and RoutingSession.router is not None:
+            engine = RoutingSession.router(self, clause)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
@@ -26,26 +26,46 @@ if command -v flask >/dev/null 2>&1; then
   if flask db upgrade >/dev/null 2>&1; then
     echo "Applied Flask-Migrate migrations."
   else
-    echo "No migrations applied (flask db upgrade failed). Falling back to create_all."
-    python - <<PY
-from app import create_app
-from db import db
-app = create_app()
-with app.app_context():
-    db.create_all()
-PY
+    echo "No migrations applied (flask db upgrade failed). Falling back to schema-upgrade."
+    # create_all + columnas e índices nuevos en tablas existentes (parkings.geo_cell,
+    # índices de reservations, etc.); no borra nada
+    flask schema-upgrade
+    # Cocheras que quedaron sin geo_cell al agregar la columna (solo toca las NULL)
+    flask geo-backfill
+    # Buscador: en una base existente parking_search_terms arranca vacía (nada saldría en /search)
+    flask search-reindex --if-empty
+    # Calendario de capacidad: las reservas futuras hechas antes de él ya descontaron
+    # available; se arma y se concilia available una sola vez, antes de atender
+    flask capacity-rebuild --if-empty
+    # Reportes: en una base existente los rollups arrancan vacíos (los reportes saldrían en cero)
+    flask reports-rebuild --if-empty
   fi
 else
-  # Fallback directo: create_all()
+  # Fallback directo: lo mismo que schema-upgrade + geo-backfill + search-reindex --if-empty
+  # + capacity-rebuild --if-empty + reports-rebuild --if-empty
   python - <<PY
 from app import create_app
 from db import db
+from models import CapacityRoll, DailyParkingStats, ParkingSearchTerm
+from routes.reservations import get_lima_now
+import capacity
+import rollups
+import schema_upgrade
 app = create_app()
 with app.app_context():
-    db.create_all()
+    schema_upgrade.upgrade()
+    print(f"Cocheras indexadas: {schema_upgrade.backfill_geo_cells()}")
+    if db.session.query(ParkingSearchTerm.parking_id).first() is None:
+        print(f"Cocheras reindexadas: {schema_upgrade.reindex_search_terms()}")
+    if db.session.get(CapacityRoll, 1) is None:
+        print(f"Bloques reconstruidos: {capacity.rebuild(get_lima_now())}")
+    if db.session.query(DailyParkingStats.parking_id).first() is None:
+        print(f"Filas de rollup escritas: {rollups.rebuild()}")
 PY
 fi
 
 echo "DB ready. Starting Gunicorn..."
 # Ejecutar gunicorn reemplazando el proceso (para forward de señales)
-exec gunicorn --workers 4 --bind 0.0.0.0:5000 wsgi:app
+# gthread: las conexiones SSE (/api/parkings/stream) ocupan un hilo, no un worker entero;
+# LIVE_MAX_STREAMS (< --threads) limita cuántos por worker para no dejar sin hilos al resto
+exec gunicorn --workers 4 --worker-class gthread --threads 16 --bind 0.0.0.0:5000 wsgi:app
@@ -0,0 +1,49 @@
+from collections import Counter
+import config
+from db import db
+from models import Reservation
+import capacity
+import signals
+
+# ============================================================
+# VENCIMIENTO DE RESERVAS
+# ============================================================
+# scheduler.tick() corre expire() después de capacity.roll(), en un solo
+# worker a la vez. Las reservas activas cuyo end_time ya pasó se marcan
+# `completed` en lotes de EXPIRY_BATCH (índice status + end_time); las
+# pagadas siguen contando como pagadas por Reservation.paid (reportes,
+# pay-reservation). Si terminan dentro del bloque en vivo su espacio se
+# libera en el momento y se descuenta del bloque, así el siguiente roll() no
+# lo libera dos veces; si terminaron en un bloque anterior el roll ya lo
+# liberó.
+
+_table = Reservation.__table__
+
+
+def expire(now, batch=None):
+    """Marca completed las reservas vencidas y libera sus espacios. Devuelve cuántas."""
+    batch = batch or config.EXPIRY_BATCH
+    total = 0
+    while True:
+        live = capacity.live_bucket(now)
+        rows = db.session.query(Reservation.id, Reservation.parking_id, Reservation.start_time,
+                                Reservation.end_time)\
+            .filter(Reservation.status.in_(capacity.ACTIVE_STATUSES), Reservation.end_time <= now)\
+            .order_by(Reservation.end_time, Reservation.id)\
+            .limit(batch).with_for_update(skip_locked=True).all()
+        if not rows:
+            break
+
+        db.session.execute(_table.update().where(_table.c.id.in_([r.id for r in rows]))
+                           .values(status="completed"))
+        releasing = Counter(r.parking_id for r in rows
+                            if capacity.window_buckets(r.start_time, r.end_time)[-1] == live)
+        capacity.release_live(releasing, live)
+        db.session.commit()
+
+        total += len(rows)
+        if releasing:
+            signals.parking_changed.send("reservation_expiry", parking_ids=list(releasing))
+        if len(rows) < batch:
+            break
+    return total
@@ -0,0 +1,87 @@
+import csv
+import io
+import json
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from flask import Response, request, stream_with_context
+from flask_smorest import abort
+from db import db
+
+# ============================================================
+# EXPORTACIÓN EN STREAMING (NDJSON / CSV)
+# ============================================================
+# Para contabilidad: en vez de armar una lista gigante de objetos ORM, se
+# pide la consulta con yield_per (cursor del lado del servidor en MySQL) y
+# se va enviando fila por fila. La memoria queda acotada al tamaño del lote
+# y los primeros bytes salen de inmediato.
+
+YIELD_PER = 1000
+
+
+def _plain(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _upper_bound(value):
+    """Tope exclusivo para ?to=: una fecha sola incluye el día entero (como /api/reports)"""
+    try:
+        return datetime.combine(date.fromisoformat(value) + timedelta(days=1), datetime.min.time())
+    except ValueError:
+        return datetime.fromisoformat(value)
+
+
+def export_filters(model, query):
+    """Aplica ?from=&to= (sobre created_at) y ?status= a la consulta.
+    Con fechas YYYY-MM-DD ambos son inclusive, igual que en /api/reports; una
+    fecha con hora en `to` es un tope exclusivo."""
+    try:
+        if request.args.get("from"):
+            query = query.where(model.created_at >= datetime.fromisoformat(request.args["from"]))
+        if request.args.get("to"):
+            query = query.where(model.created_at < _upper_bound(request.args["to"]))
+    except ValueError:
+        abort(400, message="Formato de fecha inválido (usa ISO 8601)")
+    if request.args.get("status"):
+        query = query.where(model.status.in_(request.args["status"].split(",")))
+    return query
+
+
+def stream_export(query, filename):
+    """Respuesta en streaming de un select() de columnas; formato según ?format=ndjson|csv"""
+    fmt = request.args.get("format", "ndjson").lower()
+    if fmt not in ("ndjson", "csv"):
+        abort(400, message="Formato no soportado (usa ndjson o csv)")
+
+    columns = [c.name for c in query.selected_columns]
+
+    def generate():
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        if fmt == "csv":
+            # El encabezado sale antes de la consulta (y aunque no haya filas)
+            writer.writerow(columns)
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+        result = db.session.execute(query.execution_options(yield_per=YIELD_PER))
+        for rows in result.partitions():
+            for row in rows:
+                if fmt == "csv":
+                    writer.writerow([_plain(v) for v in row])
+                else:
+                    buf.write(json.dumps({k: _plain(v) for k, v in zip(columns, row)}))
+                    buf.write("\n")
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+
+    mimetype = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'}
+    )
@@ -0,0 +1,74 @@
+import math
+from sqlalchemy import or_
+
+# ============================================================
+# ÍNDICE ESPACIAL POR CELDAS (GRILLA LAT/LNG)
+# ============================================================
+# Cada cochera guarda en `geo_cell` el número de la celda de la grilla donde
+# cae. Las celdas de una misma fila son consecutivas, así que un viewport se
+# traduce en un rango BETWEEN por fila, que MySQL resuelve con el índice.
+
+CELL_DEG = 0.01          # ~1.1 km de lado en Lima
+GRID_COLS = int(round(360 / CELL_DEG))
+MAX_ROWS = 200           # Máximo de filas de grilla por consulta (~2 grados)
+EARTH_RADIUS_M = 6371000.0
+
+
+def cell_row(lat):
+    return int(math.floor((lat + 90.0) / CELL_DEG))
+
+
+def cell_col(lng):
+    return int(math.floor((lng + 180.0) / CELL_DEG))
+
+
+def cell_for(lat, lng):
+    """Celda de la grilla para una coordenada"""
+    return cell_row(lat) * GRID_COLS + cell_col(lng)
+
+
+def cell_ranges(min_lat, min_lng, max_lat, max_lng):
+    """Rangos (desde, hasta) de celdas que cubren el bbox, uno por fila"""
+    r0, r1 = cell_row(min_lat), cell_row(max_lat)
+    c0, c1 = cell_col(min_lng), cell_col(max_lng)
+    if r1 - r0 + 1 > MAX_ROWS:
+        raise ValueError("El área solicitada es demasiado grande.")
+    return [(r * GRID_COLS + c0, r * GRID_COLS + c1) for r in range(r0, r1 + 1)]
+
+
+def parse_bbox(raw):
+    """Convierte 'min_lng,min_lat,max_lng,max_lat' en (min_lat, min_lng, max_lat, max_lng)"""
+    parts = [float(x) for x in raw.split(",")]
+    if len(parts) != 4:
+        raise ValueError("bbox debe tener 4 valores: min_lng,min_lat,max_lng,max_lat")
+    min_lng, min_lat, max_lng, max_lat = parts
+    if min_lat > max_lat or min_lng > max_lng:
+        raise ValueError("bbox inválido (mínimos mayores que máximos).")
+    return min_lat, min_lng, max_lat, max_lng
+
+
+def bbox_around(lat, lng, radius_m):
+    """Bbox que contiene el círculo de `radius_m` metros alrededor del punto"""
+    dlat = math.degrees(radius_m / EARTH_RADIUS_M)
+    dlng = dlat / max(math.cos(math.radians(lat)), 1e-6)
+    return lat - dlat, lng - dlng, lat + dlat, lng + dlng
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    """Distancia en metros entre dos coordenadas"""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def bbox_filter(model, bbox):
+    """Condiciones para filtrar `model` (con lat, lng y geo_cell) dentro del bbox"""
+    min_lat, min_lng, max_lat, max_lng = bbox
+    ranges = cell_ranges(*bbox)
+    return [
+        or_(*[model.geo_cell.between(lo, hi) for lo, hi in ranges]),
+        model.lat.between(min_lat, max_lat),
+        model.lng.between(min_lng, max_lng),
+    ]
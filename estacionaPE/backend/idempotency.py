@@ -0,0 +1,188 @@
+import functools
+import hashlib
+import threading
+import time
+from http import HTTPStatus
+from datetime import datetime, timedelta
+from flask import g, has_request_context, jsonify, request, make_response
+from flask_jwt_extended import get_jwt_identity
+from flask_smorest import abort
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from werkzeug.exceptions import HTTPException
+import config
+from db import db
+from models import IdempotencyKey
+
+# ============================================================
+# IDEMPOTENCY-KEY EN POSTS CON EFECTOS (reservar, pagar)
+# ============================================================
+# La app reintenta cuando la red falla. Si manda `Idempotency-Key: <uuid>`,
+# la primera petición con esa llave reserva una fila en `idempotency_keys`
+# (INSERT por llave primaria: solo uno gana), corre el handler y guarda la
+# respuesta. Las repeticiones:
+#   - con la respuesta ya guardada -> la misma respuesta, sin correr nada
+#     (con `Idempotent-Replayed: true`)
+#   - mientras la primera sigue en curso -> esperan a que termine
+#     (hasta IDEMPOTENCY_WAIT_S; luego 409 con Retry-After)
+#   - con otro cuerpo u otra ruta -> 422
+# Solo se guardan las respuestas 2xx: si el handler falla sin haber hecho
+# commit no hubo cambios y la llave se libera para reintentar. Si falla
+# después de un commit (p. ej. en un suscriptor de las señales), el cambio
+# ya está hecho: se guarda la respuesta de error para que las repeticiones
+# la reciban en vez de reservar o cobrar otra vez. Si el worker muere a
+# mitad, la reserva de la llave vence a los IDEMPOTENCY_LOCK_S.
+# La llave es por usuario y las filas se borran a las IDEMPOTENCY_TTL_S.
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 100
+POLL_S = 0.05
+
+_table = IdempotencyKey.__table__
+_purge_lock = threading.Lock()
+_last_purge = 0.0
+
+
+def _fingerprint():
+    digest = hashlib.sha256(f"{request.method} {request.path}\n".encode())
+    digest.update(request.get_data())
+    return digest.hexdigest()
+
+
+def _claim(key, fingerprint, now):
+    """True si esta petición queda a cargo de la llave"""
+    try:
+        db.session.execute(_table.insert().values(
+            key=key, request_hash=fingerprint, created_at=now,
+            locked_until=now + timedelta(seconds=config.IDEMPOTENCY_LOCK_S)))
+        db.session.commit()
+        return True
+    except IntegrityError:
+        db.session.rollback()
+
+    # Existe: tomarla solo si venció o si quien la tenía murió a mitad
+    taken = db.session.execute(
+        _table.update()
+        .where(_table.c.key == key,
+               (_table.c.created_at < now - timedelta(seconds=config.IDEMPOTENCY_TTL_S))
+               | (_table.c.status.is_(None) & (_table.c.locked_until < now)))
+        .values(request_hash=fingerprint, status=None, body=None, content_type=None, created_at=now,
+                locked_until=now + timedelta(seconds=config.IDEMPOTENCY_LOCK_S))
+    ).rowcount
+    db.session.commit()
+    return bool(taken)
+
+
+def _replay(row):
+    resp = make_response(row.body, row.status)
+    resp.content_type = row.content_type
+    resp.headers["Idempotent-Replayed"] = "true"
+    return resp
+
+
+def _wait_for(key, fingerprint):
+    """Respuesta guardada por la primera petición, o None si hay que correr el handler"""
+    deadline = time.monotonic() + config.IDEMPOTENCY_WAIT_S
+    while True:
+        row = db.session.get(IdempotencyKey, key, populate_existing=True)
+        if row is None:
+            # La primera falló y liberó la llave
+            if _claim(key, fingerprint, datetime.utcnow()):
+                return None
+            continue
+        if row.request_hash != fingerprint:
+            abort(422, message=f"{HEADER} ya usada con otra petición.")
+        if row.status is not None:
+            return _replay(row)
+        if row.locked_until < datetime.utcnow() and _claim(key, fingerprint, datetime.utcnow()):
+            return None
+        if time.monotonic() > deadline:
+            abort(409, message="Hay una petición con la misma llave en curso; reintenta.",
+                  headers={"Retry-After": "1"})
+        # No retener la conexión mientras se espera
+        db.session.close()
+        time.sleep(POLL_S)
+
+
+def _store(key, response, committed):
+    if 200 <= response.status_code < 300 or committed:
+        db.session.execute(
+            _table.update().where(_table.c.key == key)
+            .values(status=response.status_code, body=response.get_data(),
+                    content_type=response.content_type))
+    else:
+        db.session.execute(_table.delete().where(_table.c.key == key))
+    db.session.commit()
+
+
+def _store_error(key, error):
+    """El handler falló después de confirmar sus cambios: las repeticiones reciben este error"""
+    db.session.rollback()
+    status = error.code if isinstance(error, HTTPException) and error.code else 500
+    body = jsonify(code=status, status=HTTPStatus(status).phrase,
+                   message="La operación se registró pero la respuesta falló; consulta antes de reintentar.")
+    db.session.execute(
+        _table.update().where(_table.c.key == key)
+        .values(status=status, body=body.get_data(), content_type=body.content_type))
+    db.session.commit()
+
+
+@event.listens_for(db.session, "after_commit")
+def _mark_committed(session):
+    if has_request_context() and g.get("_idempotency_running"):
+        g._idempotency_committed = True
+
+
+def _release(key):
+    db.session.rollback()
+    db.session.execute(_table.delete().where(_table.c.key == key))
+    db.session.commit()
+
+
+def _maybe_purge(now):
+    """Borra las llaves vencidas (como mucho una vez cada IDEMPOTENCY_PURGE_S por proceso)"""
+    global _last_purge
+    if time.monotonic() - _last_purge < config.IDEMPOTENCY_PURGE_S or not _purge_lock.acquire(blocking=False):
+        return
+    try:
+        _last_purge = time.monotonic()
+        db.session.execute(_table.delete().where(
+            _table.c.created_at < now - timedelta(seconds=config.IDEMPOTENCY_TTL_S)))
+        db.session.commit()
+    finally:
+        _purge_lock.release()
+
+
+def idempotent(fn):
+    """Decorador para POSTs con efectos; va debajo de @jwt_required() y encima de @blp.arguments"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        header = request.headers.get(HEADER)
+        if header is None:
+            return fn(*args, **kwargs)
+        if not header or len(header) > MAX_KEY_LENGTH:
+            abort(400, message=f"{HEADER} debe tener entre 1 y {MAX_KEY_LENGTH} caracteres.")
+
+        key = f"{get_jwt_identity()}:{request.endpoint}:{header}"
+        fingerprint = _fingerprint()
+        now = datetime.utcnow()
+        _maybe_purge(now)
+        if not _claim(key, fingerprint, now):
+            replayed = _wait_for(key, fingerprint)
+            if replayed is not None:
+                return replayed
+
+        g._idempotency_running, g._idempotency_committed = True, False
+        try:
+            response = make_response(fn(*args, **kwargs))
+        except BaseException as e:
+            g._idempotency_running = False
+            if g._idempotency_committed:
+                _store_error(key, e)
+            else:
+                _release(key)
+            raise
+        g._idempotency_running = False
+        _store(key, response, g._idempotency_committed)
+        return response
+    return wrapper
@@ -0,0 +1,310 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import Response, current_app
+from flask_smorest import abort
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+import config
+from db import db
+from models import Parking, ParkingEvent, SchedulerLease
+import scheduler
+import signals
+
+# ============================================================
+# DISPONIBILIDAD EN VIVO (SERVER-SENT EVENTS)
+# ============================================================
+# El mapa abre GET /api/parkings/stream?bbox=... y recibe solo los cambios
+# {id, available, price_per_hour} de las cocheras dentro de su viewport.
+#
+# Gunicorn corre 4 workers, así que un cambio hecho en un worker tiene que
+# llegar a los clientes conectados a los otros. El DbBroker escribe cada
+# cambio en `parking_events` y un hilo por worker lee los nuevos y los
+# reparte a sus suscriptores. El LocalBroker hace lo mismo en memoria
+# (tests o un solo proceso).
+#
+# Los ids autoincrementales se asignan al insertar, no al hacer commit: un
+# evento puede aparecer después de otro con id mayor. El lector recuerda los
+# ids salteados ("huecos") y los vuelve a pedir durante GAP_TIMEOUT_S; pasado
+# ese tiempo eran inserts deshechos.
+#
+# Mientras algún worker tenga suscriptores mantiene viva la lease
+# LISTENERS_LEASE en `scheduler_leases`; sin ella publish() no escribe nada,
+# así que nadie paga un INSERT + COMMIT por cambio si no hay quien escuche.
+#
+# Las bajas viajan como "tombstones" ({id, deleted: True}) para que el
+# índice de clusters de todos los workers las aplique; el stream no las
+# manda al navegador.
+#
+# Cada stream ocupa un hilo del worker (gthread) mientras el cliente siga
+# conectado. Para que los streams no se coman todos los hilos y dejen sin
+# atender al resto de la API, cada worker acepta como mucho
+# LIVE_MAX_STREAMS a la vez; los siguientes reciben 503 con Retry-After y
+# el EventSource del navegador reintenta solo.
+
+COALESCE_S = 1.0        # Ventana para juntar ráfagas de cambios en un solo evento
+HEARTBEAT_S = 15.0      # Comentario vacío para que proxies no corten la conexión
+POLL_S = 0.5            # Cada cuánto el worker lee parking_events
+EVENT_RETENTION = timedelta(minutes=10)
+GAP_TIMEOUT_S = 10.0    # Cuánto se espera un id salteado antes de darlo por deshecho
+MAX_GAP_IDS = 1000      # Huecos que se siguen de un solo salto de ids
+LISTENERS_LEASE = "live-listeners"
+LISTENERS_TTL_S = 30    # Los workers con suscriptores la renuevan a la mitad
+
+
+class Subscriber:
+    """Un cliente conectado: guarda el último cambio pendiente por cochera"""
+
+    def __init__(self, bbox=None):
+        self.bbox = bbox
+        self._pending = {}
+        self._cond = threading.Condition()
+
+    def matches(self, delta):
+        if delta.get("deleted"):
+            return False
+        if self.bbox is None:
+            return True
+        min_lat, min_lng, max_lat, max_lng = self.bbox
+        return min_lat <= delta["lat"] <= max_lat and min_lng <= delta["lng"] <= max_lng
+
+    def push(self, delta):
+        with self._cond:
+            # Si la misma cochera cambia varias veces, solo importa el último valor
+            self._pending[delta["id"]] = delta
+            self._cond.notify()
+
+    def drain(self, timeout):
+        with self._cond:
+            if not self._pending:
+                self._cond.wait(timeout)
+            batch, self._pending = list(self._pending.values()), {}
+        return batch
+
+
+class LocalBroker:
+    """Pub/sub dentro del proceso"""
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, sub):
+        with self._lock:
+            self._subscribers.add(sub)
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def has_subscribers(self):
+        return bool(self._subscribers)
+
+    def publish(self, deltas):
+        self._fanout(deltas)
+
+    def _fanout(self, deltas):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            for d in deltas:
+                if sub.matches(d):
+                    sub.push(d)
+
+
+class DbBroker(LocalBroker):
+    """Pub/sub entre workers usando la tabla parking_events"""
+
+    def __init__(self, app):
+        super().__init__()
+        self._app = app
+        self._poller = None
+        self._pid = None
+        self._listeners_until = datetime.min     # Última lease de oyentes vista (publicar)
+        self._renewed_until = datetime.min       # Hasta cuándo la renovó este worker
+
+    def has_subscribers(self):
+        # Pueden estar en otros workers: se mira la lease de oyentes. Un "sí" se
+        # recuerda hasta que vence; un "no" se consulta de nuevo en cada cambio
+        # (corre después del commit, y quien se suscribe renueva la lease antes
+        # de leer la base, así que no se pierde nada entre medio)
+        if self._listeners_until > datetime.utcnow():
+            return True
+        until = db.session.query(SchedulerLease.expires_at)\
+            .filter(SchedulerLease.name == LISTENERS_LEASE).scalar()
+        if until is None or until <= datetime.utcnow():
+            return False
+        self._listeners_until = until
+        return True
+
+    def _touch_listeners(self):
+        """Extiende la lease de oyentes si le queda menos de la mitad (necesita app context)"""
+        now = datetime.utcnow()
+        if self._renewed_until - now > timedelta(seconds=LISTENERS_TTL_S / 2):
+            return
+        until = now + timedelta(seconds=LISTENERS_TTL_S)
+        values = {"owner": scheduler.owner_id(), "expires_at": until}
+        lease = SchedulerLease.__table__
+        if not db.session.execute(lease.update().where(lease.c.name == LISTENERS_LEASE)
+                                  .values(values)).rowcount:
+            try:
+                db.session.execute(lease.insert().values(name=LISTENERS_LEASE, **values))
+            except IntegrityError:
+                # Otro worker la creó a la vez
+                db.session.rollback()
+                db.session.execute(lease.update().where(lease.c.name == LISTENERS_LEASE).values(values))
+        db.session.commit()
+        self._renewed_until = until
+
+    def publish(self, deltas):
+        db.session.execute(ParkingEvent.__table__.insert(), [
+            {"parking_id": d["id"], "available": d.get("available") or 0,
+             "price_per_hour": d.get("price_per_hour") or 0, "lat": d.get("lat") or 0,
+             "lng": d.get("lng") or 0, "deleted": bool(d.get("deleted")), "created_at": datetime.utcnow()}
+            for d in deltas
+        ])
+        db.session.commit()
+
+    def subscribe(self, sub):
+        super().subscribe(sub)
+        # La lease se renueva antes de que quien se suscribe lea la base: desde
+        # aquí los cambios de cualquier worker se publican
+        with self._app.app_context():
+            self._touch_listeners()
+        # Un hilo lector por proceso (gunicorn hace fork después de importar)
+        with self._lock:
+            if self._pid != os.getpid() or not self._poller.is_alive():
+                self._pid = os.getpid()
+                # El punto de partida se lee aquí y no en el hilo: quien se suscribe y
+                # luego lee la base (clusters.get_index) no pierde lo que llegue entre medio
+                with self._app.app_context():
+                    last_id = db.session.query(db.func.max(ParkingEvent.id)).scalar() or 0
+                self._poller = threading.Thread(target=self._poll_loop, args=(last_id,), daemon=True)
+                self._poller.start()
+
+    def _poll_loop(self, last_id):
+        with self._app.app_context():
+            last_prune = time.monotonic()
+            gaps = {}       # id salteado -> cuándo se notó
+            while True:
+                try:
+                    if self._subscribers:
+                        self._touch_listeners()
+                    pending = ParkingEvent.id > last_id
+                    if gaps:
+                        pending = or_(pending, ParkingEvent.id.in_(list(gaps)))
+                    rows = ParkingEvent.query.filter(pending)\
+                        .order_by(ParkingEvent.id).limit(1000).all()
+                    now = time.monotonic()
+                    for r in rows:
+                        gaps.pop(r.id, None)
+                        if r.id > last_id:
+                            gaps.update((i, now) for i in range(max(last_id + 1, r.id - MAX_GAP_IDS), r.id))
+                            last_id = r.id
+                    for i in [i for i, seen in gaps.items() if now - seen > GAP_TIMEOUT_S]:
+                        del gaps[i]
+                    if rows:
+                        self._fanout([_event_to_delta(r) for r in rows])
+                    if time.monotonic() - last_prune > EVENT_RETENTION.total_seconds():
+                        ParkingEvent.query.filter(
+                            ParkingEvent.created_at < datetime.utcnow() - EVENT_RETENTION
+                        ).delete()
+                        db.session.commit()
+                        last_prune = time.monotonic()
+                except Exception:
+                    current_app.logger.exception("Error leyendo parking_events")
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+                time.sleep(POLL_S)
+
+
+def _event_to_delta(e):
+    if e.deleted:
+        return {"id": e.parking_id, "deleted": True}
+    return {"id": e.parking_id, "available": e.available, "price_per_hour": str(e.price_per_hour),
+            "lat": e.lat, "lng": e.lng}
+
+
+_broker = None
+_broker_lock = threading.Lock()
+_stream_slots = threading.BoundedSemaphore(config.LIVE_MAX_STREAMS)
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            if config.LIVE_BROKER == "local":
+                _broker = LocalBroker()
+            else:
+                _broker = DbBroker(current_app._get_current_object())
+    return _broker
+
+
+@signals.parking_changed.connect
+def _on_parking_changed(sender, parking_ids=(), **kwargs):
+    # Corre después del commit del cambio: si falla, el cambio ya está hecho
+    # y solo se pierde el aviso en vivo, así que no se propaga
+    if not parking_ids:
+        return
+    broker = get_broker()
+    if not broker.has_subscribers():
+        return
+    try:
+        rows = db.session.query(Parking.id, Parking.available, Parking.price_per_hour, Parking.lat, Parking.lng)\
+            .filter(Parking.id.in_(list(parking_ids))).all()
+        deltas = [
+            {"id": r.id, "available": r.available, "price_per_hour": str(r.price_per_hour),
+             "lat": r.lat, "lng": r.lng}
+            for r in rows
+        ]
+        # Las que ya no existen se borraron
+        found = {r.id for r in rows}
+        deltas += [{"id": pid, "deleted": True} for pid in parking_ids if pid not in found]
+        if deltas:
+            broker.publish(deltas)
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception("Error publicando cambios de disponibilidad")
+
+
+def stream_response(bbox):
+    """Respuesta text/event-stream para un suscriptor con su bbox (503 si el worker está lleno)"""
+    broker = get_broker()
+    sub = Subscriber(bbox)
+    if not _stream_slots.acquire(blocking=False):
+        abort(503, message="Demasiadas conexiones en vivo en este momento, intenta de nuevo.",
+              headers={"Retry-After": str(config.LIVE_RETRY_AFTER_S)})
+    try:
+        broker.subscribe(sub)
+    except Exception:
+        # subscribe escribe la lease y lee la base: si falla no se queda con el cupo
+        broker.unsubscribe(sub)
+        _stream_slots.release()
+        raise
+
+    def generate():
+        yield "retry: 3000\n\n"
+        while True:
+            batch = sub.drain(HEARTBEAT_S)
+            if not batch:
+                yield ": ping\n\n"
+                continue
+            payload = [{"id": d["id"], "available": d["available"], "price_per_hour": d["price_per_hour"]}
+                       for d in batch]
+            yield f"event: availability\ndata: {json.dumps(payload)}\n\n"
+            # Esperar un poco para juntar la siguiente ráfaga
+            time.sleep(COALESCE_S)
+
+    def close():
+        # También corre si el cliente se va antes de la primera línea
+        broker.unsubscribe(sub)
+        _stream_slots.release()
+
+    response = Response(generate(), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    response.call_on_close(close)
+    return response
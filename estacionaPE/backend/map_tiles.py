@@ -0,0 +1,149 @@
+import math
+import threading
+from decimal import Decimal
+from db import db
+from models import Parking
+import geo
+import response_cache
+import signals
+
+# ============================================================
+# TILES COMPACTOS DEL MAPA
+# ============================================================
+# Para dibujar pines la app solo necesita id, posición, disponibles y precio.
+# Un tile XYZ (el mismo esquema que OpenStreetMap/Google) trae esas columnas
+# como arreglos paralelos en vez de un objeto por cochera:
+#
+#   {"tile": [z, x, y], "bounds": [oeste, sur, este, norte], "extent": 4096,
+#    "count": n, "id": [...], "x": [...], "y": [...], "available": [...], "price": [...]}
+#
+# - id: ordenados y en deltas (el primero absoluto): id[i] = id[i-1] + d[i]
+# - x, y: enteros 0..extent dentro del tile (x crece al este, y al sur):
+#     lng = oeste + x / extent * (este - oeste)
+#     lat = norte - y / extent * (norte - sur)
+# - price: precio por hora en céntimos
+#
+# Con ?format=msgpack la misma estructura va en MessagePack (paquete msgpack).
+#
+# El endpoint se cachea con cached_get("tiles", version_name): una alta,
+# edición, baja o importación sube "tiles" (todos), pero un cambio de
+# disponibilidad solo sube la versión de los tiles que contienen esas
+# cocheras, uno por zoom hasta VERSION_ZOOM (los tiles más chicos comparten
+# la de su ancestro). Así una reserva no vacía el caché de todo el mapa.
+
+EXTENT = 4096            # Resolución de las coordenadas dentro del tile (~10 m en zoom 10)
+MIN_ZOOM = 8             # Más lejos el tile excede geo.MAX_ROWS
+MAX_ZOOM = 18
+VERSION_ZOOM = 14        # Zoom más fino con versión propia en cache_versions (~2.4 km)
+MSGPACK_MIMETYPE = "application/msgpack"
+
+
+def tile_bounds(z, x, y):
+    """(oeste, sur, este, norte) del tile en grados"""
+    n = 2 ** z
+
+    def lat(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return x / n * 360.0 - 180.0, lat(y + 1), (x + 1) / n * 360.0 - 180.0, lat(y)
+
+
+def tile_for(lat, lng, z):
+    """(x, y) del tile que contiene la coordenada en el zoom z"""
+    n = 2 ** z
+    lat_r = math.radians(max(min(lat, 85.0511), -85.0511))
+    x = int((lng + 180.0) / 360.0 * n)
+    y = int((1 - math.asinh(math.tan(lat_r)) / math.pi) / 2 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def validate(z, x, y):
+    if not MIN_ZOOM <= z <= MAX_ZOOM:
+        raise ValueError(f"El zoom debe estar entre {MIN_ZOOM} y {MAX_ZOOM}.")
+    if not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise ValueError("Tile fuera de rango para ese zoom.")
+
+
+def build(z, x, y):
+    """Arreglos del tile leídos con una consulta por el índice de celdas"""
+    validate(z, x, y)
+    west, south, east, north = tile_bounds(z, x, y)
+    rows = db.session.query(
+        Parking.id, Parking.lat, Parking.lng, Parking.available, Parking.price_per_hour
+    ).filter(*geo.bbox_filter(Parking, (south, west, north, east))).order_by(Parking.id).all()
+
+    sx = EXTENT / (east - west)
+    sy = EXTENT / (north - south)
+    ids, xs, ys, available, price = [], [], [], [], []
+    last_id = 0
+    for pid, lat, lng, avail, pph in rows:
+        # Borde oeste/norte incluido, este/sur excluido: cada cochera en un solo tile
+        if lng >= east or lat <= south:
+            continue
+        ids.append(pid - last_id)
+        last_id = pid
+        xs.append(int(round((lng - west) * sx)))
+        ys.append(int(round((north - lat) * sy)))
+        available.append(avail or 0)
+        price.append(int((Decimal(pph or 0) * 100).to_integral_value()))
+
+    return {
+        "tile": [z, x, y],
+        "bounds": [round(west, 7), round(south, 7), round(east, 7), round(north, 7)],
+        "extent": EXTENT,
+        "count": len(ids),
+        "id": ids,
+        "x": xs,
+        "y": ys,
+        "available": available,
+        "price": price,
+    }
+
+
+# --- Versiones del caché por tile ---
+
+def version_name(z, x, y):
+    """Versión de caché de la que depende el tile (la de su ancestro en VERSION_ZOOM si es más chico)"""
+    if z > VERSION_ZOOM:
+        x, y, z = x >> (z - VERSION_ZOOM), y >> (z - VERSION_ZOOM), VERSION_ZOOM
+    return f"tile:{z}/{x}/{y}"
+
+
+def version_names(points):
+    """Versiones de los tiles (MIN_ZOOM..VERSION_ZOOM) que contienen esas (lat, lng)"""
+    names = set()
+    for lat, lng in points:
+        for z in range(MIN_ZOOM, VERSION_ZOOM + 1):
+            names.add(version_name(z, *tile_for(lat, lng, z)))
+    return names
+
+
+_changed = set()
+_changed_lock = threading.Lock()
+
+
+def _bump_changed_tiles():
+    with _changed_lock:
+        ids = list(_changed)
+        _changed.clear()
+    try:
+        names = set()
+        for i in range(0, len(ids), 1000):
+            names |= version_names(db.session.query(Parking.lat, Parking.lng)
+                                   .filter(Parking.id.in_(ids[i:i + 1000])))
+        if names:
+            response_cache.bump(*names)
+    except Exception:
+        # Quedan pendientes para el siguiente intento
+        with _changed_lock:
+            _changed.update(ids)
+        raise
+
+
+@signals.parking_changed.connect
+def _on_parking_changed(sender, parking_ids=(), **kwargs):
+    # Los demás cambios (pueden mover la cochera a otro tile) suben "tiles" en response_cache.py
+    if sender in response_cache.AVAILABILITY_SENDERS and parking_ids:
+        with _changed_lock:
+            _changed.update(parking_ids)
+        response_cache.defer("tiles", _bump_changed_tiles)
@@ -0,0 +1,262 @@
+import glob
+import hmac
+import json
+import os
+import threading
+import time
+from flask import Response, current_app, g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import config
+from serialization import FastJSONProvider
+
+# ============================================================
+# MÉTRICAS POR ENDPOINT (FORMATO PROMETHEUS)
+# ============================================================
+# Por cada endpoint y método guardamos histogramas de latencia, cantidad y
+# tiempo de SQL (eventos del Engine), tiempo de serialización (marshmallow +
+# JSON) y tamaño de respuesta. Todo vive en memoria del worker; cada worker
+# vuelca sus números a METRICS_DIR/<pid>.json como mucho una vez por
+# segundo y GET /metrics suma los archivos de todos los workers.
+# Otros módulos suman a los contadores de COUNTERS con inc() (p. ej. los
+# aciertos de response_cache) y viajan por el mismo camino.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+FLUSH_EVERY_S = 1.0
+
+HISTOGRAMS = {
+    "http_request_duration_seconds": ("Latencia de la petición", LATENCY_BUCKETS),
+    "http_request_sql_queries": ("Consultas SQL por petición", SQL_COUNT_BUCKETS),
+    "http_request_sql_seconds": ("Tiempo en SQL por petición", LATENCY_BUCKETS),
+    "http_request_serialization_seconds": ("Tiempo serializando (schemas + JSON)", LATENCY_BUCKETS),
+    "http_response_size_bytes": ("Tamaño de la respuesta", SIZE_BUCKETS),
+    "http_response_compression_seconds": ("Tiempo comprimiendo la respuesta", LATENCY_BUCKETS),
+    "http_response_compression_saved_bytes": ("Bytes ahorrados por la compresión", SIZE_BUCKETS),
+}
+
+COUNTERS = {
+    "response_cache_requests_total": "GETs cacheados por resultado (hits, not_modified, misses)",
+    "response_cache_evictions_total": "Entradas sacadas de la caché por falta de lugar",
+}
+
+_lock = threading.Lock()
+_flush_lock = threading.Lock()  # Un solo hilo del worker escribe <pid>.json a la vez
+_data = {}          # "metrica|endpoint|método" -> [conteo por bucket..., suma, total]
+_requests = {}      # "endpoint|método|status" -> total
+_counters = {}      # 'metrica|etiqueta="valor",...' -> total
+_last_flush = 0.0
+
+
+# --- Acumuladores por petición ---
+
+def add_serialization_time(seconds):
+    """Lo llaman los schemas y el JSON provider al serializar"""
+    if has_request_context():
+        g._metrics_ser = g.get("_metrics_ser", 0.0) + seconds
+
+
+def add_compression(saved_bytes, seconds):
+    """Lo llama response_compression (0 s si el cuerpo ya estaba comprimido en la caché)"""
+    if has_request_context():
+        g._metrics_comp = (saved_bytes, seconds)
+
+
+# El inicio se guarda en el contexto de ejecución de cada sentencia (no en una
+# pila de la conexión): si la sentencia falla no hay after_cursor_execute y el
+# contexto se descarta con ella, sin dejar nada colgado en la conexión
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_t0 = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._metrics_t0
+    if has_request_context():
+        g._metrics_sql_n = g.get("_metrics_sql_n", 0) + 1
+        g._metrics_sql_t = g.get("_metrics_sql_t", 0.0) + elapsed
+
+
+class TimedJSONProvider(FastJSONProvider):
+    def dumps(self, obj, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            add_serialization_time(time.perf_counter() - t0)
+
+    def dumps_compact(self, obj):
+        t0 = time.perf_counter()
+        try:
+            return super().dumps_compact(obj)
+        finally:
+            add_serialization_time(time.perf_counter() - t0)
+
+
+def inc(name, **labels):
+    """Suma 1 a un contador de COUNTERS"""
+    key = name + "|" + ",".join(f'{k}="{_label(str(v))}"' for k, v in sorted(labels.items()))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + 1
+
+
+# --- Registro ---
+
+def _observe(name, endpoint, method, value):
+    buckets = HISTOGRAMS[name][1]
+    key = f"{name}|{endpoint}|{method}"
+    row = _data.get(key)
+    if row is None:
+        row = _data[key] = [0] * (len(buckets) + 2)
+    for i, upper in enumerate(buckets):
+        if value <= upper:
+            row[i] += 1
+            break
+    row[-2] += value
+    row[-1] += 1
+
+
+def _before_request():
+    g._metrics_t0 = time.perf_counter()
+
+
+def _after_request(response):
+    t0 = g.get("_metrics_t0")
+    if t0 is None or request.url_rule is None:
+        return response
+    endpoint, method = request.url_rule.rule, request.method
+    size = 0 if response.is_streamed else (response.calculate_content_length() or 0)
+    with _lock:
+        _observe("http_request_duration_seconds", endpoint, method, time.perf_counter() - t0)
+        _observe("http_request_sql_queries", endpoint, method, g.get("_metrics_sql_n", 0))
+        _observe("http_request_sql_seconds", endpoint, method, g.get("_metrics_sql_t", 0.0))
+        _observe("http_request_serialization_seconds", endpoint, method, g.get("_metrics_ser", 0.0))
+        if not response.is_streamed:
+            _observe("http_response_size_bytes", endpoint, method, size)
+        compression = g.get("_metrics_comp")
+        if compression is not None:
+            _observe("http_response_compression_saved_bytes", endpoint, method, compression[0])
+            _observe("http_response_compression_seconds", endpoint, method, compression[1])
+        key = f"{endpoint}|{method}|{response.status_code}"
+        _requests[key] = _requests.get(key, 0) + 1
+    _maybe_flush()
+    return response
+
+
+# --- Varios workers ---
+
+def _snapshot():
+    with _lock:
+        return {"data": {k: list(v) for k, v in _data.items()}, "requests": dict(_requests),
+                "counters": dict(_counters)}
+
+
+def _maybe_flush(force=False):
+    """Vuelca las métricas del worker. Un error al escribir se registra y no
+    sale de aquí (lo llama after_request de cualquier petición)."""
+    global _last_flush
+    # Si otro hilo ya está escribiendo, solo /metrics (force) lo espera
+    if not _flush_lock.acquire(blocking=force):
+        return
+    try:
+        now = time.monotonic()
+        if not force and now - _last_flush < FLUSH_EVERY_S:
+            return
+        _last_flush = now
+        path = os.path.join(config.METRICS_DIR, f"{os.getpid()}.json")
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(_snapshot(), f)
+        os.replace(tmp, path)
+    except Exception:
+        current_app.logger.exception("Error guardando las métricas del worker")
+    finally:
+        _flush_lock.release()
+
+
+def _clean_dead_workers():
+    for path in glob.glob(os.path.join(config.METRICS_DIR, "*.json")):
+        try:
+            os.kill(int(os.path.basename(path).split(".")[0]), 0)
+        except (ValueError, ProcessLookupError):
+            os.remove(path)
+        except PermissionError:
+            pass
+
+
+def _aggregate():
+    _maybe_flush(force=True)
+    data, requests_total, counters = {}, {}, {}
+    for path in glob.glob(os.path.join(config.METRICS_DIR, "*.json")):
+        try:
+            with open(path) as f:
+                snap = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for k, row in snap["data"].items():
+            acc = data.setdefault(k, [0] * len(row))
+            for i, v in enumerate(row):
+                acc[i] += v
+        for k, v in snap["requests"].items():
+            requests_total[k] = requests_total.get(k, 0) + v
+        for k, v in snap.get("counters", {}).items():
+            counters[k] = counters.get(k, 0) + v
+    return data, requests_total, counters
+
+
+def _label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def render_prometheus():
+    data, requests_total, counters = _aggregate()
+    lines = ["# HELP http_requests_total Peticiones atendidas", "# TYPE http_requests_total counter"]
+    for key in sorted(requests_total):
+        endpoint, method, status = key.split("|")
+        lines.append(f'http_requests_total{{endpoint="{_label(endpoint)}",method="{method}",status="{status}"}} '
+                     f"{requests_total[key]}")
+
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        for key in sorted(k for k in data if k.startswith(name + "|")):
+            _, endpoint, method = key.split("|")
+            row = data[key]
+            labels = f'endpoint="{_label(endpoint)}",method="{method}"'
+            cumulative = 0
+            for upper, count in zip(buckets, row):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels},le="{upper}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {row[-1]}')
+            lines.append(f"{name}_sum{{{labels}}} {row[-2]}")
+            lines.append(f"{name}_count{{{labels}}} {row[-1]}")
+
+    for name, help_text in COUNTERS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        for key in sorted(k for k in counters if k.startswith(name + "|")):
+            labels = key.split("|", 1)[1]
+            lines.append(f"{name}{{{labels}}} {counters[key]}" if labels else f"{name} {counters[key]}")
+    return "\n".join(lines) + "\n"
+
+
+def init_metrics(app):
+    if not config.METRICS_ENABLED:
+        return
+    os.makedirs(config.METRICS_DIR, exist_ok=True)
+    _clean_dead_workers()
+
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+    app.json = TimedJSONProvider(app)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.add_url_rule("/metrics", "metrics", _metrics_view)
+
+
+def _metrics_view():
+    # Solo el scraper con METRICS_TOKEN (tiempos por ruta y consultas no son públicos)
+    expected = f"Bearer {config.METRICS_TOKEN}"
+    if not config.METRICS_TOKEN or not hmac.compare_digest(request.headers.get("Authorization", ""), expected):
+        return Response("forbidden\n", status=403, mimetype="text/plain")
+    return Response(render_prometheus(), mimetype="text/plain; version=0.0.4")
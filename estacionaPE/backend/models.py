@@ -1,6 +1,9 @@
 from datetime import datetime
 from decimal import Decimal
+from sqlalchemy import event, inspect
 from db import db
+from geo import cell_for
+import text_search
 
 class User(db.Model):
     __tablename__ = "users"
@@ -37,8 +40,47 @@ class Parking(db.Model):
     hours = db.Column(db.String(100))
     image_url = db.Column(db.String(255))
     description = db.Column(db.Text)
+    # Celda de la grilla espacial (ver geo.py), se recalcula al guardar
+    geo_cell = db.Column(db.Integer, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+@event.listens_for(Parking, "before_insert")
+@event.listens_for(Parking, "before_update")
+def _sync_geo_cell(mapper, connection, target):
+    if target.lat is not None and target.lng is not None:
+        target.geo_cell = cell_for(target.lat, target.lng)
+
+class ParkingSearchTerm(db.Model):
+    # Índice invertido de trigramas para /api/parkings/search (ver text_search.py)
+    __tablename__ = "parking_search_terms"
+    parking_id = db.Column(db.Integer, db.ForeignKey("parkings.id"), primary_key=True)
+    term = db.Column(db.String(3), primary_key=True)
+    __table_args__ = (db.Index("ix_parking_search_terms_term", "term", "parking_id"),)
+
+def write_search_terms(connection, parking):
+    """Reemplaza los trigramas indexados de una cochera"""
+    table = ParkingSearchTerm.__table__
+    connection.execute(table.delete().where(table.c.parking_id == parking.id))
+    terms = text_search.parking_terms(parking)
+    if terms:
+        connection.execute(table.insert(), [{"parking_id": parking.id, "term": t} for t in terms])
+
+@event.listens_for(Parking, "after_insert")
+def _index_new_parking(mapper, connection, target):
+    write_search_terms(connection, target)
+
+@event.listens_for(Parking, "after_update")
+def _reindex_parking(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[f].history.has_changes() for f in text_search.SEARCH_FIELDS):
+        write_search_terms(connection, target)
+
+@event.listens_for(Parking, "before_delete")
+def _unindex_parking(mapper, connection, target):
+    # Filas derivadas que apuntan a la cochera (si no, la FK impide borrarla)
+    for table in (ParkingSearchTerm.__table__, CapacityBucket.__table__, DailyParkingStats.__table__):
+        connection.execute(table.delete().where(table.c.parking_id == target.id))
+
 class Reservation(db.Model):
     __tablename__ = "reservations"
     id = db.Column(db.Integer, primary_key=True)
@@ -48,7 +90,81 @@ class Reservation(db.Model):
     end_time = db.Column(db.DateTime, nullable=True)
     status = db.Column(db.String(20), default="reserved") 
     total_amount = db.Column(db.Numeric(10, 2))
+    # Tiene un pago confirmado; a diferencia de status="paid" no cambia al vencer (ver expiry.py)
+    paid = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Sirve a la validación de cruce de horarios al reservar
+    __table_args__ = (
+        db.Index("ix_reservations_user_parking_start", "user_id", "parking_id", "start_time"),
+        # Reservas activas por hora de término (ver expiry.py)
+        db.Index("ix_reservations_status_end", "status", "end_time"),
+    )
+
+@event.listens_for(Reservation, "before_insert")
+@event.listens_for(Reservation, "before_update")
+def _sync_paid(mapper, connection, target):
+    if target.status == "paid":
+        target.paid = True
+
+class CapacityBucket(db.Model):
+    # Espacios reservados por cochera y bloque de 15 min (ver capacity.py)
+    __tablename__ = "parking_capacity_buckets"
+    parking_id = db.Column(db.Integer, db.ForeignKey("parkings.id"), primary_key=True)
+    bucket = db.Column(db.Integer, primary_key=True, index=True)
+    reserved = db.Column(db.Integer, nullable=False, default=0)
+
+class ParkingEvent(db.Model):
+    # Cambios de disponibilidad/precio para el stream en vivo (ver live_updates.py)
+    __tablename__ = "parking_events"
+    id = db.Column(db.Integer, primary_key=True)
+    parking_id = db.Column(db.Integer, nullable=False)
+    available = db.Column(db.Integer, nullable=False)
+    price_per_hour = db.Column(db.Numeric(10, 2), nullable=False)
+    lat = db.Column(db.Float, nullable=False)
+    lng = db.Column(db.Float, nullable=False)
+    # Baja de la cochera: los demás campos no importan (ver clusters.py)
+    deleted = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+class DailyParkingStats(db.Model):
+    # Rollup diario por cochera para los reportes (ver rollups.py)
+    __tablename__ = "daily_parking_stats"
+    parking_id = db.Column(db.Integer, db.ForeignKey("parkings.id"), primary_key=True)
+    day = db.Column(db.Date, primary_key=True, index=True)
+    reservations = db.Column(db.Integer, nullable=False, default=0)
+    paid_revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    payments_count = db.Column(db.Integer, nullable=False, default=0)
+    payments_total = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+
+class CacheVersion(db.Model):
+    # Versión de los datos cacheados; las escrituras la suben (ver response_cache.py)
+    __tablename__ = "cache_versions"
+    name = db.Column(db.String(40), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class CapacityRoll(db.Model):
+    # Bloque del calendario que refleja hoy Parking.available (una sola fila)
+    __tablename__ = "capacity_roll"
+    id = db.Column(db.Integer, primary_key=True)
+    last_bucket = db.Column(db.Integer, nullable=False)
+
+class SchedulerLease(db.Model):
+    # Qué proceso corre cada tarea periódica y hasta cuándo (ver scheduler.py)
+    __tablename__ = "scheduler_leases"
+    name = db.Column(db.String(40), primary_key=True)
+    owner = db.Column(db.String(120), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+class IdempotencyKey(db.Model):
+    # Respuesta guardada por Idempotency-Key (ver idempotency.py)
+    __tablename__ = "idempotency_keys"
+    key = db.Column(db.String(255), primary_key=True)     # usuario:endpoint:llave
+    request_hash = db.Column(db.String(64), nullable=False)
+    status = db.Column(db.Integer)                       # NULL mientras la primera está en curso
+    body = db.Column(db.LargeBinary)
+    content_type = db.Column(db.String(100))
+    locked_until = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
 class Payment(db.Model):
     __tablename__ = "payments"
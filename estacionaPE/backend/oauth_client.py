@@ -1,17 +1,145 @@
-from authlib.integrations.flask_client import OAuth
+import logging
 import os
+import threading
+import time
+from authlib.integrations.flask_client import OAuth, FlaskOAuth2App
+from authlib.integrations.requests_client import OAuth2Session
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import config
 
-oauth = OAuth()
+# ============================================================
+# SSO: METADATA/JWKS EN CACHÉ Y CONEXIONES REUTILIZADAS
+# ============================================================
+# authlib crea una sesión HTTP nueva por cada llamada (sin keep-alive) y
+# guarda el documento de discovery y las llaves (JWKS) para siempre. Aquí:
+# - Todas las sesiones comparten un pool de conexiones con timeouts cortos.
+# - Discovery y JWKS se cachean con TTL por worker; si el proveedor rota
+#   llaves (kid desconocido) se vuelve a pedir el JWKS, como mucho una vez
+#   cada SSO_JWKS_MIN_REFRESH_S. Si el proveedor no responde se sigue usando
+#   la copia vencida.
+# - El ID token se valida localmente (firma, iss, aud, exp, nonce), también
+#   el de Microsoft multi-tenant, cuyo issuer trae "{tenantid}".
+
+log = logging.getLogger(__name__)
+
+
+class _SharedAdapter(HTTPAdapter):
+    def close(self):
+        # Session.close() cierra sus adapters; este lo comparten todas
+        pass
+
+
+_adapter = _SharedAdapter(
+    pool_connections=4, pool_maxsize=config.SSO_HTTP_POOL_SIZE,
+    max_retries=Retry(total=1, backoff_factor=0.1, allowed_methods=frozenset({"GET"}))
+)
+
+
+class PooledOAuth2Session(OAuth2Session):
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("default_timeout", (config.SSO_CONNECT_TIMEOUT_S, config.SSO_READ_TIMEOUT_S))
+        super().__init__(*args, **kwargs)
+        self.mount("https://", _adapter)
+        self.mount("http://", _adapter)
+
+
+class _DocumentCache:
+    """Documentos JSON por URL con TTL (discovery, JWKS)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._docs = {}     # url -> (vence, doc)
+        self._forced = {}   # url -> último re-fetch forzado
+        self.fetches = 0
+
+    def get(self, url, ttl, fetch, force=False, min_refresh=0):
+        now = time.monotonic()
+        with self._lock:
+            cached = self._docs.get(url)
+            if force and cached and now - self._forced.get(url, -min_refresh) < min_refresh:
+                force = False       # Ya se forzó hace poco: kid inválido de verdad, no rotación
+            if force:
+                self._forced[url] = now
+        if cached:
+            expires, doc = cached
+            if now < expires and not force:
+                return doc
+        try:
+            doc = fetch(url)
+        except Exception:
+            if cached:
+                log.warning("SSO: no se pudo refrescar %s, se usa la copia anterior", url)
+                return cached[1]
+            raise
+        with self._lock:
+            self._docs[url] = (now + ttl, doc)
+            self.fetches += 1
+        return doc
+
+    def clear(self):
+        with self._lock:
+            self._docs.clear()
+            self._forced.clear()
+
+
+documents = _DocumentCache()
+
+
+def _tenant_issuer(template):
+    """Valida el iss de Microsoft multi-tenant contra el tid del propio token"""
+    def validate(claims, value):
+        return value == template.replace("{tenantid}", str(claims.get("tid", "")))
+    return validate
+
+
+class CachedOAuth2App(FlaskOAuth2App):
+    client_cls = PooledOAuth2Session
+
+    def _fetch_json(self, url):
+        with self._get_session() as session:
+            resp = session.request("GET", url, withhold_token=True)
+            resp.raise_for_status()
+            return resp.json()
+
+    def load_server_metadata(self):
+        if self._server_metadata_url:
+            doc = documents.get(self._server_metadata_url, config.SSO_METADATA_TTL_S, self._fetch_json)
+            if getattr(self, "_metadata_doc", None) is not doc:
+                self.server_metadata.update(doc)
+                self._metadata_doc = doc
+        return self.server_metadata
+
+    def fetch_jwk_set(self, force=False):
+        uri = self.load_server_metadata().get("jwks_uri")
+        if not uri:
+            raise RuntimeError('Missing "jwks_uri" in metadata')
+        return documents.get(uri, config.SSO_JWKS_TTL_S, self._fetch_json,
+                             force=force, min_refresh=config.SSO_JWKS_MIN_REFRESH_S)
+
+    def parse_id_token(self, token, nonce, claims_options=None, **kwargs):
+        issuer = self.load_server_metadata().get("issuer", "")
+        if claims_options is None and "{tenantid}" in issuer:
+            claims_options = {"iss": {"essential": True, "validate": _tenant_issuer(issuer)}}
+        return super().parse_id_token(token, nonce, claims_options=claims_options, **kwargs)
+
+
+class CachedOAuth(OAuth):
+    oauth2_client_cls = CachedOAuth2App
+
+
+oauth = CachedOAuth()
 
 def register_oauth(app):
     oauth.init_app(app)
-    
+
     # Configuración de Google
     oauth.register(
         name='google',
         client_id=os.getenv("GOOGLE_CLIENT_ID"),
         client_secret=os.getenv("GOOGLE_CLIENT_SECRET"),
-        server_metadata_url='https://accounts.google.com/.well-known/openid-configuration',
+        server_metadata_url=config.SSO_GOOGLE_METADATA_URL,
         client_kwargs={'scope': 'openid profile email'}
     )
 
@@ -20,6 +148,6 @@ def register_oauth(app):
         name='microsoft',
         client_id=os.getenv("MICROSOFT_CLIENT_ID"),
         client_secret=os.getenv("MICROSOFT_CLIENT_SECRET"),
-        server_metadata_url='https://login.microsoftonline.com/common/v2.0/.well-known/openid-configuration',
+        server_metadata_url=config.SSO_MICROSOFT_METADATA_URL,
         client_kwargs={'scope': 'openid profile email User.Read'}
-    )
\ No newline at end of file
+    )
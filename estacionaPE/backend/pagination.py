@@ -0,0 +1,56 @@
+import base64
+import json
+from flask_smorest import abort
+from marshmallow import Schema, fields, validate
+import config
+
+# ============================================================
+# PAGINACIÓN POR CURSOR (KEYSET)
+# ============================================================
+# En vez de OFFSET usamos el último id visto: cada página es un
+# `WHERE id < :cursor ORDER BY id DESC LIMIT n`, que usa la llave primaria
+# y cuesta lo mismo en la página 1 que en la 10.000.
+# El cursor de la siguiente página viaja en la cabecera X-Pagination para
+# que el cuerpo siga siendo la misma lista de siempre.
+# Sin `limit` se usa PAGE_DEFAULT_LIMIT y un `limit` mayor a PAGE_MAX_LIMIT
+# se recorta: ningún listado devuelve la tabla entera. La app
+# (frondend/App.js) sigue `next_cursor` hasta la última página.
+
+
+class CursorArgs(Schema):
+    cursor = fields.Str()
+    limit = fields.Int(
+        load_default=config.PAGE_DEFAULT_LIMIT,
+        validate=validate.Range(min=1)
+    )
+
+
+def encode_cursor(last_id):
+    raw = json.dumps({"id": last_id}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return int(json.loads(base64.urlsafe_b64decode(padded))["id"])
+    except (ValueError, KeyError, TypeError):
+        abort(400, message="Cursor inválido.")
+
+
+def keyset_page(query, id_column, args):
+    """Devuelve (filas, cabeceras) de una página ordenada por id descendente"""
+    limit = min(args["limit"], config.PAGE_MAX_LIMIT)
+
+    if args.get("cursor"):
+        query = query.filter(id_column < decode_cursor(args["cursor"]))
+
+    # Pedimos una fila extra para saber si hay más páginas
+    rows = query.order_by(id_column.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].id)
+
+    headers = {"X-Pagination": json.dumps({"limit": limit, "next_cursor": next_cursor})}
+    return rows, headers
@@ -0,0 +1,126 @@
+import hmac
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from flask import jsonify
+from werkzeug.security import generate_password_hash, check_password_hash
+import config
+
+# ============================================================
+# HASHING DE CONTRASEÑAS FUERA DEL WORKER
+# ============================================================
+# scrypt tarda ~80 ms de CPU y 32 MB por hash. Hecho en línea, una ráfaga de
+# logins ocupa todos los hilos del worker y el resto de endpoints espera.
+# Aquí cada worker de gunicorn manda el hash a un pool pequeño de procesos:
+# - Como mucho PASSWORD_POOL_MAX_PENDING hashes en vuelo por worker; si no
+#   hay cupo en PASSWORD_QUEUE_TIMEOUT_S se responde 503 con Retry-After
+#   en vez de acumular una cola sin fin.
+# - Al entrar con éxito, las contraseñas en texto plano (filas legacy) o con
+#   un método/parámetros viejos se vuelven a hashear con PASSWORD_HASH_METHOD.
+# Con PASSWORD_POOL_WORKERS=0 todo corre en línea (CLI, scripts).
+
+log = logging.getLogger(__name__)
+
+_HASH_PREFIXES = ("scrypt:", "pbkdf2:")
+
+
+class PasswordServiceBusy(Exception):
+    """No hubo cupo en el pool de hashing a tiempo"""
+
+
+# --- Funciones que corren en el pool (deben poder importarse y serializarse) ---
+
+def _hash(password, method):
+    return generate_password_hash(password, method=method)
+
+
+def _check(stored, password):
+    return check_password_hash(stored, password)
+
+
+# --- Pool por proceso ---
+
+_pool = None
+_pool_pid = None
+_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(max(1, config.PASSWORD_POOL_MAX_PENDING))
+_current_prefix = None
+
+
+def _executor():
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        with _lock:
+            if _pool is None or _pool_pid != os.getpid():
+                # spawn: hacer fork de un worker con hilos (gthread) no es seguro
+                _pool = ProcessPoolExecutor(max_workers=config.PASSWORD_POOL_WORKERS,
+                                            mp_context=multiprocessing.get_context("spawn"))
+                _pool_pid = os.getpid()
+    return _pool
+
+
+def _run(fn, *args):
+    if config.PASSWORD_POOL_WORKERS <= 0:
+        return fn(*args)
+    if not _slots.acquire(timeout=config.PASSWORD_QUEUE_TIMEOUT_S):
+        raise PasswordServiceBusy()
+    try:
+        return _executor().submit(fn, *args).result()
+    except BrokenProcessPool:
+        # Un proceso del pool murió (ej. OOM): se crea otro en la siguiente llamada
+        global _pool
+        with _lock:
+            _pool = None
+        log.warning("Pool de contraseñas caído, se reinicia")
+        raise PasswordServiceBusy()
+    finally:
+        _slots.release()
+
+
+# --- API ---
+
+def is_hashed(stored):
+    return bool(stored) and stored.startswith(_HASH_PREFIXES) and "$" in stored
+
+
+def _method_prefix():
+    """Prefijo completo del método actual (ej. 'scrypt:32768:8:1')"""
+    global _current_prefix
+    if _current_prefix is None:
+        _current_prefix = _hash("x", config.PASSWORD_HASH_METHOD).split("$", 1)[0]
+    return _current_prefix
+
+
+def needs_rehash(stored):
+    """Texto plano o hash con otro método/parámetros que los actuales"""
+    if not is_hashed(stored):
+        return True
+    return stored.split("$", 1)[0] != _method_prefix()
+
+
+def hash_password(password):
+    return _run(_hash, password, config.PASSWORD_HASH_METHOD)
+
+
+def verify_password(stored, password):
+    if not stored or not password:
+        return False
+    if not is_hashed(stored):
+        # Filas legacy con la contraseña en texto plano
+        return hmac.compare_digest(stored.encode(), password.encode())
+    return _run(_check, stored, password)
+
+
+def _busy(error):
+    response = jsonify(code=503, status="Service Unavailable",
+                       message="Demasiados inicios de sesión en este momento, intenta de nuevo.")
+    response.status_code = 503
+    response.headers["Retry-After"] = str(config.PASSWORD_RETRY_AFTER_S)
+    return response
+
+
+def init_passwords(app):
+    app.register_error_handler(PasswordServiceBusy, _busy)
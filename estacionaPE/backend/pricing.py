@@ -0,0 +1,34 @@
+import math
+from decimal import Decimal, ROUND_HALF_UP
+
+# ============================================================
+# TARIFAS Y PROMOCIONES
+# ============================================================
+
+CENT = Decimal("0.01")
+
+
+def billable_hours(start, end):
+    """Horas a cobrar: se redondea hacia arriba, mínimo 1 hora"""
+    return max(1, math.ceil((end - start).total_seconds() / 3600.0))
+
+
+def apply_promotion(base, promo):
+    """Precio final con una promoción (porcentaje y/o monto fijo), nunca negativo"""
+    total = base
+    if promo.discount_percent:
+        total -= base * Decimal(promo.discount_percent) / 100
+    if promo.flat_amount:
+        total -= Decimal(promo.flat_amount)
+    return max(total, Decimal(0)).quantize(CENT, ROUND_HALF_UP)
+
+
+def quote(price_per_hour, hours, promos):
+    """Costo base y mejor precio con las promociones dadas. Devuelve (base, total, promo)"""
+    base = (Decimal(price_per_hour) * hours).quantize(CENT, ROUND_HALF_UP)
+    best_total, best_promo = base, None
+    for promo in promos:
+        total = apply_promotion(base, promo)
+        if total < best_total:
+            best_total, best_promo = total, promo
+    return base, best_total, best_promo
@@ -0,0 +1,147 @@
+import threading
+from bisect import insort
+from collections import defaultdict
+from datetime import datetime
+from types import SimpleNamespace
+from sqlalchemy import or_
+from models import Promotion
+import response_cache
+import signals
+
+# ============================================================
+# ÍNDICE EN MEMORIA DE PROMOCIONES VIGENTES
+# ============================================================
+# Por cochera guardamos los intervalos [start_date, end_date] de sus
+# promociones activas (ordenados por inicio) con una copia de sus columnas,
+# así el mapa puede pedir las promos de cientos de cocheras sin una
+# consulta por pin. Las rutas las vuelcan con PromotionOut.
+#
+# - Las escrituras de este worker se aplican al momento (promotion_changed).
+# - Las de otros workers se detectan con la versión "promotions" de
+#   cache_versions (ver response_cache.py) y provocan una recarga completa.
+# - Al pasar el siguiente inicio/fin de alguna promo se limpian las vencidas.
+
+_MIN_DATE = datetime.min
+_MAX_DATE = datetime.max
+_COLUMNS = Promotion.__table__.columns
+
+
+class PromotionIndex:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_parking = defaultdict(list)   # parking_id -> [(start, end, id, parking_id, fila)]
+        self._parking_of = {}                   # promotion_id -> parking_id
+        self._version = None
+        self._local_writes = 0
+        self._next_boundary = _MAX_DATE
+
+    # --- Carga y refresco ---
+
+    def _rows_to_entries(self, promos):
+        # Copia de las columnas: los objetos del ORM no sobreviven a la sesión
+        return [
+            (p.start_date or _MIN_DATE, p.end_date or _MAX_DATE, p.id, p.parking_id,
+             SimpleNamespace(**{c.key: getattr(p, c.key) for c in _COLUMNS}))
+            for p in promos
+        ]
+
+    def _load_query(self, now):
+        return Promotion.query.filter(
+            Promotion.is_active == True,
+            or_(Promotion.end_date == None, Promotion.end_date >= now)
+        )
+
+    def reload(self, now, version=None):
+        if version is None:
+            version = response_cache.current_versions(("promotions",))
+        entries = self._rows_to_entries(self._load_query(now).all())
+        with self._lock:
+            self._by_parking = defaultdict(list)
+            self._parking_of = {}
+            for entry in entries:
+                self._insert(entry)
+            self._version = version
+            self._local_writes = 0
+            self._recompute_boundary(now)
+
+    def ensure_fresh(self, now):
+        version = response_cache.current_versions(("promotions",))
+        with self._lock:
+            expected = None if self._version is None else (self._version[0] + self._local_writes,)
+            if version == expected:
+                # Todas las versiones nuevas son escrituras nuestras, ya aplicadas
+                self._version, self._local_writes = version, 0
+                if now >= self._next_boundary:
+                    self._prune(now)
+                return
+        self.reload(now, version)
+
+    def apply_changes(self, promotion_ids, now):
+        """Reemplaza en el índice las promociones indicadas (creadas/editadas/borradas)"""
+        fresh = self._rows_to_entries(
+            self._load_query(now).filter(Promotion.id.in_(list(promotion_ids))).all()
+        )
+        with self._lock:
+            for pid in promotion_ids:
+                self._remove(pid)
+            for entry in fresh:
+                self._insert(entry)
+            self._local_writes += 1
+            self._recompute_boundary(now)
+
+    # --- Estructura interna (con el lock tomado) ---
+
+    def _insert(self, entry):
+        insort(self._by_parking[entry[3]], entry, key=lambda e: (e[0], e[2]))
+        self._parking_of[entry[2]] = entry[3]
+
+    def _remove(self, promotion_id):
+        parking_id = self._parking_of.pop(promotion_id, None)
+        if parking_id is not None:
+            self._by_parking[parking_id] = [e for e in self._by_parking[parking_id] if e[2] != promotion_id]
+
+    def _prune(self, now):
+        for parking_id in list(self._by_parking):
+            vigentes = [e for e in self._by_parking[parking_id] if e[1] >= now]
+            for e in self._by_parking[parking_id]:
+                if e[1] < now:
+                    self._parking_of.pop(e[2], None)
+            self._by_parking[parking_id] = vigentes
+        self._recompute_boundary(now)
+
+    def _recompute_boundary(self, now):
+        boundary = _MAX_DATE
+        for entries in self._by_parking.values():
+            for start, end, *_ in entries:
+                if start > now:
+                    boundary = min(boundary, start)
+                    break               # ordenadas por inicio
+            for start, end, *_ in entries:
+                if end >= now:
+                    boundary = min(boundary, end)
+        self._next_boundary = boundary
+
+    # --- Consulta ---
+
+    def active_for(self, parking_ids, now):
+        """Promociones vigentes en `now` para varias cocheras, en una sola pasada"""
+        self.ensure_fresh(now)
+        result = []
+        with self._lock:
+            for parking_id in parking_ids:
+                for start, end, promo_id, _, row in self._by_parking.get(parking_id, ()):
+                    if start > now:
+                        break
+                    if end >= now:
+                        result.append(row)
+        return result
+
+
+index = PromotionIndex()
+
+
+@signals.promotion_changed.connect
+def _on_promotion_changed(sender, promotion_ids=(), **kwargs):
+    if promotion_ids and index._version is not None:
+        index.apply_changes(promotion_ids, datetime.utcnow())
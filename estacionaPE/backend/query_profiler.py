@@ -0,0 +1,199 @@
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from flask import current_app, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import config
+
+# ============================================================
+# PERFILADOR DE CONSULTAS (DESARROLLO / PRUEBAS)
+# ============================================================
+# Captura cada sentencia SQL ejecutada dentro de un bloque `capture()` (o de
+# una petición, con QUERY_PROFILER=1) usando los eventos del Engine. Sirve
+# para dos cosas:
+#   - Presupuestos: BUDGETS fija el máximo de consultas por endpoint;
+#     `assert_max_queries()` falla si un bloque se pasa.
+#   - N+1: sentencias con la misma forma (mismo SQL sin importar los
+#     valores) repetidas N_PLUS_ONE_MIN veces o más en una misma petición.
+# scripts/query_budget.py recorre los endpoints sobre un SQLite local.
+
+N_PLUS_ONE_MIN = 3
+
+# Máximo de consultas por "MÉTODO regla". Incluyen las que agregan los
+# listeners (rollups, trigramas) y la invalidación de cachés. Los de reservas
+# y pagos parten de lo que hacía el handler original (con la recarga del
+# objeto tras el commit) y suman solo lo que se justifica:
+#   POST reservations: 5 + 2 calendario (crear/sumar bloques) + 1 bloque en
+#     vivo + 1 rollup; el UPDATE de available ya no va si no está en curso
+#   pay-reservation: 6 + 2 rollups (el pago y la facturación de la reserva)
+#   DELETE reservation: 4 (reserva, cochera, available, DELETE); ahora
+#     calendario + bloque en vivo + rollup en vez de leer la cochera: 6
+# Idempotency-Key es opcional y agrega sus propias consultas (ver idempotency.py).
+BUDGETS = {
+    "GET /api/parkings/": 3,
+    "POST /api/parkings/": 10,
+    "GET /api/parkings/search": 4,
+    "GET /api/parkings/nearby": 4,
+    "GET /api/reservations/": 2,
+    "POST /api/reservations/": 9,
+    "DELETE /api/reservations/<int:rid>": 6,
+    "GET /api/reservations/estimate-batch": 2,
+    "POST /api/payments/pay-reservation/<int:rid>": 8,
+    "GET /api/promotions/active": 3,
+    "GET /api/reports/summary": 3,
+    "GET /api/reports/revenue-by-parking": 2,
+    "GET /api/reports/reservations-by-day": 2,
+    "GET /api/reports/best-parkings": 2,
+}
+
+_local = threading.local()
+_IN_LIST = re.compile(r"\bIN\s*\((?:\s*(?:\?|%s|:\w+)\s*,?)+\)|\(__\[POSTCOMPILE_\w+\]\)", re.I)
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_VALUES = re.compile(r"\bVALUES\s*(\((?:[^()]|\([^()]*\))*\))(?:\s*,\s*\1)+", re.I)
+_SPACES = re.compile(r"\s+")
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def statement_shape(sql):
+    """SQL sin valores concretos: dos consultas con la misma forma difieren solo en parámetros"""
+    shape = _LITERAL.sub("?", sql)
+    shape = _IN_LIST.sub("IN (...)", shape)
+    shape = _VALUES.sub(r"VALUES \1", shape)
+    return _SPACES.sub(" ", shape).strip()
+
+
+class QueryCapture:
+
+    def __init__(self):
+        self.statements = []        # (sql, segundos, executemany)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    @property
+    def total_time(self):
+        return sum(s for _, s, _ in self.statements)
+
+    def repeated(self, min_count=N_PLUS_ONE_MIN):
+        """Formas de sentencia repetidas al menos `min_count` veces (posible N+1)"""
+        shapes = Counter(statement_shape(sql) for sql, _, _ in self.statements)
+        return [(shape, n) for shape, n in shapes.most_common() if n >= min_count]
+
+    def report(self):
+        lines = [f"{self.count} consultas, {self.total_time * 1000:.1f} ms"]
+        for i, (sql, seconds, many) in enumerate(self.statements, start=1):
+            lines.append(f"  {i:>3}. [{seconds * 1000:6.2f} ms]{' (executemany)' if many else ''} "
+                         f"{_SPACES.sub(' ', sql)[:200]}")
+        for shape, n in self.repeated():
+            lines.append(f"  N+1? x{n}: {shape[:200]}")
+        return "\n".join(lines)
+
+
+def _stack():
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if getattr(_local, "stack", None):
+        # En el contexto de la sentencia: si falla se descarta con ella (ver metrics.py)
+        context._profiler_t0 = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stack = getattr(_local, "stack", None)
+    start = getattr(context, "_profiler_t0", None)
+    if not stack or start is None:
+        return
+    elapsed = time.perf_counter() - start
+    for cap in stack:
+        cap.statements.append((statement, elapsed, executemany))
+
+
+def _install():
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+
+@contextmanager
+def capture():
+    """Junta las sentencias SQL que ejecuta este hilo dentro del bloque"""
+    _install()
+    cap = QueryCapture()
+    _stack().append(cap)
+    try:
+        yield cap
+    finally:
+        _stack().remove(cap)
+
+
+@contextmanager
+def assert_max_queries(budget, label="bloque", allow_repeated=False):
+    """Falla con QueryBudgetExceeded si el bloque ejecuta más de `budget` consultas
+    (o, salvo allow_repeated, si alguna forma se repite como N+1)"""
+    with capture() as cap:
+        yield cap
+    if cap.count > budget:
+        raise QueryBudgetExceeded(f"{label}: {cap.count} consultas (presupuesto {budget})\n{cap.report()}")
+    if not allow_repeated and cap.repeated():
+        raise QueryBudgetExceeded(f"{label}: posible N+1\n{cap.report()}")
+
+
+def endpoint_key():
+    rule = request.url_rule.rule if request.url_rule else request.path
+    return f"{request.method} {rule}"
+
+
+def check(key, cap):
+    """Problemas de una petición: presupuesto superado y formas repetidas"""
+    problems = []
+    budget = BUDGETS.get(key)
+    if budget is not None and cap.count > budget:
+        problems.append(f"{cap.count} consultas (presupuesto {budget})")
+    for shape, n in cap.repeated():
+        problems.append(f"posible N+1 x{n}: {shape[:160]}")
+    return problems
+
+
+# --- Modo desarrollo: perfilar cada petición ---
+
+def _start_request():
+    cap = QueryCapture()
+    _stack().append(cap)
+    g._query_capture = cap
+
+
+def _finish_request(response):
+    cap = g.get("_query_capture")
+    if cap is None:
+        return response
+    key = endpoint_key()
+    response.headers["X-Query-Count"] = str(cap.count)
+    for problem in check(key, cap):
+        current_app.logger.warning("[query-profiler] %s: %s", key, problem)
+    return response
+
+
+def _end_request(exc):
+    cap = g.pop("_query_capture", None)
+    if cap is not None and cap in _stack():
+        _stack().remove(cap)
+
+
+def init_profiler(app):
+    if not config.QUERY_PROFILER:
+        return
+    _install()
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_end_request)
@@ -0,0 +1,201 @@
+import functools
+import random
+import threading
+import time
+from flask import g, request, has_request_context
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import event, text
+from sqlalchemy.sql import Select
+import config
+from db import db, RoutingSession
+
+# ============================================================
+# LECTURAS EN RÉPLICAS
+# ============================================================
+# Con DATABASE_REPLICA_URLS se registran binds "replica_0", "replica_1"...
+# Los handlers marcados con @read_only leen de una réplica sana; todo lo
+# demás (y cualquier escritura) va al primario.
+#
+# - Salud: un hilo por worker revisa cada REPLICA_CHECK_INTERVAL_S que la
+#   réplica responda y cuánto retraso tiene (en MySQL, Seconds_Behind_Source).
+#   Las que fallan o se atrasan más de REPLICA_MAX_LAG_S no se usan.
+# - Leer lo propio: quien escribe queda fijado al primario durante
+#   REPLICA_MAX_LAG_S (por usuario del JWT y con la cookie db_primary_until),
+#   así la reserva recién creada aparece en el siguiente GET.
+
+PIN_COOKIE = "db_primary_until"
+
+
+class Replica:
+
+    def __init__(self, name, engine):
+        self.name = name
+        self.engine = engine
+        self.healthy = False        # hasta el primer chequeo
+        self.lag_s = None
+        self.error = None
+        self.checked_at = None
+
+    def check(self):
+        try:
+            with self.engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+                self.lag_s = _replication_lag(conn)
+            self.healthy = self.lag_s is not None and self.lag_s <= config.REPLICA_MAX_LAG_S
+            self.error = None if self.lag_s is not None else "replicación detenida"
+        except Exception as e:          # Cualquier falla de conexión deja fuera a la réplica
+            self.healthy, self.error = False, str(e)[:200]
+        self.checked_at = time.time()
+
+    def status(self):
+        return {"name": self.name, "healthy": self.healthy, "lag_s": self.lag_s,
+                "error": self.error, "checked_at": self.checked_at}
+
+
+def _replication_lag(conn):
+    """Segundos de retraso de la réplica (None si la replicación no corre)"""
+    if conn.dialect.name != "mysql":
+        return 0.0
+    for stmt, column in (("SHOW REPLICA STATUS", "Seconds_Behind_Source"),
+                         ("SHOW SLAVE STATUS", "Seconds_Behind_Master")):
+        try:
+            row = conn.execute(text(stmt)).mappings().first()
+        except Exception:
+            continue
+        if row is None:
+            return 0.0          # No es réplica (ej. un MySQL local para pruebas)
+        lag = row.get(column)
+        return None if lag is None else float(lag)
+    return None
+
+
+_replicas = []
+_pins = {}                      # identidad del JWT -> hasta cuándo leer del primario
+_lock = threading.Lock()
+_checker = None
+
+
+# --- Selección ---
+
+def _checker_loop():
+    while True:
+        for replica in _replicas:
+            replica.check()
+        time.sleep(config.REPLICA_CHECK_INTERVAL_S)
+
+
+def _ensure_checker():
+    global _checker
+    if _checker is None:
+        with _lock:
+            if _checker is None:
+                _checker = threading.Thread(target=_checker_loop, daemon=True, name="replica-health")
+                _checker.start()
+
+
+def pick():
+    """Una réplica sana al azar, o None"""
+    _ensure_checker()
+    sanas = [r for r in _replicas if r.healthy]
+    return random.choice(sanas) if sanas else None
+
+
+def _identity():
+    try:
+        return get_jwt_identity()
+    except Exception:               # Sin JWT verificado en esta petición
+        return None
+
+
+def _pinned():
+    until = request.cookies.get(PIN_COOKIE, type=float)
+    if until and until > time.time():
+        return True
+    identity = _identity()
+    if identity is None:
+        return False
+    with _lock:
+        return _pins.get(identity, 0) > time.time()
+
+
+def _route(session, clause):
+    if not has_request_context() or not g.get("_db_read_only"):
+        return None
+    if g.get("_db_wrote") or session._flushing or session.new or session.dirty or session.deleted:
+        return None
+    if clause is not None and not isinstance(clause, Select):
+        return None
+    if "_db_replica" not in g:
+        replica = None if _pinned() else pick()
+        g._db_replica = replica
+    return g._db_replica.engine if g._db_replica is not None else None
+
+
+def read_only(fn):
+    """Marca un handler como de solo lectura: puede leer de una réplica"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        g._db_read_only = True
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+# --- Escrituras: fijar al primario ---
+
+@event.listens_for(RoutingSession, "after_flush")
+def _after_flush(session, flush_context):
+    if has_request_context():
+        g._db_wrote = True
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _after_commit(session):
+    if not has_request_context() or not g.get("_db_wrote") or not _replicas:
+        return
+    until = time.time() + config.REPLICA_MAX_LAG_S
+    g._db_pin_until = until
+    identity = _identity()
+    if identity is not None:
+        with _lock:
+            _pins[identity] = until
+            if len(_pins) > 10000:
+                now = time.time()
+                for k in [k for k, v in _pins.items() if v <= now]:
+                    del _pins[k]
+
+
+def _set_pin_cookie(response):
+    until = g.get("_db_pin_until")
+    if until:
+        response.set_cookie(PIN_COOKIE, f"{until:.3f}", max_age=int(config.REPLICA_MAX_LAG_S) + 1,
+                            httponly=True, samesite="Lax")
+    return response
+
+
+def status():
+    return [r.status() for r in _replicas]
+
+
+def check_all():
+    """Chequea todas las réplicas ahora mismo (sin esperar al hilo)"""
+    for replica in _replicas:
+        replica.check()
+    return status()
+
+
+def configure_binds(app):
+    """Agrega un bind por réplica (llamar antes de db.init_app)"""
+    binds = {f"replica_{i}": url for i, url in enumerate(config.DATABASE_REPLICA_URLS)}
+    if binds:
+        app.config.setdefault("SQLALCHEMY_BINDS", {}).update(binds)
+
+
+def init_replicas(app):
+    if not config.DATABASE_REPLICA_URLS:
+        return
+    with app.app_context():
+        for i in range(len(config.DATABASE_REPLICA_URLS)):
+            name = f"replica_{i}"
+            _replicas.append(Replica(name, db.engines[name]))
+    RoutingSession.router = staticmethod(_route)
+    app.after_request(_set_pin_cookie)
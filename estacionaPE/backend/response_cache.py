@@ -0,0 +1,232 @@
+import functools
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, request, make_response
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+import config
+from db import db
+from models import CacheVersion
+import metrics
+import signals
+
+# ============================================================
+# CACHÉ DE RESPUESTAS + ETAGS
+# ============================================================
+# Los GET públicos (mapa, buscador, promociones) se guardan en memoria por
+# endpoint + query string. Cada entrada recuerda la versión de los datos de
+# los que depende ("parkings", "promotions"); las escrituras suben esa
+# versión en la tabla `cache_versions`, así que los 4 workers de gunicorn
+# dejan de usar la copia vieja en cuanto alguien cambia algo. Validar una
+# entrada cuesta un SELECT por llave primaria en vez de la consulta completa.
+#
+# Las reservas y entradas/salidas cambian `available` todo el tiempo. Subir
+# la versión en cada una sería escribir la misma fila en cada request de
+# escritura (todos los workers esperando por ella) y vaciar el caché en cada
+# reserva. Esos cambios solo marcan la versión como pendiente y un timer la
+# sube una vez cada RESPONSE_CACHE_BUMP_S; altas, ediciones, bajas e
+# importaciones la suben en el momento. Los tiles del mapa tienen versiones
+# propias por tile (ver map_tiles.py).
+#
+# Aciertos, fallos y 304 se cuentan también en /metrics
+# (response_cache_requests_total), sumados entre todos los workers.
+
+_lock = threading.Lock()
+_entries = OrderedDict()
+_stats = {"hits": 0, "misses": 0, "not_modified": 0, "evictions": 0}
+
+_SKIP_HEADERS = {"Content-Length", "Set-Cookie", "Date"}
+
+# Emisores de parking_changed que solo mueven `available`
+AVAILABILITY_SENDERS = {"reservation_create", "reservation_update", "reservation_delete",
+                        "adjust_available", "capacity_roll", "capacity_rebuild", "reservation_expiry"}
+_pending = {}   # llave -> Timer de la subida diferida
+DEFER_ATTEMPTS = 5   # intentos de una subida diferida antes de rendirse (el TTL acota lo viejo)
+
+
+def current_versions(names):
+    rows = db.session.query(CacheVersion.name, CacheVersion.version)\
+        .filter(CacheVersion.name.in_(names)).all()
+    found = dict(rows)
+    return tuple(found.get(n, 0) for n in names)
+
+
+def bump(*names):
+    """Invalida todo lo que depende de esos nombres (en todos los workers)"""
+    table = CacheVersion.__table__
+    updated = db.session.execute(
+        table.update().where(table.c.name.in_(names)).values(version=table.c.version + 1)
+    ).rowcount
+    if updated < len(set(names)):
+        existing = set(db.session.scalars(select(table.c.name).where(table.c.name.in_(names))))
+        try:
+            db.session.execute(table.insert(), [{"name": n, "version": 1} for n in set(names) - existing])
+        except IntegrityError:
+            # Otro worker creó alguna al mismo tiempo
+            db.session.rollback()
+            return bump(*names)
+    db.session.commit()
+
+
+def safe_bump(*names):
+    # Corre después del commit de la escritura: si falla, el cambio ya está
+    # hecho y solo queda la copia vieja hasta el TTL, así que no se propaga
+    try:
+        bump(*names)
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception("Error invalidando el caché de %s", ", ".join(names))
+
+
+def defer(key, fn):
+    """Corre fn() (que invalida algo) una sola vez cada RESPONSE_CACHE_BUMP_S por llave"""
+    if config.RESPONSE_CACHE_BUMP_S <= 0:
+        _run_deferred(key, fn)
+        return
+    app = current_app._get_current_object()
+    with _lock:
+        if key in _pending:
+            return
+        timer = _pending[key] = threading.Timer(config.RESPONSE_CACHE_BUMP_S, _deferred, (app, key, fn))
+        timer.daemon = True
+    timer.start()
+
+
+def bump_soon(name):
+    """Como bump(), pero junta los cambios de RESPONSE_CACHE_BUMP_S en una sola escritura"""
+    defer(name, lambda: bump(name))
+
+
+def _deferred(app, key, fn, attempt=1):
+    with _lock:
+        # Lo que cambie desde aquí programa otra subida
+        _pending.pop(key, None)
+    final = attempt >= DEFER_ATTEMPTS
+    with app.app_context():
+        if _run_deferred(key, fn, final) or final:
+            return
+    # Falló (p. ej. la base bloqueada): se reintenta en la siguiente ventana, salvo que
+    # otro cambio ya haya programado la suya
+    with _lock:
+        if key in _pending:
+            return
+        timer = _pending[key] = threading.Timer(config.RESPONSE_CACHE_BUMP_S, _deferred,
+                                                (app, key, fn, attempt + 1))
+        timer.daemon = True
+    timer.start()
+
+
+def _run_deferred(key, fn, final=True):
+    """True si fn() terminó; nunca lanza (corre en el hilo del Timer)"""
+    try:
+        fn()
+        return True
+    except Exception:
+        db.session.rollback()
+        if final:
+            current_app.logger.exception("Error invalidando el caché de %s", key)
+        else:
+            current_app.logger.warning("No se pudo invalidar el caché de %s, se reintenta", key)
+        return False
+
+
+def _store(key, entry):
+    with _lock:
+        _entries[key] = entry
+        _entries.move_to_end(key)
+        while len(_entries) > config.RESPONSE_CACHE_MAX_ENTRIES:
+            _entries.popitem(last=False)
+            _stats["evictions"] += 1
+            metrics.inc("response_cache_evictions_total")
+
+
+def _lookup(key, versions):
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            return None
+        if entry["versions"] != versions or time.monotonic() - entry["stored_at"] > config.RESPONSE_CACHE_TTL_S:
+            del _entries[key]
+            return None
+        _entries.move_to_end(key)
+        return entry
+
+
+def _count(stat):
+    with _lock:
+        _stats[stat] += 1
+    metrics.inc("response_cache_requests_total", endpoint=request.url_rule.rule, result=stat)
+
+
+def _from_entry(entry, not_modified):
+    if not_modified:
+        resp = make_response("", 304)
+    else:
+        resp = make_response(entry["body"], entry["status"])
+        for k, v in entry["headers"]:
+            resp.headers[k] = v
+        resp.cache_entry = entry    # response_compression guarda ahí el cuerpo comprimido
+    resp.set_etag(entry["etag"])
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+
+def cached_get(*depends_on):
+    """Decorador para GETs públicos que dependen de las versiones indicadas; una
+    versión puede ser una función de los argumentos de la ruta (p. ej. un tile)"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            names = tuple(sorted(d(**kwargs) if callable(d) else d for d in depends_on))
+            key = (request.endpoint, tuple(sorted(request.view_args.items())),
+                   tuple(sorted(request.args.items(multi=True))))
+            versions = current_versions(names)
+
+            entry = _lookup(key, versions)
+            if entry is not None:
+                not_modified = request.if_none_match.contains_weak(entry["etag"])
+                _count("not_modified" if not_modified else "hits")
+                return _from_entry(entry, not_modified)
+
+            _count("misses")
+            resp = make_response(fn(*args, **kwargs))
+            if resp.status_code != 200 or resp.is_streamed:
+                return resp
+
+            body = resp.get_data()
+            entry = {
+                "body": body,
+                "status": resp.status_code,
+                "headers": [(k, v) for k, v in resp.headers.items() if k not in _SKIP_HEADERS],
+                "etag": hashlib.sha1(body).hexdigest(),
+                "versions": versions,
+                "stored_at": time.monotonic(),
+            }
+            _store(key, entry)
+            return _from_entry(entry, request.if_none_match.contains_weak(entry["etag"]))
+        return wrapper
+    return decorator
+
+
+def stats():
+    """Métricas de este worker (el total entre workers está en /metrics)"""
+    with _lock:
+        total = _stats["hits"] + _stats["not_modified"] + _stats["misses"]
+        served = _stats["hits"] + _stats["not_modified"]
+        return dict(_stats, entries=len(_entries), hit_rate=round(served / total, 4) if total else 0.0)
+
+
+@signals.parking_changed.connect
+def _on_parking_changed(sender, **kwargs):
+    if sender in AVAILABILITY_SENDERS:
+        bump_soon("parkings")
+    else:
+        # "tiles": todos los tiles del mapa (los cambios de disponibilidad van por tile, ver map_tiles.py)
+        safe_bump("parkings", "tiles")
+
+
+@signals.promotion_changed.connect
+def _on_promotion_changed(sender, **kwargs):
+    safe_bump("promotions")
@@ -0,0 +1,154 @@
+import gzip
+import time
+import zlib
+from flask import request
+import config
+import metrics
+
+try:
+    import brotli
+except ImportError:         # Opcional: pip install brotli
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:         # Opcional: pip install zstandard
+    zstandard = None
+
+# ============================================================
+# COMPRESIÓN DE RESPUESTAS (gzip / brotli / zstd)
+# ============================================================
+# Se negocia con Accept-Encoding entre las codificaciones disponibles (brotli
+# y zstd solo si su paquete está instalado; gzip siempre). Reglas:
+# - Solo tipos de texto/JSON (no SSE: comprimir el stream retrasa los eventos)
+#   y respuestas de al menos COMPRESS_MIN_BYTES.
+# - Las respuestas que salen de response_cache guardan su versión comprimida
+#   en la misma entrada: un GET caliente no se vuelve a comprimir, y como la
+#   entrada se descarta cuando cambian los datos, tampoco queda vieja.
+#   Esas se comprimen con un nivel más alto (se paga una sola vez).
+# - Las respuestas con generador (exportaciones) se comprimen por partes.
+# - El ETag pasa a débil (W/"..."), que es lo que corresponde a una
+#   representación con otra codificación; response_cache compara en débil.
+
+COMPRESSIBLE_TYPES = {
+    "application/json", "application/x-ndjson", "application/msgpack",
+    "application/javascript", "application/xml", "image/svg+xml",
+}
+
+# Nivel por codificación: (al vuelo, para respuestas en caché)
+LEVELS = {"br": (4, 9), "zstd": (3, 12), "gzip": (6, 9)}
+
+
+def available_encodings():
+    """En orden de preferencia del servidor"""
+    encodings = []
+    if brotli is not None:
+        encodings.append("br")
+    if zstandard is not None:
+        encodings.append("zstd")
+    encodings.append("gzip")
+    return encodings
+
+
+def compress(data, encoding, level):
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    if encoding == "br":
+        return brotli.compress(data, quality=level)
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+def _stream_compressor(encoding, level):
+    """(compress(chunk), finish()) para comprimir un generador por partes"""
+    if encoding == "gzip":
+        c = zlib.compressobj(level, zlib.DEFLATED, 31)
+        return c.compress, c.flush
+    if encoding == "br":
+        c = brotli.Compressor(quality=level)
+        return c.process, c.finish
+    c = zstandard.ZstdCompressor(level=level).compressobj()
+    return c.compress, c.flush
+
+
+def _compress_stream(chunks, encoding, level):
+    feed, finish = _stream_compressor(encoding, level)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            out = feed(chunk)
+            if out:
+                yield out
+        tail = finish()
+        if tail:
+            yield tail
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+
+
+def _compressible(response):
+    mimetype = response.mimetype or ""
+    if mimetype == "text/event-stream":
+        return False
+    return mimetype.startswith("text/") or mimetype in COMPRESSIBLE_TYPES
+
+
+def _negotiate():
+    return request.accept_encodings.best_match(available_encodings())
+
+
+def _compress_response(response):
+    if (not 200 <= response.status_code < 300 or response.status_code in (204, 206)
+            or request.method == "HEAD" or response.direct_passthrough
+            or "Content-Encoding" in response.headers or not _compressible(response)
+            or "no-transform" in (response.headers.get("Cache-Control") or "")):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encoding = _negotiate()
+    if encoding is None:
+        return response
+
+    dynamic_level, cached_level = LEVELS[encoding]
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, encoding, dynamic_level)
+        response.headers.pop("Content-Length", None)
+        _mark(response, encoding)
+        return response
+
+    body = response.get_data()
+    if len(body) < config.COMPRESS_MIN_BYTES:
+        return response
+
+    t0 = time.perf_counter()
+    entry = getattr(response, "cache_entry", None)
+    if entry is not None:
+        variants = entry.setdefault("encoded", {})
+        if encoding not in variants:
+            variants[encoding] = compress(body, encoding, cached_level)
+        compressed = variants[encoding]
+    else:
+        compressed = compress(body, encoding, dynamic_level)
+    elapsed = time.perf_counter() - t0
+
+    if len(compressed) >= len(body):
+        metrics.add_compression(0, elapsed)
+        return response
+    metrics.add_compression(len(body) - len(compressed), elapsed)
+    response.set_data(compressed)
+    _mark(response, encoding)
+    return response
+
+
+def _mark(response, encoding):
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+
+def init_compression(app):
+    """Registrar después de init_metrics: así /metrics ve el tamaño ya comprimido"""
+    if config.COMPRESS_ENABLED:
+        app.after_request(_compress_response)
@@ -0,0 +1,177 @@
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal
+from sqlalchemy import event, inspect, select, func, case
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import object_session
+from sqlalchemy.orm.util import identity_key
+from db import db
+from models import Reservation, Payment, DailyParkingStats
+
+# ============================================================
+# ROLLUPS DIARIOS PARA REPORTES
+# ============================================================
+# `daily_parking_stats` guarda por cochera y por día: reservas creadas,
+# ingresos de reservas pagadas (Reservation.paid, que no cambia al vencer la
+# reserva) y pagos confirmados. Los listeners de abajo
+# aplican la diferencia en la misma transacción que cada INSERT/UPDATE/DELETE
+# de reservas y pagos, así que los reportes solo suman filas de esta tabla.
+# `flask reports-rebuild` la recalcula desde cero.
+
+_table = DailyParkingStats.__table__
+_FIELDS = ("reservations", "paid_revenue", "payments_count", "payments_total")
+
+
+def _day(value):
+    if value is None:
+        return None
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _apply(connection, parking_id, day, **deltas):
+    deltas = {k: v for k, v in deltas.items() if v}
+    if parking_id is None or day is None or not deltas:
+        return
+    row = {"parking_id": parking_id, "day": day, "reservations": 0, "paid_revenue": 0,
+           "payments_count": 0, "payments_total": 0, **deltas}
+    increments = {k: _table.c[k] + v for k, v in deltas.items()}
+    # Un solo upsert: crea la fila del día con la diferencia o se la suma
+    if connection.dialect.name == "mysql":
+        connection.execute(mysql_insert(_table).values(row).on_duplicate_key_update(increments))
+    else:
+        connection.execute(sqlite_insert(_table).values(row).on_conflict_do_update(
+            index_elements=["parking_id", "day"], set_=increments))
+
+
+def _move(connection, old_key, old, new_key, new):
+    """Quita la contribución vieja y suma la nueva (un solo UPDATE si es la misma fila)"""
+    if old_key == new_key:
+        _apply(connection, *new_key, **{k: new[k] - old[k] for k in new})
+        return
+    _apply(connection, *old_key, **{k: -v for k, v in old.items()})
+    _apply(connection, *new_key, **new)
+
+
+def _old(state, attr):
+    """Valor previo al flush de un atributo (o el actual si no cambió)"""
+    hist = state.attrs[attr].history
+    if hist.deleted:
+        return hist.deleted[0]
+    return getattr(state.object, attr)
+
+
+# --- Reservas: contador y facturación de pagadas ---
+
+def _reservation_contrib(parking_id, created_at, paid, total_amount):
+    revenue = Decimal(total_amount or 0) if paid else Decimal(0)
+    return (parking_id, _day(created_at)), {"reservations": 1, "paid_revenue": revenue}
+
+
+@event.listens_for(Reservation, "after_insert")
+def _reservation_inserted(mapper, connection, target):
+    key, c = _reservation_contrib(target.parking_id, target.created_at, target.paid, target.total_amount)
+    _apply(connection, *key, **c)
+
+
+@event.listens_for(Reservation, "after_update")
+def _reservation_updated(mapper, connection, target):
+    state = inspect(target)
+    old_key, old = _reservation_contrib(*(_old(state, a) for a in
+                                         ("parking_id", "created_at", "paid", "total_amount")))
+    new_key, new = _reservation_contrib(target.parking_id, target.created_at, target.paid, target.total_amount)
+    if (old_key, old) == (new_key, new):
+        return
+    _move(connection, old_key, old, new_key, new)
+
+
+@event.listens_for(Reservation, "after_delete")
+def _reservation_deleted(mapper, connection, target):
+    key, c = _reservation_contrib(target.parking_id, target.created_at, target.paid, target.total_amount)
+    _apply(connection, *key, **{k: -v for k, v in c.items()})
+
+
+# --- Pagos confirmados ---
+
+def _parking_of(connection, payment, reservation_id):
+    """Cochera de la reserva del pago; sin consulta si la reserva ya está cargada en la sesión"""
+    session = object_session(payment)
+    reservation = session.identity_map.get(identity_key(Reservation, reservation_id)) if session else None
+    if reservation is not None and "parking_id" in inspect(reservation).dict:
+        return reservation.parking_id
+    return connection.execute(
+        select(Reservation.parking_id).where(Reservation.id == reservation_id)
+    ).scalar()
+
+
+def _payment_contrib(connection, payment, reservation_id, created_at, status, amount):
+    parking_id = _parking_of(connection, payment, reservation_id)
+    paid = status == "paid"
+    return (parking_id, _day(created_at)), {
+        "payments_count": 1 if paid else 0,
+        "payments_total": Decimal(amount or 0) if paid else Decimal(0),
+    }
+
+
+@event.listens_for(Payment, "after_insert")
+def _payment_inserted(mapper, connection, target):
+    key, c = _payment_contrib(connection, target, target.reservation_id, target.created_at, target.status, target.amount)
+    _apply(connection, *key, **c)
+
+
+@event.listens_for(Payment, "after_update")
+def _payment_updated(mapper, connection, target):
+    state = inspect(target)
+    old_vals = [_old(state, a) for a in ("reservation_id", "created_at", "status", "amount")]
+    new_vals = [target.reservation_id, target.created_at, target.status, target.amount]
+    if old_vals == new_vals:
+        return
+    old_key, old = _payment_contrib(connection, target, *old_vals)
+    new_key, new = _payment_contrib(connection, target, *new_vals)
+    _move(connection, old_key, old, new_key, new)
+
+
+@event.listens_for(Payment, "after_delete")
+def _payment_deleted(mapper, connection, target):
+    key, c = _payment_contrib(connection, target, target.reservation_id, target.created_at, target.status, target.amount)
+    _apply(connection, *key, **{k: -v for k, v in c.items()})
+
+
+# --- Reconstrucción completa ---
+
+def rebuild():
+    """Recalcula daily_parking_stats desde reservas y pagos. Devuelve las filas escritas."""
+    totals = defaultdict(lambda: dict.fromkeys(_FIELDS, 0))
+
+    res_day = func.date(Reservation.created_at)
+    for parking_id, day, count, revenue in db.session.query(
+        Reservation.parking_id, res_day, func.count(Reservation.id),
+        func.sum(case((Reservation.paid, Reservation.total_amount), else_=0))
+    ).group_by(Reservation.parking_id, res_day):
+        row = totals[(parking_id, _parse_day(day))]
+        row["reservations"] += count
+        row["paid_revenue"] += revenue or 0
+
+    pay_day = func.date(Payment.created_at)
+    for parking_id, day, count, amount in db.session.query(
+        Reservation.parking_id, pay_day, func.count(Payment.id), func.sum(Payment.amount)
+    ).join(Reservation, Reservation.id == Payment.reservation_id)\
+     .filter(Payment.status == "paid")\
+     .group_by(Reservation.parking_id, pay_day):
+        row = totals[(parking_id, _parse_day(day))]
+        row["payments_count"] += count
+        row["payments_total"] += amount or 0
+
+    db.session.execute(_table.delete())
+    rows = [dict(parking_id=pid, day=day, **vals) for (pid, day), vals in totals.items() if day]
+    for i in range(0, len(rows), 5000):
+        db.session.execute(_table.insert(), rows[i:i + 5000])
+    db.session.commit()
+    return len(rows)
+
+
+def _parse_day(value):
+    # SQLite devuelve func.date() como texto
+    if isinstance(value, str):
+        return date.fromisoformat(value)
+    return value
@@ -2,13 +2,15 @@ from flask import redirect, url_for, request
 from flask.views import MethodView
 from flask_smorest import Blueprint, abort
 from flask_jwt_extended import create_access_token
-from werkzeug.security import check_password_hash
+from passwords import verify_password, needs_rehash, hash_password, PasswordServiceBusy
 from models import User
 from db import db
 from oauth_client import oauth # <--- Importamos la configuración
 
 blp = Blueprint("Auth", "auth", url_prefix="/api", description="Autenticación y SSO")
 
+GRAPH_ME_URL = 'https://graph.microsoft.com/v1.0/me'
+
 # --- LOGIN TRADICIONAL (EMAIL/PASS) ---
 @blp.route("/auth/login")
 class Login(MethodView):
@@ -29,11 +31,21 @@ class Login(MethodView):
         return self.format_user_response(user, token), 200
 
     def check_pass(self, user, password):
-        # Lógica híbrida (Hash o Texto plano para soporte legacy)
-        try:
-            if user.password and check_password_hash(user.password, password): return True
-        except: pass
-        return user.password == password
+        # Lógica híbrida (Hash o Texto plano para soporte legacy). El hash se
+        # verifica en el pool de procesos (passwords.py); mientras tanto se
+        # devuelve la conexión para no dejar sin conexiones al resto de la API
+        stored = user.password
+        db.session.close()
+        if not verify_password(stored, password):
+            return False
+        # Texto plano o parámetros viejos: se guarda con el método actual
+        if needs_rehash(stored):
+            try:
+                User.query.filter_by(id=user.id).update({"password": hash_password(password)})
+                db.session.commit()
+            except PasswordServiceBusy:
+                pass    # Se re-hashea en el próximo login
+        return True
 
     def format_user_response(self, user, token):
         return {
@@ -81,14 +93,22 @@ def login_microsoft():
 @blp.route("/auth/microsoft")
 def auth_microsoft():
     try:
+        # authorize_access_token valida el ID token localmente (firma y claims)
         token = oauth.microsoft.authorize_access_token()
-        # Microsoft a veces requiere llamar a Graph API manualmente si no manda el ID token completo
-        resp = oauth.microsoft.get('https://graph.microsoft.com/v1.0/me')
-        user_info = resp.json()
-        # Normalizamos campos (Microsoft usa 'mail' o 'userPrincipalName')
-        user_info['email'] = user_info.get('mail') or user_info.get('userPrincipalName')
-        user_info['name'] = user_info.get('displayName')
-        
+        claims = token.get('userinfo') or {}
+        upn = claims.get('preferred_username') or ''
+        email = claims.get('email') or (upn if '@' in upn else None)
+
+        if email:
+            user_info = {'email': email, 'name': claims.get('name')}
+        else:
+            # El ID token no trae correo: recién ahí se consulta Graph API
+            resp = oauth.microsoft.get(GRAPH_ME_URL)
+            user_info = resp.json()
+            # Normalizamos campos (Microsoft usa 'mail' o 'userPrincipalName')
+            user_info['email'] = user_info.get('mail') or user_info.get('userPrincipalName')
+            user_info['name'] = user_info.get('displayName')
+
         return handle_sso_login(user_info, 'microsoft')
     except Exception as e:
         return f"Error en Microsoft Login: {str(e)}", 400
@@ -1,21 +1,50 @@
 from flask.views import MethodView
 from flask_smorest import Blueprint, abort
 from db import db
-from models import Parking
+from models import Parking, ParkingSearchTerm
 from schemas import ParkingOut, ParkingCreate, ParkingUpdate
+from pagination import CursorArgs, keyset_page
 from flask_jwt_extended import jwt_required
-from flask import request
-from sqlalchemy import or_
+from flask import request, Response
+from sqlalchemy import func
+import io
+import msgpack
+import geo
+import text_search
+import slots
+import signals
+import live_updates
+from response_cache import cached_get
+from replicas import read_only
+from serialization import columns_for
+import bulk_import
+import map_tiles
+import clusters
 
 blp = Blueprint("Parkings", "parkings", url_prefix="/api/parkings", description="CRUD de cocheras")
 
+# Límites para consultas del mapa y del buscador
+NEARBY_DEFAULT_LIMIT = 200
+NEARBY_MAX_LIMIT = 1000
+NEARBY_MAX_RADIUS_M = 20000
+SEARCH_DEFAULT_LIMIT = 50
+SEARCH_MAX_LIMIT = 200
+
+# Columnas que vuelca ParkingOut: los listados leen tuplas, sin armar objetos del ORM
+PARKING_OUT_COLUMNS = columns_for(ParkingOut(), Parking)
+# Una sola instancia para los handlers que devuelven la lista ya volcada
+PARKINGS_OUT = ParkingOut(many=True)
+
 @blp.route("/")
 class ParkingsList(MethodView):
     # GET /api/parkings/ (Dejado abierto para que el mapa cargue sin login)
+    @read_only
+    @cached_get("parkings")
+    @blp.arguments(CursorArgs, location="query")
     @blp.response(200, ParkingOut(many=True))
-    def get(self):
-        """Listar todas las cocheras para el mapa"""
-        return Parking.query.order_by(Parking.id.desc()).all()
+    def get(self, args):
+        """Listar cocheras (paginado por cursor)"""
+        return keyset_page(Parking.query.with_entities(*PARKING_OUT_COLUMNS), Parking.id, args)
 
     @jwt_required()
     @blp.arguments(ParkingCreate)
@@ -30,6 +59,7 @@ class ParkingsList(MethodView):
             
         db.session.add(p)
         db.session.commit()
+        signals.parking_changed.send("parking_create", parking_ids=[p.id])
         return p
 
 
@@ -56,6 +86,7 @@ class ParkingResource(MethodView):
         if p.available > p.capacity: p.available = p.capacity
             
         db.session.commit()
+        signals.parking_changed.send("parking_update", parking_ids=[pid])
         return p
 
     @jwt_required()
@@ -64,6 +95,7 @@ class ParkingResource(MethodView):
         p = Parking.query.get_or_404(pid)
         db.session.delete(p)
         db.session.commit()
+        signals.parking_changed.send("parking_delete", parking_ids=[pid])
         # [ANTES: return {"message": se quedaba sin cerrar]
         return {"message": "Cochera eliminada correctamente"}, 200 # <-- ¡CORREGIDO!
 
@@ -74,34 +106,44 @@ class ParkingResource(MethodView):
 
 # 🔍 1. Buscador para la App (Barra de búsqueda)
 @blp.route("/search", methods=["GET"])
+@read_only
+@cached_get("parkings")
 def search():
-    from flask import request
-    
-    q = request.args.get("q", "").strip().lower()
+    """
+    Busca por nombre, dirección o distrito usando el índice de trigramas.
+    Ignora tildes/mayúsculas, tolera errores de tipeo y ordena por parecido y precio.
+    """
+    q = request.args.get("q", "").strip()
     available_only = request.args.get("available_only", "false").lower() == "true"
-    
+    limit = min(request.args.get("limit", SEARCH_DEFAULT_LIMIT, type=int), SEARCH_MAX_LIMIT)
+    if limit < 1:
+        abort(400, message="El límite debe ser mayor a 0.")
+
     query = Parking.query
+    order = [Parking.price_per_hour.asc()]
+
+    terms = text_search.query_terms(q)
+    if q and not terms:
+        # Solo signos o espacios raros ("!!"): nada que buscar, no todo el catálogo
+        return [], 200
+    if terms:
+        # Cuántos trigramas de la consulta tiene cada cochera
+        scores = db.session.query(
+            ParkingSearchTerm.parking_id,
+            func.count().label("score")
+        ).filter(ParkingSearchTerm.term.in_(terms))\
+         .group_by(ParkingSearchTerm.parking_id)\
+         .having(func.count() >= text_search.min_matches(len(terms)))\
+         .subquery()
+
+        query = query.join(scores, scores.c.parking_id == Parking.id)
+        order.insert(0, scores.c.score.desc())
 
-    if q:
-        like_str = f"%{q}%"
-        # Busca por nombre, dirección o distrito
-        query = query.filter(
-            or_(
-                Parking.name.ilike(like_str),
-                Parking.address.ilike(like_str),
-                Parking.district.ilike(like_str)
-            )
-        )
-    
     if available_only:
         query = query.filter(Parking.available > 0)
 
-    # Ordenar por precio
-    results = query.order_by(Parking.price_per_hour.asc()).all()
-    
-    # Usamos el Schema manualmente para serializar la lista
-    from schemas import ParkingOut
-    return ParkingOut(many=True).dump(results), 200
+    results = query.with_entities(*PARKING_OUT_COLUMNS).order_by(*order).limit(limit).all()
+    return PARKINGS_OUT.dump(results), 200
 
 
 # 🔧 2. Ajuste rápido de disponibilidad (Entrada/Salida de autos)
@@ -113,26 +155,155 @@ def adjust_available(pid):
     data = request.get_json() or {}
     delta = int(data.get("delta", 0)) # -1 o +1
 
-    p = Parking.query.get_or_404(pid)
-
-    nuevo_valor = p.available + delta
-    if nuevo_valor < 0: nuevo_valor = 0
-    if nuevo_valor > p.capacity: nuevo_valor = p.capacity
+    Parking.query.get_or_404(pid)
 
-    p.available = nuevo_valor
-    db.session.commit()
+    # UPDATE atómico recortado entre 0 y la capacidad (sin leer/escribir en Python)
+    nuevo_valor = slots.with_retry(lambda: slots.adjust(pid, delta))
+    signals.parking_changed.send("adjust_available", parking_ids=[pid])
 
     return {
         "message": "Disponibilidad actualizada",
-        "id": p.id,
-        "available": p.available
+        "id": pid,
+        "available": nuevo_valor
     }, 200
 
 
 # 👤 3. Cocheras por Dueño (Para perfil de "Mis Locales")
 @blp.route("/owner/<int:owner_id>", methods=["GET"])
 @jwt_required()
+@read_only
 def get_by_owner(owner_id):
-    parkings = Parking.query.filter_by(owner_id=owner_id).all()
-    from schemas import ParkingOut
-    return ParkingOut(many=True).dump(parkings), 200
\ No newline at end of file
+    parkings = Parking.query.with_entities(*PARKING_OUT_COLUMNS).filter(Parking.owner_id == owner_id).all()
+    return PARKINGS_OUT.dump(parkings), 200
+
+# 🗺️ 4. Cocheras visibles en el mapa (bbox o punto + radio)
+@blp.route("/nearby", methods=["GET"])
+@read_only
+@cached_get("parkings")
+def nearby():
+    """
+    Cocheras dentro del viewport del mapa.
+    Recibe `bbox=min_lng,min_lat,max_lng,max_lat` o `lat`, `lng` y `radius` (metros).
+    """
+    lat = request.args.get("lat", type=float)
+    lng = request.args.get("lng", type=float)
+    radius = request.args.get("radius", 1000, type=float)
+    bbox_str = request.args.get("bbox")
+    limit = min(request.args.get("limit", NEARBY_DEFAULT_LIMIT, type=int), NEARBY_MAX_LIMIT)
+    if limit < 1:
+        abort(400, message="El límite debe ser mayor a 0.")
+
+    try:
+        if bbox_str:
+            bbox = geo.parse_bbox(bbox_str)
+        elif lat is not None and lng is not None:
+            if radius <= 0 or radius > NEARBY_MAX_RADIUS_M:
+                abort(400, message=f"El radio debe estar entre 1 y {NEARBY_MAX_RADIUS_M} metros.")
+            bbox = geo.bbox_around(lat, lng, radius)
+        else:
+            abort(400, message="Envía bbox o lat/lng.")
+        query = Parking.query.with_entities(*PARKING_OUT_COLUMNS).filter(*geo.bbox_filter(Parking, bbox))
+    except ValueError as e:
+        abort(400, message=str(e))
+
+    if bbox_str:
+        results = query.order_by(Parking.id.desc()).limit(limit).all()
+    else:
+        # Filtrar por círculo real y ordenar por cercanía
+        candidatos = [
+            (geo.haversine_m(lat, lng, p.lat, p.lng), p) for p in query.all()
+        ]
+        candidatos = sorted((c for c in candidatos if c[0] <= radius), key=lambda c: c[0])
+        results = [p for _, p in candidatos[:limit]]
+
+    return PARKINGS_OUT.dump(results), 200
+
+
+# 📡 5. Disponibilidad en vivo (Server-Sent Events)
+@blp.route("/stream", methods=["GET"])
+def stream():
+    """
+    Stream de cambios {id, available, price_per_hour} para el mapa.
+    Opcional `bbox=min_lng,min_lat,max_lng,max_lat` para recibir solo el viewport.
+    """
+    bbox = None
+    if request.args.get("bbox"):
+        try:
+            bbox = geo.parse_bbox(request.args["bbox"])
+        except ValueError as e:
+            abort(400, message=str(e))
+
+    return live_updates.stream_response(bbox)
+
+
+# 🧩 6. Tiles compactos del mapa (arreglos paralelos, coordenadas cuantizadas)
+@blp.route("/tiles/<int:z>/<int:x>/<int:y>", methods=["GET"])
+@read_only
+@cached_get("tiles", map_tiles.version_name)
+def map_tile(z, x, y):
+    """
+    Pines de un tile XYZ: id (en deltas), x/y enteros dentro del tile,
+    disponibles y precio en céntimos (formato en map_tiles.py).
+    `format=msgpack` devuelve lo mismo en MessagePack.
+    """
+    fmt = request.args.get("format", "json")
+    if fmt not in ("json", "msgpack"):
+        abort(400, message="format debe ser json o msgpack.")
+    try:
+        tile = map_tiles.build(z, x, y)
+    except ValueError as e:
+        abort(400, message=str(e))
+
+    if fmt == "msgpack":
+        return Response(msgpack.packb(tile), mimetype=map_tiles.MSGPACK_MIMETYPE)
+    return tile, 200
+
+
+# 🫧 7. Clusters del mapa por zoom (agrupados en el servidor)
+@blp.route("/clusters", methods=["GET"])
+def parking_clusters():
+    """
+    Clusters visibles en `bbox=min_lng,min_lat,max_lng,max_lat` para el `zoom` del mapa:
+    cantidad, disponibles, precio mínimo y zoom en el que se abre cada uno.
+    Los nodos con count=1 son cocheras sueltas (parking_id, price_per_hour).
+    """
+    zoom = request.args.get("zoom", type=int)
+    if not request.args.get("bbox") or zoom is None:
+        abort(400, message="Envía bbox y zoom.")
+    try:
+        bbox = geo.parse_bbox(request.args["bbox"])
+    except ValueError as e:
+        abort(400, message=str(e))
+
+    return {"zoom": zoom, "clusters": clusters.clusters(bbox, zoom)}, 200
+
+
+# 📥 8. Importación masiva (CSV / NDJSON)
+@blp.route("/import", methods=["POST"])
+@jwt_required()
+def import_parkings():
+    """
+    Carga muchas cocheras de una vez. El cuerpo es el archivo (text/csv o
+    application/x-ndjson) o un multipart con el campo `file`.
+    Query: `format=csv|ndjson`, `upsert=true` para actualizar filas con id, `chunk`.
+    """
+    upload = request.files.get("file")
+    fmt = request.args.get("format")
+    if not fmt:
+        nombre = (upload.filename if upload else "") or ""
+        tipo = request.mimetype or ""
+        fmt = "ndjson" if ("ndjson" in tipo or nombre.endswith((".ndjson", ".jsonl"))) else "csv"
+    upsert = request.args.get("upsert", "false").lower() == "true"
+    chunk = min(request.args.get("chunk", bulk_import.DEFAULT_CHUNK, type=int), 10000)
+    if chunk < 1:
+        abort(400, message="El tamaño de lote (chunk) debe ser mayor a 0.")
+
+    raw = upload.stream if upload else request.stream
+    text = io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")
+
+    try:
+        summary = bulk_import.import_parkings(text, fmt, chunk_size=chunk, upsert=upsert)
+    except ValueError as e:
+        abort(400, message=str(e))
+
+    return summary, 200
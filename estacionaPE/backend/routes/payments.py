@@ -3,17 +3,29 @@ from flask_smorest import Blueprint, abort
 from db import db
 from models import Payment, Reservation
 from schemas import PaymentOut, PaymentCreate, PaymentUpdate
+from pagination import CursorArgs, keyset_page
 from flask_jwt_extended import jwt_required
+from sqlalchemy import select
+import exports
+from idempotency import idempotent
+from replicas import read_only
 
 blp = Blueprint("Payments", "payments", url_prefix="/api/payments", description="CRUD de pagos")
 
+def mark_paid(res):
+    """Marca la reserva como pagada; si ya venció sigue completed (no vuelve a ocupar espacio)"""
+    res.paid = True
+    if res.status != "completed":
+        res.status = "paid"
+
 @blp.route("/")
 class PayList(MethodView):
     @jwt_required()
+    @blp.arguments(CursorArgs, location="query")
     @blp.response(200, PaymentOut(many=True))
-    def get(self):
-        """Listar todos los pagos"""
-        return Payment.query.order_by(Payment.id.desc()).all()
+    def get(self, args):
+        """Listar pagos (paginado por cursor)"""
+        return keyset_page(Payment.query, Payment.id, args)
 
     @jwt_required()
     @blp.arguments(PaymentCreate)
@@ -25,7 +37,7 @@ class PayList(MethodView):
         if p.status == "paid":
             res = Reservation.query.get(p.reservation_id)
             if res:
-                res.status = "paid"
+                mark_paid(res)
         db.session.commit()
         return p
 
@@ -47,7 +59,7 @@ class PayResource(MethodView):
         if p.status == "paid":
             res = Reservation.query.get(p.reservation_id)
             if res:
-                res.status = "paid"
+                mark_paid(res)
         db.session.commit()
         return p
 
@@ -58,12 +70,22 @@ class PayResource(MethodView):
         db.session.commit()
         return {"message": "Pago eliminado"}, 200
 
+# === FUNCIÓN ESPECIAL: Exportar pagos (contabilidad) ===
+@blp.route("/export", methods=["GET"])
+@jwt_required()
+@read_only
+def export_payments():
+    """Exporta pagos en streaming (format=ndjson|csv, from/to inclusive como en /api/reports, status)"""
+    query = exports.export_filters(Payment, select(*Payment.__table__.columns))
+    return exports.stream_export(query.order_by(Payment.id), "payments")
+
 # === FUNCIÓN ESPECIAL: Pagar Reserva (QR) ===
 @blp.route("/pay-reservation/<int:rid>", methods=["POST"])
 @jwt_required()
+@idempotent
 @blp.response(201, PaymentOut)
 def pay_reservation(rid):
-    """Pagar reserva (Soporta 'saldo' o 'yape')"""
+    """Pagar reserva (Soporta 'saldo' o 'yape'). Acepta `Idempotency-Key` para reintentos."""
     from flask import request
     from models import User # Importante importar User
 
@@ -74,7 +96,7 @@ def pay_reservation(rid):
 
     res = Reservation.query.get_or_404(rid)
     
-    if res.status == 'paid':
+    if res.paid:
         existing = Payment.query.filter_by(reservation_id=rid).first()
         if existing: return existing
 
@@ -101,7 +123,7 @@ def pay_reservation(rid):
         provider_ref=provider_ref
     )
     
-    res.status = "paid"
+    mark_paid(res)
     db.session.add(p)
     db.session.commit()
     
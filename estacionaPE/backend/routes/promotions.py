@@ -1,20 +1,31 @@
 from flask.views import MethodView
 from flask_smorest import Blueprint, abort
 from db import db
-from models import Promotion
+from models import Promotion, Parking
 from schemas import PromotionOut, PromotionCreate, PromotionUpdate
+from pagination import CursorArgs, keyset_page
 from flask_jwt_extended import jwt_required
+from flask import request
 from datetime import datetime
+from response_cache import cached_get
+from replicas import read_only
+import signals
+import promo_index
+import geo
 
 blp = Blueprint("Promotions", "promotions", url_prefix="/api/promotions", description="CRUD de promociones")
 
+# Máximo de cocheras por consulta de promos vigentes
+ACTIVE_MAX_PARKINGS = 2000
+
 @blp.route("/")
 class PromoList(MethodView):
     @jwt_required()
+    @blp.arguments(CursorArgs, location="query")
     @blp.response(200, PromotionOut(many=True))
-    def get(self):
-        """Listar todas las promociones (Admin)"""
-        return Promotion.query.order_by(Promotion.id.desc()).all()
+    def get(self, args):
+        """Listar promociones (Admin, paginado por cursor)"""
+        return keyset_page(Promotion.query, Promotion.id, args)
 
     @jwt_required()
     @blp.arguments(PromotionCreate)
@@ -24,6 +35,7 @@ class PromoList(MethodView):
         promo = Promotion(**data)
         db.session.add(promo)
         db.session.commit()
+        signals.promotion_changed.send("promotion_create", promotion_ids=[promo.id], parking_ids=[promo.parking_id])
         return promo
 
 @blp.route("/<int:pid>")
@@ -41,18 +53,23 @@ class PromoResource(MethodView):
         """Actualizar promoción"""
         p = Promotion.query.get_or_404(pid)
         
+        old_parking_id = p.parking_id
         for k, v in data.items():
             setattr(p, k, v)
             
         db.session.commit()
+        signals.promotion_changed.send("promotion_update", promotion_ids=[pid],
+                                       parking_ids=list({old_parking_id, p.parking_id}))
         return p
 
     @jwt_required()
     def delete(self, pid):
         """Eliminar promoción"""
         p = Promotion.query.get_or_404(pid)
+        parking_id = p.parking_id
         db.session.delete(p)
         db.session.commit()
+        signals.promotion_changed.send("promotion_delete", promotion_ids=[pid], parking_ids=[parking_id])
         return {"message": "Promoción eliminada"}, 200
 
 # ============================================================
@@ -63,16 +80,40 @@ class PromoResource(MethodView):
 class PromosByParking(MethodView):
     # NOTA: Quitamos @jwt_required() si quieres que las promos sean públicas en el mapa
     # Si quieres seguridad, déjalo puesto. Aquí lo dejo abierto para facilitar pruebas.
+    @read_only
+    @cached_get("promotions")
     @blp.response(200, PromotionOut(many=True))
     def get(self, parking_id):
         """Ver promociones ACTIVAS de una cochera (para la App)"""
-        now = datetime.utcnow()
-        
-        # Filtra: que sea de la cochera + que esté activa + que no haya vencido
-        results = Promotion.query.filter(
-            Promotion.parking_id == parking_id,
-            Promotion.is_active == True,
-            Promotion.end_date >= now
-        ).order_by(Promotion.id.desc()).all()
-        
-        return results
\ No newline at end of file
+        # Activa + ya empezó + no ha vencido (desde el índice en memoria)
+        results = promo_index.index.active_for([parking_id], datetime.utcnow())
+        return sorted(results, key=lambda p: p.id, reverse=True)
+
+
+@blp.route("/active", methods=["GET"])
+@read_only
+@blp.response(200, PromotionOut(many=True))
+def active_promotions():
+    """
+    Promociones vigentes de muchas cocheras en una sola llamada (pines del mapa).
+    Recibe `parking_ids=1,2,3` o `bbox=min_lng,min_lat,max_lng,max_lat`.
+    """
+    ids_str = request.args.get("parking_ids")
+    bbox_str = request.args.get("bbox")
+
+    if ids_str:
+        parking_ids = [int(x) for x in ids_str.split(",") if x.strip().isdigit()]
+    elif bbox_str:
+        try:
+            bbox = geo.parse_bbox(bbox_str)
+            parking_ids = [pid for (pid,) in db.session.query(Parking.id)
+                           .filter(*geo.bbox_filter(Parking, bbox))]
+        except ValueError as e:
+            abort(400, message=str(e))
+    else:
+        abort(400, message="Envía parking_ids o bbox.")
+
+    if len(parking_ids) > ACTIVE_MAX_PARKINGS:
+        abort(400, message=f"Máximo {ACTIVE_MAX_PARKINGS} cocheras por consulta")
+
+    return promo_index.index.active_for(parking_ids, datetime.utcnow())
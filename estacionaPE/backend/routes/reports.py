@@ -1,46 +1,67 @@
-from flask import jsonify
+from flask import request
 from flask.views import MethodView
-from flask_smorest import Blueprint
-from flask_jwt_extended import jwt_required
+from flask_smorest import Blueprint, abort
+from flask_jwt_extended import jwt_required, get_jwt
 from sqlalchemy import func, desc
 from db import db
-from models import Parking, Reservation, User, Payment
+from models import Parking, User, DailyParkingStats
+from datetime import date
+import response_cache
+from replicas import read_only
 
 # Definimos el Blueprint
 blp = Blueprint("Reports", "reports", url_prefix="/api/reports", description="Reportes y Estadísticas")
 
+# Filtro de fechas común (?from=YYYY-MM-DD&to=YYYY-MM-DD, ambos inclusive)
+def date_range_filter(query):
+    try:
+        desde = request.args.get("from")
+        hasta = request.args.get("to")
+        if desde:
+            query = query.filter(DailyParkingStats.day >= date.fromisoformat(desde))
+        if hasta:
+            query = query.filter(DailyParkingStats.day <= date.fromisoformat(hasta))
+    except ValueError:
+        abort(400, message="Formato de fecha inválido (usa YYYY-MM-DD)")
+    return query
+
 # 1. REPORTES GENERALES (Resumen Global)
 @blp.route("/summary")
 class GeneralReport(MethodView):
     # @jwt_required()  <-- Descomenta si quieres protegerlo
+    @read_only
     def get(self):
         """Resumen global (Usuarios, Ingresos, Reservas)"""
         total_users = User.query.count()
         total_parkings = Parking.query.count()
-        total_reservations = Reservation.query.count()
-        
-        # Sumar ingresos solo de reservas pagadas
-        total_income = db.session.query(func.sum(Payment.amount))\
-            .filter(Payment.status == 'paid').scalar() or 0.00
+
+        # Reservas e ingresos salen de los rollups diarios
+        total_reservations, total_income = date_range_filter(db.session.query(
+            func.sum(DailyParkingStats.reservations),
+            func.sum(DailyParkingStats.payments_total)
+        )).one()
 
         return {
             "total_users": total_users,
             "total_parkings": total_parkings,
-            "total_reservations": total_reservations,
-            "total_income": float(total_income)
+            "total_reservations": int(total_reservations or 0),
+            "total_income": float(total_income or 0)
         }
 
 # 2. GANANCIA POR COCHERA
 @blp.route("/revenue-by-parking")
 class RevenueByParking(MethodView):
+    @read_only
     def get(self):
         """Cuánto dinero ha generado cada cochera"""
-        # Hacemos un JOIN entre Parking y Reservation, sumando el total_amount
-        results = db.session.query(
+        total_revenue = func.sum(DailyParkingStats.paid_revenue).label('total_revenue')
+        results = date_range_filter(db.session.query(
             Parking.name,
-            func.sum(Reservation.total_amount).label('total_revenue')
-        ).join(Reservation).filter(Reservation.status == 'paid')\
-         .group_by(Parking.id).order_by(desc('total_revenue')).all()
+            total_revenue
+        ).join(DailyParkingStats, DailyParkingStats.parking_id == Parking.id))\
+         .group_by(Parking.id, Parking.name)\
+         .having(total_revenue > 0)\
+         .order_by(desc('total_revenue')).all()
 
         return [
             {"parking": r[0], "revenue": float(r[1] or 0)} 
@@ -50,23 +71,26 @@ class RevenueByParking(MethodView):
 # 3. RESERVAS POR DÍA (Para gráficos)
 @blp.route("/reservations-by-day")
 class ReservationsByDay(MethodView):
+    @read_only
     def get(self):
         """Cantidad de reservas agrupadas por fecha"""
-        # Extraemos solo la parte de la FECHA (sin hora)
-        results = db.session.query(
-            func.date(Reservation.created_at).label('date'),
-            func.count(Reservation.id).label('count')
-        ).group_by(func.date(Reservation.created_at))\
-         .order_by(func.date(Reservation.created_at)).all()
+        count = func.sum(DailyParkingStats.reservations).label('count')
+        results = date_range_filter(db.session.query(
+            DailyParkingStats.day,
+            count
+        )).group_by(DailyParkingStats.day)\
+         .having(count > 0)\
+         .order_by(DailyParkingStats.day).all()
 
         return [
-            {"date": str(r[0]), "count": r[1]} 
+            {"date": str(r[0]), "count": int(r[1])} 
             for r in results
         ]
 
 # 4. ESTADÍSTICAS POR DISTRITO
 @blp.route("/stats-by-district")
 class StatsByDistrict(MethodView):
+    @read_only
     def get(self):
         """Cuántas cocheras hay en cada distrito"""
         results = db.session.query(
@@ -83,14 +107,17 @@ class StatsByDistrict(MethodView):
 # 5. MEJORES COCHERAS (Top 5 más reservadas)
 @blp.route("/best-parkings")
 class BestParkings(MethodView):
+    @read_only
     def get(self):
         """Las cocheras con más reservas completadas"""
-        results = db.session.query(
+        res_count = func.sum(DailyParkingStats.reservations).label('res_count')
+        results = date_range_filter(db.session.query(
             Parking.name,
             Parking.image_url,
-            func.count(Reservation.id).label('res_count')
-        ).join(Reservation)\
-         .group_by(Parking.id)\
+            res_count
+        ).join(DailyParkingStats, DailyParkingStats.parking_id == Parking.id))\
+         .group_by(Parking.id, Parking.name, Parking.image_url)\
+         .having(res_count > 0)\
          .order_by(desc('res_count'))\
          .limit(5).all()
 
@@ -98,7 +125,17 @@ class BestParkings(MethodView):
             {
                 "name": r[0],
                 "image": r[1],
-                "reservations": r[2]
+                "reservations": int(r[2])
             } 
             for r in results
-        ]
\ No newline at end of file
+        ]
+
+# 6. EFECTIVIDAD DE LA CACHÉ DE RESPUESTAS
+@blp.route("/cache")
+class CacheStats(MethodView):
+    @jwt_required()
+    def get(self):
+        """Aciertos/fallos de la caché de GETs públicos (de este worker; la suma de todos está en /metrics). Solo admin."""
+        if get_jwt().get("role") != "admin":
+            abort(403, message="Solo administradores")
+        return response_cache.stats()
@@ -1,17 +1,33 @@
 from flask.views import MethodView
 from flask_smorest import Blueprint, abort
 from db import db
-from models import Reservation, Parking
+from models import Reservation, Parking, Promotion
 from schemas import ReservationSchema, ReservationUpdate
+from pagination import CursorArgs, keyset_page
 from flask_jwt_extended import jwt_required
 from flask import request
-from sqlalchemy import and_
+from sqlalchemy import and_, or_, select
+import exports
+import geo
+import pricing
+import slots
+import capacity
+import signals
+from idempotency import idempotent
+from replicas import read_only
+from serialization import columns_for
 
-from datetime import datetime, timedelta
-import math
+from datetime import datetime, timedelta, timezone
+from collections import defaultdict
 
 blp = Blueprint("Reservations", "reservations", url_prefix="/api/reservations", description="CRUD de reservas + acciones")
 
+# Columnas que vuelca ReservationSchema (listado como tuplas, sin objetos del ORM)
+RESERVATION_OUT_COLUMNS = columns_for(ReservationSchema(), Reservation)
+
+# Máximo de cocheras por comparación de precios
+ESTIMATE_BATCH_MAX = 500
+
 # --- UTILIDAD: HORA PERÚ ---
 def get_lima_now():
     """Retorna la fecha/hora actual en Lima (UTC-5)"""
@@ -23,19 +39,28 @@ def adjust_to_lima(dt_obj):
         return dt_obj - timedelta(hours=5)
     return dt_obj
 
+def parse_iso(s: str) -> datetime:
+    """Fecha ISO de la query a naive UTC, como las columnas (un offset explícito se convierte)"""
+    dt = datetime.fromisoformat(s.replace("Z", "+00:00"))
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
 @blp.route("/")
 class ReservationsList(MethodView):
     @jwt_required()
+    @blp.arguments(CursorArgs, location="query")
     @blp.response(200, ReservationSchema(many=True))
-    def get(self):
-        """Listar todas las reservas"""
-        return Reservation.query.order_by(Reservation.id.desc()).all()
+    def get(self, args):
+        """Listar reservas (paginado por cursor)"""
+        return keyset_page(Reservation.query.with_entities(*RESERVATION_OUT_COLUMNS), Reservation.id, args)
 
     @jwt_required()
+    @idempotent
     @blp.arguments(ReservationSchema)
     @blp.response(201, ReservationSchema)
     def post(self, data):
-        """Crear una nueva reserva con validaciones"""
+        """Crear una nueva reserva con validaciones. Acepta `Idempotency-Key` para reintentos."""
         
         parking_id = data.get("parking_id")
         user_id = data.get("user_id")
@@ -49,16 +74,14 @@ class ReservationsList(MethodView):
         data["end_time"] = end_time
         data["created_at"] = get_lima_now()
 
-        # --- VALIDACIÓN 1: COCHERA LLENA ---
+        # --- VALIDACIÓN 1: COCHERA EXISTE ---
         parking = Parking.query.get_or_404(parking_id)
-        if parking.available <= 0:
-            abort(400, message="La cochera está llena (0 espacios disponibles).")
 
         # --- VALIDACIÓN 2: USUARIO YA TIENE RESERVA EN ESE HORARIO ---
         existing_overlap = Reservation.query.filter(
             Reservation.user_id == user_id,
             Reservation.parking_id == parking_id,
-            Reservation.status.in_(["reserved", "paid", "pending"]),
+            Reservation.status.in_(capacity.ACTIVE_STATUSES),
             Reservation.start_time < end_time,
             Reservation.end_time > start_time
         ).first()
@@ -67,15 +90,17 @@ class ReservationsList(MethodView):
             abort(400, message="Ya tienes una reserva en este horario. No puedes ocupar dos espacios simultáneamente.")
 
         # --- CREACIÓN ---
-        r = Reservation(**data)
-        
-        # Descontar espacio disponible
-        parking.available -= 1
-        
-        db.session.add(r)
-        db.session.add(parking)
-        db.session.commit()
-        
+        def crear():
+            # Ocupar los bloques del calendario (y el espacio en vivo si ya empezó)
+            error = capacity.reserve(parking, start_time, end_time, get_lima_now())
+            if error:
+                abort(400, message=error)
+            r = Reservation(**data)
+            db.session.add(r)
+            return r
+
+        r = slots.with_retry(crear)
+        signals.parking_changed.send("reservation_create", parking_ids=[parking_id])
         return r
 
 @blp.route("/<int:rid>")
@@ -91,43 +116,91 @@ class ReservationResource(MethodView):
     @blp.response(200, ReservationSchema)
     def put(self, data, rid):
         """Actualizar reserva"""
-        r = Reservation.query.get_or_404(rid)
-        
-        for k, v in data.items():
-            setattr(r, k, v)
-            
-        db.session.commit()
+        for k in ("start_time", "end_time"):
+            if data.get(k):
+                data[k] = data[k].replace(tzinfo=None)
+
+        def actualizar():
+            r = Reservation.query.get_or_404(rid)
+            antes = (r.start_time, r.end_time, r.status in capacity.ACTIVE_STATUSES)
+
+            for k, v in data.items():
+                setattr(r, k, v)
+
+            despues = (r.start_time, r.end_time, r.status in capacity.ACTIVE_STATUSES)
+            if antes != despues:
+                # Mover la reserva en el calendario (o liberarla si se canceló/completó)
+                now = get_lima_now()
+                if antes[2]:
+                    capacity.cancel(r.parking_id, antes[0], antes[1], now)
+                if despues[2]:
+                    error = capacity.reserve(Parking.query.get(r.parking_id), despues[0], despues[1], now)
+                    if error:
+                        abort(400, message=error)
+            return r
+
+        r = slots.with_retry(actualizar)
+        signals.parking_changed.send("reservation_update", parking_ids=[r.parking_id])
         return r
 
     @jwt_required()
     def delete(self, rid):
         """Eliminar reserva (y liberar espacio si aplica)"""
-        r = Reservation.query.get_or_404(rid)
-        
-        # Si se elimina una reserva activa, devolver el espacio
-        if r.status in ["reserved", "paid", "pending"]:
-            parking = Parking.query.get(r.parking_id)
-            if parking and parking.available < parking.capacity:
-                parking.available += 1
-                db.session.add(parking)
-
-        db.session.delete(r)
-        db.session.commit()
+        def eliminar():
+            r = Reservation.query.get_or_404(rid)
+
+            # Si se elimina una reserva activa, devolver sus bloques (y el espacio si estaba en curso)
+            if r.status in capacity.ACTIVE_STATUSES:
+                capacity.cancel(r.parking_id, r.start_time, r.end_time, get_lima_now())
+
+            db.session.delete(r)
+            return r.parking_id
+
+        parking_id = slots.with_retry(eliminar)
+        signals.parking_changed.send("reservation_delete", parking_ids=[parking_id])
         return {"message": "Reserva eliminada correctamente"}, 200
 
 # ============================================================
 # FUNCIONES ESPECIALES
 # ============================================================
 
+@blp.route("/export", methods=["GET"])
+@jwt_required()
+@read_only
+def export_reservations():
+    """
+    Exporta reservas en streaming para contabilidad.
+    Query: `format=ndjson|csv`, `from`/`to` (created_at; YYYY-MM-DD inclusive como en
+    /api/reports), `status=paid,completed`.
+    """
+    query = exports.export_filters(Reservation, select(*Reservation.__table__.columns))
+    return exports.stream_export(query.order_by(Reservation.id), "reservations")
+
+def _parse_id(value):
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"parking_ids inválido: {value.strip()!r}")
+
+def _active_promotions(parking_ids, at):
+    """Promociones activas y vigentes en `at`, agrupadas por cochera (una consulta)"""
+    promos_by_parking = defaultdict(list)
+    if parking_ids:
+        for promo in Promotion.query.filter(
+            Promotion.parking_id.in_(parking_ids),
+            Promotion.is_active == True,
+            or_(Promotion.start_date == None, Promotion.start_date <= at),
+            or_(Promotion.end_date == None, Promotion.end_date >= at)
+        ):
+            promos_by_parking[promo.parking_id].append(promo)
+    return promos_by_parking
+
 @blp.route("/estimate", methods=["GET"])
 @jwt_required()
 def estimate():
     """
     Estima el costo. Recibe horas y calcula en base a tarifa.
     """
-    def parse_iso(s: str) -> datetime:
-        return datetime.fromisoformat(s.replace("Z",""))
-
     parking_id = request.args.get("parking_id", type=int)
     start_str  = request.args.get("start")
     end_str    = request.args.get("end")
@@ -145,16 +218,114 @@ def estimate():
         abort(400, message="La hora fin debe ser mayor a inicio")
 
     parking = Parking.query.get_or_404(parking_id)
-    seconds = (end - start).total_seconds()
-    
-    # Mínimo 1 hora
-    hours = max(1, math.ceil(seconds / 3600.0))
-    
-    total = round(hours * float(parking.price_per_hour), 2)
+    # Mismo cálculo que /estimate-batch: mínimo 1 hora y la mejor promoción vigente
+    hours = pricing.billable_hours(start, end)
+    promos = _active_promotions([parking_id], start)[parking_id]
+    base, total, promo = pricing.quote(parking.price_per_hour, hours, promos)
 
     return {
         "parking_id": parking_id,
         "duration_hours": hours,
-        "estimated_cost": total,
-        "unit_price": str(parking.price_per_hour)
-    }, 200
\ No newline at end of file
+        "estimated_cost": float(total),
+        "unit_price": str(parking.price_per_hour),
+        "base_cost": float(base),
+        "discount": float(base - total),
+        "promotion_id": promo.id if promo else None,
+        "promotion_title": promo.title if promo else None
+    }, 200
+
+@blp.route("/estimate-batch", methods=["GET"])
+@jwt_required()
+@read_only
+def estimate_batch():
+    """
+    Compara el costo de una misma ventana en muchas cocheras, aplicando la mejor
+    promoción vigente de cada una. Recibe `parking_ids=1,2,3` o `bbox=...`.
+    Devuelve la lista ordenada de más barata a más cara.
+    """
+    start_str = request.args.get("start")
+    end_str   = request.args.get("end")
+    ids_str   = request.args.get("parking_ids")
+    bbox_str  = request.args.get("bbox")
+
+    if not (start_str and end_str and (ids_str or bbox_str)):
+        abort(400, message="Faltan datos (start, end y parking_ids o bbox)")
+
+    try:
+        start = parse_iso(start_str)
+        end   = parse_iso(end_str)
+        query = Parking.query
+        if ids_str:
+            ids = [_parse_id(x) for x in ids_str.split(",") if x.strip()]
+            if len(ids) > ESTIMATE_BATCH_MAX:
+                abort(400, message=f"Máximo {ESTIMATE_BATCH_MAX} cocheras por consulta")
+            query = query.filter(Parking.id.in_(ids))
+        else:
+            query = query.filter(*geo.bbox_filter(Parking, geo.parse_bbox(bbox_str)))
+    except ValueError as e:
+        abort(400, message=str(e))
+
+    if end <= start:
+        abort(400, message="La hora fin debe ser mayor a inicio")
+
+    # Consulta 1: tarifas (con bbox, las más baratas primero para que el corte sea estable)
+    parkings = query.with_entities(Parking.id, Parking.name, Parking.price_per_hour)\
+        .order_by(Parking.price_per_hour, Parking.id).limit(ESTIMATE_BATCH_MAX).all()
+
+    # Consulta 2: promociones vigentes al inicio de la ventana
+    promos_by_parking = _active_promotions([p.id for p in parkings], start)
+
+    hours = pricing.billable_hours(start, end)
+    results = []
+    for p in parkings:
+        base, total, promo = pricing.quote(p.price_per_hour, hours, promos_by_parking[p.id])
+        results.append({
+            "parking_id": p.id,
+            "name": p.name,
+            "duration_hours": hours,
+            "unit_price": str(p.price_per_hour),
+            "base_cost": float(base),
+            "discount": float(base - total),
+            "estimated_cost": float(total),
+            "promotion_id": promo.id if promo else None,
+            "promotion_title": promo.title if promo else None
+        })
+
+    results.sort(key=lambda r: (r["estimated_cost"], r["parking_id"]))
+    return results, 200
+
+@blp.route("/availability", methods=["GET"])
+@jwt_required()
+def availability():
+    """
+    Espacios libres de una cochera en una ventana futura (según el calendario).
+    """
+    parking_id = request.args.get("parking_id", type=int)
+    start_str  = request.args.get("start")
+    end_str    = request.args.get("end")
+
+    if not (parking_id and start_str and end_str):
+        abort(400, message="Faltan datos (parking_id, start, end)")
+
+    try:
+        # Misma conversión a Hora Lima que al crear la reserva
+        start = adjust_to_lima(parse_iso(start_str))
+        end   = adjust_to_lima(parse_iso(end_str))
+    except ValueError:
+        abort(400, message="Formato de fecha inválido")
+
+    if end <= start:
+        abort(400, message="La hora fin debe ser mayor a inicio")
+    error = capacity.window_error(start, end)
+    if error:
+        abort(400, message=error)
+
+    parking = Parking.query.get_or_404(parking_id)
+    free, buckets = capacity.free_capacity(parking, start, end)
+
+    return {
+        "parking_id": parking_id,
+        "capacity": parking.capacity,
+        "free": free,
+        "buckets": buckets
+    }, 200
@@ -3,18 +3,20 @@ from flask_smorest import Blueprint, abort
 from db import db
 from models import User
 from schemas import UserOut, UserCreate, UserUpdate
+from pagination import CursorArgs, keyset_page
 from flask_jwt_extended import jwt_required
-from werkzeug.security import generate_password_hash
+from passwords import hash_password
 
 blp = Blueprint("Users", "users", url_prefix="/api/users", description="CRUD de usuarios")
 
 @blp.route("/")
 class UsersList(MethodView):
     @jwt_required()
+    @blp.arguments(CursorArgs, location="query")
     @blp.response(200, UserOut(many=True))
-    def get(self):
-        """Listar todos los usuarios"""
-        return User.query.order_by(User.id.desc()).all()
+    def get(self, args):
+        """Listar usuarios (paginado por cursor)"""
+        return keyset_page(User.query, User.id, args)
 
     @blp.arguments(UserCreate)
     @blp.response(201, UserOut)
@@ -27,7 +29,7 @@ class UsersList(MethodView):
 
         # 🔐 Encriptar la contraseña antes de guardar
         if "password" in data:
-            data["password"] = generate_password_hash(data["password"])
+            data["password"] = hash_password(data["password"])
 
         user = User(**data)
         db.session.add(user)
@@ -58,7 +60,7 @@ class UserResource(MethodView):
 
         # 2. CAMBIAR CONTRASEÑA (Si se envía)
         if "password" in data and data["password"]:
-            data["password"] = generate_password_hash(data["password"])
+            data["password"] = hash_password(data["password"])
 
         for key, value in data.items():
             setattr(user, key, value)
@@ -0,0 +1,97 @@
+import os
+import socket
+import threading
+import time
+from datetime import timedelta
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+import config
+from db import db
+from models import SchedulerLease
+import capacity
+import expiry
+
+# ============================================================
+# TAREAS PERIÓDICAS (UN SOLO WORKER A LA VEZ)
+# ============================================================
+# Cada SCHEDULER_INTERVAL_S, y en un solo proceso entre todos los workers (el
+# que tiene la lease "scheduler" en `scheduler_leases`), tick():
+#   1. capacity.roll() avanza Parking.available al bloque actual.
+#   2. expiry.expire() completa las reservas vencidas y libera sus espacios.
+# La lease dura SCHEDULER_LEASE_S y el dueño la renueva en cada vuelta; si su
+# worker muere, otro la toma cuando vence. El reloj se recibe como parámetro
+# para poder probarlo con uno falso (scripts/check_expiry.py).
+
+LEASE_NAME = "scheduler"
+
+_lease = SchedulerLease.__table__
+_lock = threading.Lock()
+_runner_pid = None
+
+
+def owner_id():
+    """Identifica al proceso dueño de la lease (cambia en cada worker tras el fork)"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def acquire_lease(name, owner, now, ttl_s):
+    """Toma o renueva la lease. False si la tiene otro proceso y no venció."""
+    until = now + timedelta(seconds=ttl_s)
+    taken = db.session.execute(
+        _lease.update()
+        .where(_lease.c.name == name, or_(_lease.c.owner == owner, _lease.c.expires_at < now))
+        .values(owner=owner, expires_at=until)
+    ).rowcount
+    if not taken:
+        try:
+            db.session.execute(_lease.insert().values(name=name, owner=owner, expires_at=until))
+        except IntegrityError:
+            # Existe y es de otro
+            db.session.rollback()
+            return False
+    db.session.commit()
+    return True
+
+
+def tick(now, owner=None):
+    """Una vuelta. None si otro proceso tiene la lease; si no, las reservas vencidas."""
+    if not acquire_lease(LEASE_NAME, owner or owner_id(), now, config.SCHEDULER_LEASE_S):
+        return None
+    capacity.roll(now)
+    return expiry.expire(now)
+
+
+# --- Hilo por worker ---
+
+def _loop(app, clock):
+    while True:
+        with app.app_context():
+            try:
+                tick(clock())
+            except Exception:
+                db.session.rollback()
+                app.logger.exception("Error en las tareas periódicas")
+            finally:
+                db.session.remove()
+        time.sleep(config.SCHEDULER_INTERVAL_S)
+
+
+def _ensure_runner(app, clock):
+    global _runner_pid
+    if _runner_pid != os.getpid():
+        with _lock:
+            if _runner_pid != os.getpid():
+                _runner_pid = os.getpid()
+                threading.Thread(target=_loop, args=(app, clock), daemon=True,
+                                 name="scheduler").start()
+
+
+def init_scheduler(app):
+    """Arranca el hilo con la primera petición de cada worker (no en el master ni en los comandos)"""
+    if not config.SCHEDULER_ENABLED:
+        return
+    from routes.reservations import get_lima_now
+
+    @app.before_request
+    def _start_scheduler():
+        _ensure_runner(app, get_lima_now)
@@ -0,0 +1,114 @@
+from sqlalchemy import bindparam, inspect, or_, select, text
+from sqlalchemy.schema import CreateColumn
+from db import db
+from geo import cell_for
+import models  # Registra todas las tablas en db.metadata
+
+# ============================================================
+# ACTUALIZACIÓN DEL ESQUEMA SIN MIGRACIONES
+# ============================================================
+# El proyecto no tiene carpeta de migraciones y entrypoint.sh crea las tablas
+# con create_all(), que no toca las tablas que ya existen. upgrade() compara
+# db.metadata con la base y agrega lo que falta:
+#   - tablas nuevas (create_all)
+#   - columnas nuevas de tablas existentes (ALTER TABLE ... ADD COLUMN); solo
+#     las que aceptan NULL o tienen server_default, el resto se reporta
+#   - índices nuevos (CREATE INDEX)
+# Las columnas de _BACKFILL se llenan desde los datos existentes al agregarlas.
+# Nunca borra ni cambia nada, así que se puede correr en cada arranque
+# (flask schema-upgrade).
+
+
+def _backfill_paid(conn):
+    # Pagadas: las que están en "paid" o tienen un pago confirmado
+    r, p = models.Reservation.__table__, models.Payment.__table__
+    conn.execute(r.update().where(or_(
+        r.c.status == "paid",
+        r.c.id.in_(select(p.c.reservation_id).where(p.c.status == "paid")),
+    )).values(paid=True))
+
+
+_BACKFILL = {("reservations", "paid"): _backfill_paid}
+
+
+def pending(engine=None):
+    """Columnas e índices del modelo que faltan en la base: [(tabla, columna|None, índice|None)]"""
+    engine = engine or db.engine
+    insp = inspect(engine)
+    existing = set(insp.get_table_names())
+    missing = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing:
+            continue
+        columns = {c["name"] for c in insp.get_columns(table.name)}
+        missing += [(table, col, None) for col in table.columns if col.name not in columns]
+        indexes = {i["name"] for i in insp.get_indexes(table.name)}
+        missing += [(table, None, ix) for ix in table.indexes if ix.name not in indexes]
+    return missing
+
+
+def upgrade(engine=None):
+    """Crea tablas, columnas e índices faltantes. Devuelve (aplicados, omitidos) como textos."""
+    engine = engine or db.engine
+    db.metadata.create_all(engine)
+    done, skipped = [], []
+    # Primero las columnas: los índices nuevos pueden usarlas
+    for table, col, ix in sorted(pending(engine), key=lambda m: m[1] is None):
+        with engine.begin() as conn:
+            if col is not None:
+                if not col.nullable and col.server_default is None:
+                    skipped.append(f"{table.name}.{col.name} (NOT NULL sin server_default)")
+                    continue
+                ddl = CreateColumn(col).compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+                done.append(f"columna {table.name}.{col.name}")
+                backfill = _BACKFILL.get((table.name, col.name))
+                if backfill:
+                    backfill(conn)
+            else:
+                ix.create(conn)
+                done.append(f"índice {ix.name} en {table.name}")
+    return done, skipped
+
+
+def backfill_geo_cells(batch=1000):
+    """Calcula geo_cell para las cocheras que aún no la tienen (p. ej. recién agregada
+    la columna); sin ella no salen en /nearby, /tiles ni en los filtros por bbox.
+    Devuelve cuántas actualizó."""
+    Parking = models.Parking
+    total = 0
+    while True:
+        rows = db.session.query(Parking.id, Parking.lat, Parking.lng)\
+            .filter(Parking.geo_cell == None)\
+            .order_by(Parking.id).limit(batch).all()
+        if not rows:
+            break
+        db.session.execute(
+            Parking.__table__.update()
+            .where(Parking.id == bindparam("pid"))
+            .values(geo_cell=bindparam("cell")),
+            [{"pid": r.id, "cell": cell_for(r.lat, r.lng)} for r in rows]
+        )
+        db.session.commit()
+        total += len(rows)
+    return total
+
+
+def reindex_search_terms(batch=1000):
+    """Reescribe los trigramas del buscador de todas las cocheras (en una base
+    existente parking_search_terms arranca vacía y nada saldría en /search).
+    Devuelve cuántas cocheras reindexó."""
+    Parking = models.Parking
+    total, last_id = 0, 0
+    while True:
+        parkings = Parking.query.filter(Parking.id > last_id)\
+            .order_by(Parking.id).limit(batch).all()
+        if not parkings:
+            break
+        conn = db.session.connection()
+        for p in parkings:
+            models.write_search_terms(conn, p)
+        db.session.commit()
+        total += len(parkings)
+        last_id = parkings[-1].id
+    return total
@@ -1,4 +1,21 @@
-from marshmallow import Schema, fields, validate
+import time
+import marshmallow
+from marshmallow import fields, validate
+import metrics
+from serialization import fast_dump
+
+
+class Schema(marshmallow.Schema):
+    """Base de los schemas: dump precompilado (serialization.py) y tiempo para /metrics"""
+
+    def dump(self, obj, *, many=None):
+        t0 = time.perf_counter()
+        try:
+            many = self.many if many is None else bool(many)
+            result = fast_dump(self, obj, many)
+            return super().dump(obj, many=many) if result is None else result
+        finally:
+            metrics.add_serialization_time(time.perf_counter() - t0)
 
 # ============================================================
 # 1. USUARIOS (Definir esto PRIMERO para evitar NameError)
@@ -96,6 +113,7 @@ class ReservaBase(Schema):
 
 class ReservaSalida(ReservaBase):
     id = fields.Int(dump_only=True)
+    paid = fields.Bool(dump_only=True)
     created_at = fields.DateTime(dump_only=True)
 
 class ReservaCrear(ReservaBase): 
@@ -0,0 +1,58 @@
+"""
+Preparación común de los scripts de scripts/.
+
+Se importa antes que cualquier módulo de la app (config.py lee el entorno al
+importarse):
+
+    import _env
+    _env.setup("mi_script.db")
+
+setup() agrega el backend a sys.path, usa DATABASE_URL si está definida y si
+no un SQLite temporal, y apaga lo que un script no necesita (broker entre
+workers, /metrics, hilo de tareas periódicas). Checks es el contador de pruebas
+[ok]/[FALLA] de los check_* y bench_*.
+"""
+import os
+import sys
+import tempfile
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULTS = {
+    "LIVE_BROKER": "local",         # Sin hilo lector de parking_events
+    "METRICS_ENABLED": "0",
+    "SCHEDULER_ENABLED": "0",       # Sin hilo de tareas periódicas al primer request
+}
+
+
+def setup(db_name, temp_db=False, **overrides):
+    """Prepara el entorno. temp_db=True ignora DATABASE_URL (el script borra y llena la base);
+    overrides se imponen aunque ya estén en el entorno."""
+    if BACKEND not in sys.path:
+        sys.path.insert(0, BACKEND)
+    if temp_db or not os.getenv("DATABASE_URL"):
+        os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), db_name)
+    for key, value in DEFAULTS.items():
+        os.environ.setdefault(key, value)
+    os.environ.update(overrides)
+
+
+class Checks:
+    """check(label, ok, detail) imprime [ok]/[FALLA] y cuenta las fallas"""
+
+    def __init__(self):
+        self.failures = 0
+
+    def __call__(self, label, ok, detail=""):
+        self.failures += not ok
+        extra = "" if ok or detail in ("", None) else f"  -> {detail}"
+        print(f"  [{'ok' if ok else 'FALLA'}] {label}{extra}")
+        return ok
+
+    def problems(self, label, problems, shown=5):
+        """Igual que check() pero con la lista de problemas encontrados (vacía = ok)"""
+        return self(label, not problems, "; ".join(problems[:shown]))
+
+    def exit(self):
+        print(f"\n{self.failures} prueba(s) fallida(s)")
+        sys.exit(1 if self.failures else 0)
@@ -0,0 +1,162 @@
+"""
+Clusters del mapa: tiempo de armado, latencia por zoom y cambios incrementales.
+
+Llena una base local con scripts/generate_dataset.py, arma el índice de
+clusters.py y:
+
+  - mide GET /api/parkings/clusters con viewports de celular al azar
+    en cada zoom (p50/p95, nodos devueltos)
+  - verifica en cada nivel que cantidades, disponibles y precio mínimo
+    cuadren con la base y con los hijos de cada nodo
+  - aplica cambios por la API (adjust-available, altas, movimientos y
+    bajas) y compara el índice incremental con uno reconstruido
+
+Uso (desde estacionaPE/backend):
+    python scripts/bench_clusters.py --parkings 20000 --queries 300
+"""
+import argparse
+import random
+import time
+
+import _env
+_env.setup("bench_clusters.db")
+
+LIMA_LAT, LIMA_LNG = -12.08, -77.03
+SCREEN_PX = (400, 800)
+WORLD = (-85.0, -180.0, 85.0, 180.0)
+
+
+def viewport(rnd, zoom):
+    deg_per_px = 360.0 / (256 * 2 ** zoom)
+    w, h = SCREEN_PX[0] * deg_per_px, SCREEN_PX[1] * deg_per_px
+    lat = LIMA_LAT + rnd.uniform(-0.1, 0.1)
+    lng = LIMA_LNG + rnd.uniform(-0.1, 0.1)
+    return f"{lng - w / 2:.5f},{lat - h / 2:.5f},{lng + w / 2:.5f},{lat + h / 2:.5f}"
+
+
+def check_index(index, expected):
+    """Problemas encontrados comparando cada nivel con `expected` (count, available, min_price)"""
+    import clusters
+    problems = []
+    for z in range(clusters.MIN_ZOOM, clusters.MAX_ZOOM + 2):
+        nodes = index.query(WORLD, z)
+        totals = (sum(n.count for n in nodes), sum(n.available for n in nodes),
+                  min(n.min_price for n in nodes))
+        if totals != expected:
+            problems.append(f"z{z}: {totals} != {expected}")
+        for n in nodes:
+            stack = [n]
+            while stack:
+                node = stack.pop()
+                if node.children:
+                    kids = node.children
+                    if (node.count != sum(c.count for c in kids)
+                            or node.available != sum(c.available for c in kids)
+                            or node.min_price != min(c.min_price for c in kids)):
+                        problems.append(f"z{node.zoom}: nodo no cuadra con sus hijos")
+                    stack.extend(kids)
+    return problems[:5]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--parkings", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200, help="Consultas por zoom")
+    parser.add_argument("--changes", type=int, default=200, help="Cambios incrementales a aplicar")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    from flask_jwt_extended import create_access_token
+    from sqlalchemy import func
+    from app import create_app
+    from db import db
+    from models import Parking
+    import clusters
+    import generate_dataset
+    from loadtest import percentile
+
+    app = create_app()
+    generate_dataset.generate(app, users=200, parkings=args.parkings, reservations=1000,
+                              seed=args.seed, drop=True)
+    with app.app_context():
+        token = create_access_token(identity="1", additional_claims={"role": "admin"})
+    client = app.test_client()
+    headers = {"Authorization": f"Bearer {token}"}
+    rnd = random.Random(args.seed)
+
+    def expected():
+        with app.app_context():
+            n, avail, price = db.session.query(func.count(Parking.id), func.sum(Parking.available),
+                                               func.min(Parking.price_per_hour)).one()
+        return n, avail, price
+
+    with app.app_context():
+        t0 = time.perf_counter()
+        index = clusters.get_index()
+        build_s = time.perf_counter() - t0
+    nodes = sum(len(b) for grid in index.grids.values() for b in grid.values())
+    print(f"\nÍndice: {len(index.leaves)} cocheras, {nodes} nodos, armado en {build_s * 1000:.0f} ms")
+
+    print(f"\n{'zoom':>5} {'p50 ms':>8} {'p95 ms':>8} {'nodos':>7}")
+    for z in range(8, clusters.MAX_ZOOM + 2):
+        times, sizes = [], []
+        for _ in range(args.queries):
+            path = f"/api/parkings/clusters?bbox={viewport(rnd, z)}&zoom={z}"
+            t0 = time.perf_counter()
+            r = client.get(path)
+            times.append((time.perf_counter() - t0) * 1000)
+            sizes.append(len(r.get_json()["clusters"]))
+        times.sort()
+        print(f"{z:>5} {percentile(times, 50):>8.2f} {percentile(times, 95):>8.2f} {sum(sizes) / len(sizes):>7.0f}")
+
+    check = _env.Checks()
+
+    print("\nConsistencia:")
+    check.problems("índice recién armado", check_index(clusters.get_index(), expected()))
+
+    with app.app_context():
+        ids = [pid for (pid,) in db.session.query(Parking.id).all()]
+    t0 = time.perf_counter()
+    for _ in range(args.changes):
+        client.post(f"/api/parkings/{rnd.choice(ids)}/adjust-available",
+                    json={"delta": rnd.choice((-1, 1))}, headers=headers)
+    per_change = (time.perf_counter() - t0) / args.changes * 1000
+    check.problems(f"{args.changes} adjust-available ({per_change:.2f} ms por petición)",
+                   check_index(clusters.get_index(), expected()))
+
+    created = []
+    for i in range(50):
+        r = client.post("/api/parkings/", headers=headers, json={
+            "name": f"Nueva {i}", "lat": LIMA_LAT + rnd.uniform(-0.1, 0.1),
+            "lng": LIMA_LNG + rnd.uniform(-0.1, 0.1), "price_per_hour": f"{rnd.randint(2, 15)}.50",
+            "capacity": 10, "available": rnd.randint(0, 10)})
+        created.append(r.get_json()["id"])
+    check.problems("50 altas", check_index(clusters.get_index(), expected()))
+
+    for pid in rnd.sample(ids, 20):
+        client.put(f"/api/parkings/{pid}", headers=headers, json={
+            "lat": LIMA_LAT + rnd.uniform(-0.1, 0.1), "lng": LIMA_LNG + rnd.uniform(-0.1, 0.1),
+            "price_per_hour": "1.00"})
+    check.problems("20 cocheras movidas (y más baratas)", check_index(clusters.get_index(), expected()))
+
+    for pid in created[:10]:
+        client.delete(f"/api/parkings/{pid}", headers=headers)
+    check.problems("10 bajas", check_index(clusters.get_index(), expected()))
+
+    incremental = clusters.get_index()
+    with app.app_context():
+        rebuilt = clusters.rebuild()
+    problems = []
+    for z in range(clusters.MIN_ZOOM, clusters.MAX_ZOOM + 2):
+        a, b = incremental.query(WORLD, z), rebuilt.query(WORLD, z)
+        if sum(n.count for n in a) != sum(n.count for n in b):
+            problems.append(f"z{z}")
+        if z >= 12:
+            print(f"    z{z}: {len(a)} nodos incremental vs {len(b)} reconstruido")
+    check.problems("incremental = reconstruido (totales por nivel)", problems)
+
+    check.exit()
+
+
+if __name__ == "__main__":
+    main()
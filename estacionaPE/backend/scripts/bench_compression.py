@@ -0,0 +1,134 @@
+"""
+Compresión de respuestas: bytes ahorrados y CPU por endpoint.
+
+Llena una base local con scripts/generate_dataset.py y, para cada endpoint
+y cada codificación disponible (gzip siempre; br y zstd si brotli/zstandard
+están instalados), pide la respuesta sin comprimir y comprimida, reportando:
+
+    KB / KB enc     tamaño crudo y comprimido
+    ms fría         tiempo de compresión en la primera petición
+    ms caliente     lo mismo con la versión ya guardada en response_cache
+
+Verifica además que el cuerpo descomprimido sea idéntico al crudo, que las
+exportaciones lleguen completas comprimidas por partes, que el stream SSE y
+las respuestas chicas no se compriman y que el ETag débil siga dando 304.
+
+Uso (desde estacionaPE/backend):
+    python scripts/bench_compression.py --parkings 5000 --repeat 20
+"""
+import argparse
+import gzip
+import time
+
+import _env
+_env.setup("bench_compression.db")
+
+ENDPOINTS = [
+    "/api/parkings/?limit=500",
+    "/api/parkings/nearby?bbox=-77.20,-12.30,-76.80,-11.80&limit=1000",
+    "/api/parkings/tiles/10/292/546",
+    "/api/parkings/tiles/10/292/546?format=msgpack",
+    "/api/parkings/clusters?bbox=-77.20,-12.30,-76.80,-11.80&zoom=12",
+    "/api/reservations/?limit=500",
+]
+
+
+def decompress(body, encoding):
+    if encoding == "gzip":
+        return gzip.decompress(body)
+    if encoding == "br":
+        import brotli
+        return brotli.decompress(body)
+    import zstandard
+    return zstandard.ZstdDecompressor().decompressobj().decompress(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--parkings", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=20, help="Peticiones calientes por endpoint")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    from flask_jwt_extended import create_access_token
+    from app import create_app
+    import generate_dataset
+    import metrics
+    import response_cache
+    import response_compression
+
+    app = create_app()
+    generate_dataset.generate(app, users=200, parkings=args.parkings, reservations=5000,
+                              seed=args.seed, drop=True)
+    with app.app_context():
+        token = create_access_token(identity="1", additional_claims={"role": "admin"})
+    client = app.test_client()
+    auth = {"Authorization": f"Bearer {token}"}
+
+    # Tiempo de compresión por petición, tal como lo ve /metrics
+    timings = []
+    original = metrics.add_compression
+
+    def record(saved, seconds):
+        timings.append(seconds)
+        original(saved, seconds)
+    metrics.add_compression = record
+
+    check = _env.Checks()
+
+    encodings = response_compression.available_encodings()
+    print(f"\nCodificaciones disponibles: {', '.join(encodings)}")
+    print(f"  {'endpoint':<62} {'enc':>5} {'KB':>8} {'KB enc':>8} {'ms fría':>8} {'ms caliente':>12}")
+    for path in ENDPOINTS:
+        for encoding in encodings:
+            response_cache._entries.clear()
+            raw = client.get(path, headers={**auth, "Accept-Encoding": "identity"})
+            timings.clear()
+            r = client.get(path, headers={**auth, "Accept-Encoding": encoding})
+            cold = sum(timings) * 1000
+            timings.clear()
+            for _ in range(args.repeat):
+                client.get(path, headers={**auth, "Accept-Encoding": encoding})
+            warm = sum(timings) / max(len(timings), 1) * 1000
+            body = r.get_data()
+            applied = r.headers.get("Content-Encoding")
+            print(f"  {path[:62]:<62} {applied or '-':>5} {len(raw.get_data()) / 1024:>8.1f} "
+                  f"{len(body) / 1024:>8.1f} {cold:>8.2f} {warm:>12.3f}")
+            if applied and decompress(body, applied) != raw.get_data():
+                check(f"{path} {encoding}: el cuerpo descomprimido no coincide", False)
+
+    print("\nVerificaciones:")
+    path = ENDPOINTS[0]
+    r = client.get(path, headers={**auth, "Accept-Encoding": "gzip"})
+    etag = r.headers.get("ETag", "")
+    check(f"ETag débil en respuesta comprimida ({etag[:14]}...)", etag.startswith('W/"'))
+    r304 = client.get(path, headers={**auth, "Accept-Encoding": "gzip", "If-None-Match": etag})
+    check("If-None-Match con ETag débil -> 304", r304.status_code == 304)
+    check("Vary: Accept-Encoding", "Accept-Encoding" in r.headers.get("Vary", ""))
+    r = client.get(path, headers={**auth, "Accept-Encoding": "gzip;q=0, identity"})
+    check("gzip;q=0 -> sin comprimir", "Content-Encoding" not in r.headers)
+
+    r = client.get("/api/parkings/1", headers={**auth, "Accept-Encoding": "gzip"})
+    check(f"respuesta chica ({len(r.get_data())} B) sin comprimir", "Content-Encoding" not in r.headers)
+
+    for fmt in ("ndjson", "csv"):
+        plain = client.get(f"/api/reservations/export?format={fmt}", headers={**auth, "Accept-Encoding": "identity"})
+        t0 = time.perf_counter()
+        r = client.get(f"/api/reservations/export?format={fmt}", headers={**auth, "Accept-Encoding": "gzip"})
+        body = r.get_data()
+        elapsed = (time.perf_counter() - t0) * 1000
+        ok = (r.headers.get("Content-Encoding") == "gzip" and "Content-Length" not in r.headers
+              and gzip.decompress(body) == plain.get_data())
+        check(f"export {fmt} por partes: {len(plain.get_data()) / 1024:.0f} KB -> "
+              f"{len(body) / 1024:.0f} KB en {elapsed:.0f} ms", ok)
+
+    r = client.get("/api/parkings/stream?bbox=-77.2,-12.3,-76.8,-11.8",
+                   headers={**auth, "Accept-Encoding": "gzip"}, buffered=False)
+    check("SSE sin comprimir", "Content-Encoding" not in r.headers)
+    r.close()
+
+    check.exit()
+
+
+if __name__ == "__main__":
+    main()
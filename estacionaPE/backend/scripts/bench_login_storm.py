@@ -0,0 +1,160 @@
+"""
+Latencia del resto de la API durante una ráfaga de logins.
+
+Llena una base local con scripts/generate_dataset.py y, mientras varios
+hilos hacen POST /api/auth/login sin parar, otros recorren el mapa
+(/parkings/nearby + /promotions/active, como en scripts/loadtest.py).
+Compara tres fases:
+
+    base        solo el mapa, sin logins
+    en-linea    logins con el hash en el hilo del worker (PASSWORD_POOL_WORKERS=0)
+    pool        logins con el hash en el pool de procesos (passwords.py)
+
+Antes verifica el re-hash al entrar: texto plano legacy y pbkdf2 quedan
+guardados con PASSWORD_HASH_METHOD, y una contraseña incorrecta no toca
+la fila.
+
+Uso (desde estacionaPE/backend):
+    python scripts/bench_login_storm.py --login-threads 16 --api-threads 4 --duration 10
+"""
+import argparse
+import random
+import threading
+import time
+from collections import Counter
+
+import _env
+_env.setup("bench_login.db")
+
+PASSWORD = "estaciona123"       # la de todos los usuarios de generate_dataset
+
+
+def run_phase(app, headers, emails, login_threads, api_threads, duration, seed):
+    from loadtest import InProcessClient, scenario_map, percentile
+
+    stop = threading.Event()
+    api_lat, logins = [], Counter()
+    lock = threading.Lock()
+
+    def api_worker(n):
+        client = InProcessClient(app, headers)
+        rnd = random.Random(f"{seed}-api-{n}")
+        local = []
+        record = lambda status, secs: local.append(secs * 1000)
+        while not stop.is_set():
+            scenario_map(client, None, rnd, record)
+        with lock:
+            api_lat.extend(local)
+
+    def login_worker(n):
+        client = app.test_client()
+        rnd = random.Random(f"{seed}-login-{n}")
+        local = Counter()
+        while not stop.is_set():
+            r = client.post("/api/auth/login", json={"email": rnd.choice(emails), "password": PASSWORD})
+            local[r.status_code] += 1
+        with lock:
+            logins.update(local)
+
+    threads = [threading.Thread(target=api_worker, args=(n,)) for n in range(api_threads)]
+    threads += [threading.Thread(target=login_worker, args=(n,)) for n in range(login_threads)]
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    api_lat.sort()
+    return {
+        "api_req": len(api_lat),
+        "p50": percentile(api_lat, 50),
+        "p95": percentile(api_lat, 95),
+        "p99": percentile(api_lat, 99),
+        "logins_ok": logins[200],
+        "logins_503": logins[503],
+        "logins_otros": sum(n for s, n in logins.items() if s not in (200, 503)),
+    }
+
+
+def check_rehash(app, check):
+    """Texto plano y pbkdf2 se re-hashean al entrar; una clave incorrecta no cambia nada"""
+    from werkzeug.security import generate_password_hash
+    from db import db
+    from models import User
+    import passwords
+
+    client = app.test_client()
+    legacy = {
+        "legacy-plano@estaciona.pe": "clave-plana",
+        "legacy-pbkdf2@estaciona.pe": generate_password_hash("clave-pbkdf2", method="pbkdf2:sha256:600000"),
+    }
+    with app.app_context():
+        for email, stored in legacy.items():
+            db.session.add(User(name="Legacy", email=email, password=stored, role="client"))
+        db.session.commit()
+
+    def stored(email):
+        with app.app_context():
+            return User.query.filter_by(email=email).first().password
+
+    r = client.post("/api/auth/login", json={"email": "legacy-plano@estaciona.pe", "password": "otra"})
+    check("Clave incorrecta rechazada", r.status_code == 401, r.status_code)
+    check("Clave incorrecta no re-hashea", stored("legacy-plano@estaciona.pe") == "clave-plana")
+
+    for email, password in (("legacy-plano@estaciona.pe", "clave-plana"),
+                            ("legacy-pbkdf2@estaciona.pe", "clave-pbkdf2")):
+        r = client.post("/api/auth/login", json={"email": email, "password": password})
+        new = stored(email)
+        check(f"{email}: login correcto", r.status_code == 200, r.status_code)
+        check(f"{email}: guardada con {passwords._method_prefix()}", not passwords.needs_rehash(new), new[:30])
+        r = client.post("/api/auth/login", json={"email": email, "password": password})
+        check(f"{email}: login con el hash nuevo", r.status_code == 200, r.status_code)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--login-threads", type=int, default=16, help="Hilos haciendo login sin parar")
+    parser.add_argument("--api-threads", type=int, default=4, help="Hilos recorriendo el mapa")
+    parser.add_argument("--duration", type=float, default=10.0, help="Segundos por fase")
+    parser.add_argument("--pool-workers", type=int, default=1, help="Procesos del pool en la fase 'pool'")
+    parser.add_argument("--parkings", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    from flask_jwt_extended import create_access_token
+    from app import create_app
+    from models import User
+    import config
+    import generate_dataset
+
+    app = create_app()
+    generate_dataset.generate(app, users=args.users, parkings=args.parkings, reservations=2000,
+                              seed=args.seed, drop=True)
+    with app.app_context():
+        emails = [u.email for u in User.query.limit(args.users)]
+        token = create_access_token(identity="1", additional_claims={"role": "admin"})
+    headers = {"Authorization": f"Bearer {token}"}
+
+    config.PASSWORD_POOL_WORKERS = args.pool_workers
+    print("Re-hash al entrar:")
+    check = _env.Checks()
+    check_rehash(app, check)
+
+    phases = (("base", 0, None), ("en-linea", args.login_threads, 0),
+              ("pool", args.login_threads, args.pool_workers))
+    print(f"\n{args.api_threads} hilos de mapa, {args.login_threads} de login, {args.duration:g} s por fase")
+    print(f"{'fase':<10} {'api req':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'login ok':>9} {'503':>6} {'otros':>6}")
+    for name, login_threads, workers in phases:
+        if workers is not None:
+            config.PASSWORD_POOL_WORKERS = workers
+        r = run_phase(app, headers, emails, login_threads, args.api_threads, args.duration, args.seed)
+        print(f"{name:<10} {r['api_req']:>8} {r['p50']:>8.2f} {r['p95']:>8.2f} {r['p99']:>8.2f} "
+              f"{r['logins_ok']:>9} {r['logins_503']:>6} {r['logins_otros']:>6}")
+
+    check.exit()
+
+
+if __name__ == "__main__":
+    main()
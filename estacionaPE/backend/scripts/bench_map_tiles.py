@@ -0,0 +1,152 @@
+"""
+Tamaño y costo del mapa completo de Lima: listado normal vs tiles compactos.
+
+Llena una base local con scripts/generate_dataset.py y compara, para los
+tiles que cubren Lima en cada zoom:
+
+    listado    GET /api/parkings/ (todas las páginas, todas las columnas)
+    nearby     GET /api/parkings/nearby?bbox=<Lima>
+    tiles      GET /api/parkings/tiles/<z>/<x>/<y> en JSON y en MessagePack
+
+reportando bytes (crudos y con gzip) y consultas SQL en total, con la
+caché fría y caliente. Verifica que los tiles decodificados coincidan con
+las cocheras (posición dentro de la cuantización) y que un cambio de
+disponibilidad invalide su tile y no los demás.
+
+Uso (desde estacionaPE/backend):
+    python scripts/bench_map_tiles.py --parkings 5000 --zoom 10 11 12
+"""
+import argparse
+import gzip
+import json
+import time
+import msgpack
+
+import _env
+_env.setup("bench_tiles.db")
+
+# Lima Metropolitana (min_lng, min_lat, max_lng, max_lat)
+LIMA_BBOX = (-77.20, -12.30, -76.80, -11.80)
+
+
+def tiles_for(z):
+    import config
+    import map_tiles
+    min_lng, min_lat, max_lng, max_lat = LIMA_BBOX
+    x0, y0 = map_tiles.tile_for(max_lat, min_lng, z)
+    x1, y1 = map_tiles.tile_for(min_lat, max_lng, z)
+    return [(z, x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+
+def decode(tile):
+    """Cocheras del tile: {id: (lat, lng, available, precio)}"""
+    west, south, east, north = tile["bounds"]
+    extent = tile["extent"]
+    out, pid = {}, 0
+    for d, x, y, avail, price in zip(tile["id"], tile["x"], tile["y"], tile["available"], tile["price"]):
+        pid += d
+        out[pid] = (north - y / extent * (north - south), west + x / extent * (east - west), avail, price)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--parkings", type=int, default=5000)
+    parser.add_argument("--zoom", type=int, nargs="+", default=[10, 11, 12])
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    from flask_jwt_extended import create_access_token
+    from app import create_app
+    from models import Parking
+    import config
+    import generate_dataset
+    import map_tiles
+    import query_profiler
+
+    app = create_app()
+    generate_dataset.generate(app, users=200, parkings=args.parkings, reservations=1000,
+                              seed=args.seed, drop=True)
+    with app.app_context():
+        token = create_access_token(identity="1", additional_claims={"role": "admin"})
+        parkings = {p.id: p for p in Parking.query.all()}
+    client = app.test_client()
+    headers = {"Authorization": f"Bearer {token}"}
+
+    def fetch(path):
+        with query_profiler.capture() as cap:
+            r = client.get(path, headers=headers)
+        assert r.status_code == 200, (path, r.status_code, r.get_data()[:200])
+        return r.get_data(), cap.count
+
+    def row(label, bodies, queries):
+        raw = sum(len(b) for b in bodies)
+        gz = sum(len(gzip.compress(b)) for b in bodies)
+        print(f"  {label:<28} {len(bodies):>5} {raw / 1024:>10.1f} {gz / 1024:>10.1f} {queries:>8}")
+
+    print(f"\n{len(parkings)} cocheras, Lima = {LIMA_BBOX}")
+    print(f"  {'':<28} {'pet.':>5} {'KB':>10} {'KB gzip':>10} {'SQL':>8}")
+
+    pages, cursor = [], None
+    while True:
+        r = client.get("/api/parkings/?limit=500" + (f"&cursor={cursor}" if cursor else ""), headers=headers)
+        pages.append(r.get_data())
+        cursor = json.loads(r.headers["X-Pagination"])["next_cursor"]
+        if not cursor:
+            break
+    row("listado (todas las páginas)", pages, "-")
+    bbox = ",".join(str(v) for v in LIMA_BBOX)
+    body, n = fetch(f"/api/parkings/nearby?bbox={bbox}&limit=1000")
+    row("nearby (máx. 1000)", [body], n)
+
+    check = _env.Checks()
+    for z in args.zoom:
+        tiles = tiles_for(z)
+        for fmt in ("json", "msgpack"):
+            cold, cold_sql, warm_sql, seen = [], 0, 0, {}
+            for t in tiles:
+                body, n = fetch(f"/api/parkings/tiles/{t[0]}/{t[1]}/{t[2]}?format={fmt}")
+                cold.append(body)
+                cold_sql += n
+                warm_sql += fetch(f"/api/parkings/tiles/{t[0]}/{t[1]}/{t[2]}?format={fmt}")[1]
+                tile = json.loads(body) if fmt == "json" else msgpack.unpackb(body)
+                for pid, values in decode(tile).items():
+                    assert pid not in seen, f"cochera {pid} en dos tiles"
+                    seen[pid] = values
+            row(f"tiles z{z} {fmt} (fría)", cold, cold_sql)
+            row(f"tiles z{z} {fmt} (caliente)", cold, warm_sql)
+            if seen:
+                min_lng, min_lat, max_lng, max_lat = LIMA_BBOX
+                inside = {pid for pid, p in parkings.items()
+                          if min_lng <= p.lng <= max_lng and min_lat <= p.lat <= max_lat}
+                missing = inside - set(seen)
+                err = max(max(abs(seen[pid][0] - parkings[pid].lat), abs(seen[pid][1] - parkings[pid].lng))
+                          for pid in seen)
+                wrong = [pid for pid in seen if seen[pid][2] != parkings[pid].available
+                         or seen[pid][3] != int(parkings[pid].price_per_hour * 100)]
+                check(f"z{z} {fmt}: {len(seen)} cocheras, error máx. {err * 111320:.1f} m, "
+                      f"faltan {len(missing)}, datos distintos {len(wrong)}", not missing and not wrong)
+
+    # Un cambio de disponibilidad invalida el tile, no los demás
+    pid, p = next(iter(parkings.items()))
+    z = args.zoom[-1]
+    path = "/api/parkings/tiles/{}/{}/{}".format(z, *map_tiles.tile_for(p.lat, p.lng, z))
+    other = next(t for t in tiles_for(z) if t != (z, *map_tiles.tile_for(p.lat, p.lng, z)))
+    other_path = "/api/parkings/tiles/{}/{}/{}".format(*other)
+    fetch(path)
+    fetch(other_path)
+    warm = fetch(other_path)[1]
+    delta = -1 if p.available > 0 else 1
+    client.post(f"/api/parkings/{pid}/adjust-available", json={"delta": delta}, headers=headers)
+    time.sleep(config.RESPONSE_CACHE_BUMP_S + 0.5)     # la invalidación por disponibilidad es diferida
+    tile = decode(json.loads(fetch(path)[0]))
+    check(f"adjust-available invalida el tile a los {config.RESPONSE_CACHE_BUMP_S:g} s "
+          f"({p.available} -> {tile[pid][2]})",
+          tile[pid][2] == p.available + delta)
+    n = fetch(other_path)[1]
+    check(f"otro tile sigue en caché ({n} consulta(s), igual que caliente)", n == warm)
+    check.exit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark del buscador: ilike('%q%') (versión anterior) vs índice de trigramas.
+
+Uso (desde estacionaPE/backend):
+    python scripts/bench_search.py --sizes 10000 100000
+Usa DATABASE_URL si está definida; si no, un SQLite temporal.
+"""
+import argparse
+import random
+import statistics
+import time
+from types import SimpleNamespace
+
+import _env
+_env.setup("bench_search.db")
+
+from sqlalchemy import or_
+from app import create_app
+from db import db
+from models import Parking, ParkingSearchTerm
+from schemas import ParkingOut
+from geo import cell_for
+import text_search
+
+DISTRICTS = ["Miraflores", "San Isidro", "Surco", "San Borja", "Barranco", "Lince",
+             "Jesús María", "Magdalena", "Pueblo Libre", "La Molina", "Cercado de Lima"]
+STREETS = ["Av. Larco", "Av. Arequipa", "Av. Javier Prado", "Jr. de la Unión",
+           "Av. Benavides", "Calle Schell", "Av. Pardo", "Av. Angamos", "Av. Brasil"]
+QUERIES = ["miraflores", "av larco", "san isid", "mirafores", "jesus maria", "cochera 12"]
+
+
+def seed(n, batch=5000):
+    rnd = random.Random(42)
+    db.drop_all()
+    db.create_all()
+    for start in range(0, n, batch):
+        rows, terms = [], []
+        for i in range(start, min(n, start + batch)):
+            lat = -12.2 + rnd.random() * 0.3
+            lng = -77.1 + rnd.random() * 0.2
+            p = SimpleNamespace(
+                id=i + 1, name=f"Cochera {i}", district=rnd.choice(DISTRICTS),
+                address=f"{rnd.choice(STREETS)} {rnd.randint(100, 3999)}"
+            )
+            rows.append(dict(id=p.id, name=p.name, address=p.address, district=p.district,
+                             lat=lat, lng=lng, geo_cell=cell_for(lat, lng),
+                             price_per_hour=rnd.randint(3, 15), capacity=20,
+                             available=rnd.randint(0, 20)))
+            terms += [{"parking_id": p.id, "term": t} for t in text_search.parking_terms(p)]
+        db.session.execute(Parking.__table__.insert(), rows)
+        db.session.execute(ParkingSearchTerm.__table__.insert(), terms)
+        db.session.commit()
+
+
+def ilike_search(q):
+    like_str = f"%{q}%"
+    results = Parking.query.filter(or_(
+        Parking.name.ilike(like_str),
+        Parking.address.ilike(like_str),
+        Parking.district.ilike(like_str)
+    )).order_by(Parking.price_per_hour.asc()).all()
+    return ParkingOut(many=True).dump(results)
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_app()
+    client = app.test_client()
+    with app.app_context():
+        for n in args.sizes:
+            seed(n)
+            print(f"\n== {n} cocheras ==")
+            print(f"{'consulta':<14}{'ilike (ms)':>12}{'trigramas (ms)':>16}{'hits':>7}")
+            for q in QUERIES:
+                old_ms = timed(lambda: ilike_search(q), args.repeat)
+                new_ms = timed(lambda: client.get("/api/parkings/search", query_string={"q": q}), args.repeat)
+                hits = len(client.get("/api/parkings/search", query_string={"q": q}).get_json())
+                print(f"{q:<14}{old_ms:>12.1f}{new_ms:>16.1f}{hits:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Filas por segundo al serializar listados grandes, antes y después del
+camino rápido de serialization.py.
+
+Para ParkingOut y ReservationOut compara, con N filas:
+
+    antes      objetos del ORM + marshmallow + json de la stdlib
+    después    tuplas (columns_for) + dumper precompilado + orjson
+
+midiendo por separado consulta, dump y JSON, y verifica que los bytes
+finales sean idénticos. Después compara las respuestas reales de los
+endpoints de listados con FAST_SERIALIZATION encendido y apagado.
+
+Uso (desde estacionaPE/backend):
+    python scripts/bench_serialization.py --rows 10000 --repeat 5
+"""
+import argparse
+import time
+
+import _env
+_env.setup("bench_ser.db")
+
+ENDPOINTS = [
+    "/api/parkings/?limit=500",
+    "/api/parkings/nearby?bbox=-77.2,-12.3,-76.8,-11.8&limit=1000",
+    "/api/parkings/search?q=miraflores&limit=200",
+    "/api/parkings/owner/{owner_id}",
+    "/api/reservations/?limit=500",
+]
+
+
+def best_of(repeat, fn):
+    best, result = None, None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def bench(app, check, label, schema_cls, model, rows, repeat):
+    from flask.json.provider import DefaultJSONProvider
+    from db import db
+    from serialization import columns_for
+    import config
+
+    schema = schema_cls(many=True)
+    columns = columns_for(schema, model)
+    provider = app.json
+    print(f"\n{label} ({rows} filas, mejor de {repeat})")
+    print(f"  {'camino':<8} {'consulta':>10} {'dump':>10} {'json':>10} {'total':>10} {'filas/s':>11}")
+
+    outputs = {}
+    with app.app_context():
+        for name, fast in (("antes", False), ("después", True)):
+            config.FAST_SERIALIZATION = fast
+
+            def query():
+                db.session.expunge_all()
+                q = model.query.with_entities(*columns) if fast else model.query
+                return q.order_by(model.id).limit(rows).all()
+
+            def encode(data):
+                if fast:
+                    return provider.dumps_compact(data)
+                return DefaultJSONProvider.dumps(provider, data, separators=(",", ":")).encode()
+
+            t_query, objs = best_of(repeat, query)
+            t_dump, data = best_of(repeat, lambda: schema.dump(objs))
+            t_json, out = best_of(repeat, lambda: encode(data))
+            total = t_query + t_dump + t_json
+            outputs[name] = out
+            print(f"  {name:<8} {t_query * 1000:>8.1f}ms {t_dump * 1000:>8.1f}ms {t_json * 1000:>8.1f}ms "
+                  f"{total * 1000:>8.1f}ms {len(objs) / total:>11,.0f}")
+    check(f"salida idéntica ({len(outputs['antes']):,} bytes)", outputs["antes"] == outputs["después"])
+
+
+def compare_endpoints(app, check):
+    """Mismos bytes en las respuestas reales con el camino rápido encendido y apagado"""
+    from flask_jwt_extended import create_access_token
+    from models import Parking
+    import config
+    import response_cache
+
+    with app.app_context():
+        token = create_access_token(identity="1", additional_claims={"role": "admin"})
+        owner_id = Parking.query.filter(Parking.owner_id.isnot(None)).first().owner_id
+    client = app.test_client()
+    headers = {"Authorization": f"Bearer {token}"}
+    print("\nEndpoints (FAST_SERIALIZATION=0 vs 1):")
+    for path in ENDPOINTS:
+        path = path.format(owner_id=owner_id)
+        bodies = []
+        for fast in (False, True):
+            config.FAST_SERIALIZATION = fast
+            with app.app_context():
+                response_cache.bump("parkings")     # no servir la copia en caché
+            r = client.get(path, headers=headers)
+            bodies.append((r.status_code, r.get_data(), r.headers.get("X-Pagination")))
+        check(f"{path}  ({len(bodies[1][1]):,} bytes)", bodies[0] == bodies[1] and bodies[0][0] == 200)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    from app import create_app
+    from models import Parking, Reservation
+    from schemas import ParkingOut, ReservationOut
+    import generate_dataset
+    import serialization
+
+    app = create_app()
+    generate_dataset.generate(app, users=500, parkings=args.rows, reservations=args.rows,
+                              seed=args.seed, drop=True)
+    print(f"\norjson: {'sí' if serialization.orjson is not None else 'no instalado (solo dumpers precompilados)'}")
+
+    check = _env.Checks()
+    bench(app, check, "ParkingOut", ParkingOut, Parking, args.rows, args.repeat)
+    bench(app, check, "ReservationOut", ReservationOut, Reservation, args.rows, args.repeat)
+    compare_endpoints(app, check)
+    check.exit()
+
+
+if __name__ == "__main__":
+    main()
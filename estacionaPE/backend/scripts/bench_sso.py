@@ -0,0 +1,216 @@
+"""
+Pruebas y latencia del login SSO contra un proveedor OIDC falso local.
+
+Levanta un IdP mínimo en 127.0.0.1 (discovery, JWKS, token y un /me tipo
+Graph) con llaves RSA propias, y recorre el flujo completo de la app:
+/api/login/<proveedor> -> /api/auth/<proveedor>?code&state -> exp://?token=...
+
+Verifica:
+  - Google y Microsoft (issuer multi-tenant con {tenantid}) validan el ID token local
+  - Microsoft no llama a Graph si el token trae correo, y sí cuando no lo trae
+  - Firma inválida y nonce incorrecto se rechazan
+  - Rotación de llaves: un kid nuevo provoca un solo re-fetch del JWKS
+Y mide la latencia por login con caché caliente vs. fría, contando las
+peticiones y conexiones nuevas hacia el IdP.
+
+Uso (desde estacionaPE/backend):
+    python scripts/bench_sso.py --logins 200 --idp-latency-ms 30
+"""
+import argparse
+import json
+import os
+import statistics
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import _env
+_env.setup("bench_sso.db", temp_db=True,
+           GOOGLE_CLIENT_ID="estacionape-test", MICROSOFT_CLIENT_ID="estacionape-test",
+           GOOGLE_CLIENT_SECRET="secreto", MICROSOFT_CLIENT_SECRET="secreto")
+os.environ.setdefault("SECRET_KEY", "bench-sso")
+
+from joserfc import jwt
+from joserfc.jwk import RSAKey, KeySet
+
+TENANT = "tenant-1234"
+
+
+class FakeIdP:
+    """Proveedor OIDC en memoria; /google/... y /ms/... con el mismo juego de llaves"""
+
+    def __init__(self, latency_s=0.0):
+        self.latency_s = latency_s
+        self.keys = [RSAKey.generate_key(2048, parameters={"kid": "k1"})]
+        self.codes = {}             # code -> (proveedor, nonce, claims extra)
+        self.hits = Counter()
+        self.connections = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def rotate(self):
+        self.keys.insert(0, RSAKey.generate_key(2048, parameters={"kid": f"k{len(self.keys) + 1}"}))
+
+    def issuer(self, provider):
+        return f"{self.base}/ms/{{tenantid}}/v2.0" if provider == "ms" else f"{self.base}/google"
+
+    def metadata_url(self, provider):
+        return f"{self.base}/{provider}/.well-known/openid-configuration"
+
+    def id_token(self, provider, nonce, extra, key=None):
+        now = int(time.time())
+        iss = self.issuer(provider).replace("{tenantid}", TENANT)
+        claims = {"iss": iss, "aud": "estacionape-test", "sub": str(uuid.uuid4()), "iat": now,
+                  "exp": now + 600, "nonce": nonce, "name": "Usuario Prueba", "tid": TENANT}
+        claims.update(extra)
+        key = key or self.keys[0]
+        return jwt.encode({"alg": "RS256", "kid": key.kid}, claims, key)
+
+    def _handler(self):
+        idp = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"       # keep-alive
+
+            def setup(self):
+                super().setup()
+                idp.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def _json(self, body, status=200):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                time.sleep(idp.latency_s)
+                path = urlparse(self.path).path
+                provider = path.split("/")[1]
+                if path.endswith("/.well-known/openid-configuration"):
+                    idp.hits["discovery"] += 1
+                    self._json({
+                        "issuer": idp.issuer(provider),
+                        "authorization_endpoint": f"{idp.base}/{provider}/authorize",
+                        "token_endpoint": f"{idp.base}/{provider}/token",
+                        "jwks_uri": f"{idp.base}/{provider}/jwks",
+                        "userinfo_endpoint": f"{idp.base}/{provider}/userinfo",
+                        "id_token_signing_alg_values_supported": ["RS256"],
+                    })
+                elif path.endswith("/jwks"):
+                    idp.hits["jwks"] += 1
+                    self._json(KeySet(idp.keys).as_dict(private=False))
+                elif path == "/graph/me":
+                    idp.hits["graph"] += 1
+                    self._json({"mail": "graph@estaciona.pe", "displayName": "Desde Graph"})
+                else:
+                    self._json({"error": "not_found"}, 404)
+
+            def do_POST(self):
+                time.sleep(idp.latency_s)
+                length = int(self.headers.get("Content-Length", 0))
+                form = parse_qs(self.rfile.read(length).decode())
+                idp.hits["token"] += 1
+                provider, nonce, extra, key = idp.codes.pop(form.get("code", [""])[0], (None,) * 4)
+                if provider is None:
+                    return self._json({"error": "invalid_grant"}, 400)
+                self._json({"access_token": "at-" + uuid.uuid4().hex, "token_type": "Bearer",
+                            "expires_in": 3600, "id_token": idp.id_token(provider, nonce, extra, key)})
+
+        return Handler
+
+
+def login(client, idp, provider, extra, nonce_override=None, key=None):
+    """Un login completo. Devuelve (status final, location, segundos)"""
+    route = "google" if provider == "google" else "microsoft"
+    t0 = time.perf_counter()
+    r = client.get(f"/api/login/{route}")
+    query = parse_qs(urlparse(r.headers["Location"]).query)
+    code = uuid.uuid4().hex
+    idp.codes[code] = (provider, nonce_override or query["nonce"][0], extra, key)
+    r = client.get(f"/api/auth/{route}?code={code}&state={query['state'][0]}")
+    return r.status_code, r.headers.get("Location", r.get_data(as_text=True)[:120]), time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--idp-latency-ms", type=float, default=20.0, help="Latencia simulada del proveedor")
+    args = parser.parse_args()
+
+    idp = FakeIdP(args.idp_latency_ms / 1000)
+    os.environ["SSO_GOOGLE_METADATA_URL"] = idp.metadata_url("google")
+    os.environ["SSO_MICROSOFT_METADATA_URL"] = idp.metadata_url("ms")
+
+    from app import create_app
+    from db import db
+    import routes.auth
+    import oauth_client
+
+    routes.auth.GRAPH_ME_URL = f"{idp.base}/graph/me"
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+
+    check = _env.Checks()
+
+    print("Pruebas:")
+    status, loc, _ = login(client, idp, "google", {"email": "g@estaciona.pe"})
+    check("Google: login con ID token local", status == 302 and "token=" in loc and loc.startswith("exp:"), loc)
+
+    before = idp.hits["graph"]
+    status, loc, _ = login(client, idp, "ms", {"preferred_username": "ms@estaciona.pe"})
+    check("Microsoft: issuer {tenantid} validado localmente", status == 302 and "token=" in loc, loc)
+    check("Microsoft: sin llamada a Graph si el token trae correo", idp.hits["graph"] == before)
+
+    status, loc, _ = login(client, idp, "ms", {"preferred_username": "sin-correo"})
+    check("Microsoft: Graph como respaldo si falta el correo",
+          status == 302 and idp.hits["graph"] == before + 1, loc)
+
+    status, _, _ = login(client, idp, "google", {"email": "g@estaciona.pe"}, nonce_override="otro")
+    check("Nonce incorrecto rechazado", status == 400, status)
+
+    intruso = RSAKey.generate_key(2048, parameters={"kid": "k1"})
+    status, _, _ = login(client, idp, "google", {"email": "g@estaciona.pe"}, key=intruso)
+    check("Firma con otra llave rechazada", status == 400, status)
+
+    jwks_before = idp.hits["jwks"]
+    idp.rotate()
+    status, loc, _ = login(client, idp, "google", {"email": "g@estaciona.pe"})
+    check("Rotación de llaves: kid nuevo aceptado", status == 302, loc)
+    check("Rotación de llaves: un solo re-fetch del JWKS", idp.hits["jwks"] == jwks_before + 1,
+          idp.hits["jwks"] - jwks_before)
+
+    print(f"\nLatencia ({args.logins} logins Microsoft, IdP a {args.idp_latency_ms:g} ms):")
+    for mode in ("fría", "caliente"):
+        idp.hits.clear()
+        conns_before = idp.connections
+        times = []
+        for i in range(args.logins):
+            if mode == "fría":
+                oauth_client.documents.clear()
+                oauth_client._adapter.poolmanager.clear()
+            status, _, secs = login(client, idp, "ms", {"email": f"user{i}@estaciona.pe"})
+            times.append(secs * 1000)
+        times.sort()
+        outbound = sum(idp.hits.values())
+        print(f"  caché {mode:<9} p50 {statistics.median(times):7.1f} ms  "
+              f"p95 {times[int(len(times) * 0.95) - 1]:7.1f} ms  "
+              f"{outbound / args.logins:.2f} peticiones/login  "
+              f"{(idp.connections - conns_before) / args.logins:.2f} conexiones nuevas/login  {dict(idp.hits)}")
+
+    idp.server.shutdown()
+    check.exit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+Motor de vencimiento de reservas (expiry.py) con un reloj falso.
+
+Llena una base local con scripts/generate_dataset.py, deja todas las
+cocheras libres y crea reservas activas alrededor de T0. Después avanza el
+reloj minuto a minuto con dos "workers" (A y B) llamando a scheduler.tick() y
+verifica:
+
+  - solo uno de los dos tiene la lease en cada vuelta
+  - si A deja de correr, B toma la lease cuando vence (SCHEDULER_LEASE_S)
+  - ninguna reserva activa queda con end_time en el pasado
+  - Parking.available = capacidad - reservas activas en el bloque en vivo
+  - el calendario y los rollups coinciden con los reconstruidos desde cero
+  - una reserva pagada que vence queda `completed`, sigue contando como
+    pagada y pagarla de nuevo no cobra otra vez
+
+Al final mide cuántas reservas por segundo completa una vuelta cuando
+vencen miles a la vez.
+
+Uso (desde estacionaPE/backend):
+    python scripts/check_expiry.py --reservations 5000 --burst 20000
+"""
+import argparse
+import random
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import _env
+_env.setup("check_expiry.db", SCHEDULER_ENABLED="0")    # Las vueltas las da este script con su reloj
+
+T0 = datetime(2026, 3, 2, 8, 0)
+CAPACITY = 100
+
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, **kwargs):
+        self.now += timedelta(**kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--parkings", type=int, default=500)
+    parser.add_argument("--reservations", type=int, default=5000)
+    parser.add_argument("--hours", type=int, default=11, help="Horas de reloj falso a recorrer")
+    parser.add_argument("--burst", type=int, default=20000, help="Reservas que vencen en el mismo minuto")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    from flask_jwt_extended import create_access_token
+    from app import create_app
+    from db import db
+    from models import CapacityBucket, DailyParkingStats, Parking, Payment, Reservation, User
+    import capacity
+    import config
+    import generate_dataset
+    import rollups
+    import routes.reservations
+    import scheduler
+
+    clock = FakeClock(T0)
+    routes.reservations.get_lima_now = clock
+    rnd = random.Random(args.seed)
+
+    app = create_app()
+    generate_dataset.generate(app, users=200, parkings=args.parkings, reservations=2000,
+                              seed=args.seed, drop=True, now=T0)
+
+    def create_reservations(n, start_of, now):
+        parkings = Parking.query.all()
+        for i in range(n):
+            parking = rnd.choice(parkings)
+            start, end = start_of()
+            error = capacity.reserve(parking, start, end, now)
+            assert error is None, error
+            db.session.add(Reservation(
+                parking_id=parking.id, user_id=rnd.randint(1, 200), start_time=start, end_time=end,
+                status=rnd.choice(capacity.ACTIVE_STATUSES), created_at=now,
+                total_amount=Decimal(rnd.randint(5, 40))))
+            if i % 1000 == 999:
+                db.session.commit()
+        db.session.commit()
+
+    with app.app_context():
+        # Punto de partida: nada activo y todas las cocheras libres
+        db.session.execute(Reservation.__table__.update()
+                           .where(Reservation.status.in_(capacity.ACTIVE_STATUSES))
+                           .values(status="cancelled"))
+        db.session.execute(Parking.__table__.update().values(capacity=CAPACITY, available=CAPACITY))
+        db.session.commit()
+        rollups.rebuild()
+        capacity.rebuild(T0)
+
+        def window():
+            start = T0 + timedelta(minutes=rnd.randint(-120, 360))
+            return start, start + timedelta(minutes=rnd.randint(20, 240))
+        create_reservations(args.reservations, window, T0)
+
+    check = _env.Checks()
+
+    def live_problems(now):
+        """Reservas vencidas activas y cocheras cuyo available no cuadra"""
+        problems = []
+        live = capacity.live_bucket(now)
+        active = db.session.query(Reservation.parking_id, Reservation.start_time, Reservation.end_time)\
+            .filter(Reservation.status.in_(capacity.ACTIVE_STATUSES)).all()
+        overdue = sum(1 for r in active if r.end_time <= now)
+        if overdue:
+            problems.append(f"{overdue} reservas activas vencidas a las {now:%H:%M}")
+        occupied = Counter(r.parking_id for r in active
+                           if live in capacity.window_buckets(r.start_time, r.end_time))
+        for pid, cap, avail in db.session.query(Parking.id, Parking.capacity, Parking.available):
+            if avail != cap - occupied[pid]:
+                problems.append(f"{now:%H:%M} cochera {pid}: available {avail} != {cap - occupied[pid]}")
+        return problems
+
+    print(f"\nReloj falso desde {T0:%Y-%m-%d %H:%M}, {args.reservations} reservas, lease {config.SCHEDULER_LEASE_S} s")
+    leaders, completed, problems = Counter(), 0, []
+    dead_at = T0 + timedelta(hours=args.hours // 2)
+    takeover, gaps = None, 0
+    with app.app_context():
+        while clock.now <= T0 + timedelta(hours=args.hours):
+            results = {}
+            for owner in ("A", "B"):
+                if owner == "A" and clock.now >= dead_at:
+                    continue                    # A "se cayó"
+                results[owner] = scheduler.tick(clock.now, owner=owner)
+            active = [o for o, r in results.items() if r is not None]
+            if len(active) > 1:
+                problems.append(f"{clock.now:%H:%M}: dos líderes")
+            for owner in active:
+                leaders[owner] += 1
+                completed += results[owner]
+            if "B" in active and takeover is None and clock.now >= dead_at:
+                takeover = clock.now - dead_at
+            if not active:
+                gaps += 1                       # Nadie tiene la lease (traspaso)
+            elif clock.now.minute % 5 == 0:
+                problems += live_problems(clock.now)
+            clock.advance(minutes=1)
+
+        check.problems(f"un solo líder por vuelta (A {leaders['A']}, B {leaders['B']})",
+                       [p for p in problems if "líder" in p])
+        check.problems(f"B toma la lease {takeover} después de que A deja de correr ({gaps} vuelta(s) sin líder)",
+                       [] if takeover is not None and takeover <= timedelta(seconds=config.SCHEDULER_LEASE_S + 60)
+                       else ["B nunca tomó la lease"])
+        check.problems(f"{completed} reservas completadas; available cuadra cada 5 min con líder",
+                       [p for p in problems if "líder" not in p])
+
+        live = capacity.live_bucket(clock.now)
+        before = {(pid, b): n for pid, b, n in db.session.query(
+            CapacityBucket.parking_id, CapacityBucket.bucket, CapacityBucket.reserved)
+            .filter(CapacityBucket.bucket >= live) if n}
+        capacity.rebuild(clock.now)
+        after = {(pid, b): n for pid, b, n in db.session.query(
+            CapacityBucket.parking_id, CapacityBucket.bucket, CapacityBucket.reserved)
+            .filter(CapacityBucket.bucket >= live) if n}
+        check.problems("calendario desde el bloque en vivo = reconstruido", [] if before == after else
+                       [f"{len(set(before.items()) ^ set(after.items()))} bloques distintos"])
+
+        def stats():
+            return {(s.parking_id, s.day): (s.reservations, s.paid_revenue)
+                    for s in DailyParkingStats.query.all()}
+        incremental = stats()
+        rollups.rebuild()
+        check.problems("rollups incrementales = reconstruidos", [] if incremental == stats() else
+                       ["daily_parking_stats no coincide"])
+
+        # Una reserva pagada que vence sigue contando como pagada
+        client = app.test_client()
+        auth = {"Authorization": "Bearer " + create_access_token(identity="1", additional_claims={"role": "admin"})}
+        parking = Parking.query.first()
+        start = clock.now - timedelta(minutes=20)
+        capacity.reserve(parking, start, start + timedelta(minutes=40), clock.now)
+        res = Reservation(parking_id=parking.id, user_id=1, start_time=start, end_time=start + timedelta(minutes=40),
+                          status="reserved", created_at=clock.now, total_amount=Decimal("10.00"))
+        db.session.add(res)
+        db.session.execute(User.__table__.update().where(User.id == 1).values(balance=100))
+        db.session.commit()
+        rid, day = res.id, (parking.id, clock.now.date())
+        client.post(f"/api/payments/pay-reservation/{rid}",
+                    json={"method": "saldo"}, headers=auth)
+        revenue = stats()[day][1]
+        clock.advance(minutes=30)
+        scheduler.tick(clock.now, owner="B")
+        r = client.post(f"/api/payments/pay-reservation/{rid}", json={"method": "saldo"}, headers=auth)
+        db.session.expire_all()
+        res, balance = db.session.get(Reservation, rid), db.session.get(User, 1).balance
+        status = res.status
+        problems = []
+        if status != "completed" or not res.paid:
+            problems.append(f"estado {status}, paid={res.paid}")
+        if not revenue:
+            problems.append("paid_revenue no contó el pago")
+        if stats()[day][1] != revenue:
+            problems.append(f"paid_revenue {revenue} -> {stats()[day][1]}")
+        if balance != 90 or Payment.query.filter_by(reservation_id=rid).count() != 1:
+            problems.append(f"pagar de nuevo cobró otra vez (saldo {balance})")
+        check.problems(f"pagada y vencida -> {status} (paid), revenue {revenue}, segundo pago {r.status_code} sin cobrar",
+                       problems)
+
+        # Ráfaga: miles de reservas que terminan en el mismo minuto
+        end = clock.now + timedelta(minutes=30)
+        burst_start = clock.now
+
+        def same_end():
+            return burst_start - timedelta(minutes=rnd.randint(0, 90)), end
+        t0 = time.perf_counter()
+        create_reservations(args.burst, same_end, clock.now)
+        setup_s = time.perf_counter() - t0
+        clock.now = end + timedelta(seconds=30)
+        t0 = time.perf_counter()
+        done = scheduler.tick(clock.now, owner="B")
+        elapsed = time.perf_counter() - t0
+        print(f"\n  Ráfaga: {done} reservas completadas en {elapsed:.2f} s "
+              f"({done / elapsed:,.0f}/s, lotes de {config.EXPIRY_BATCH}; creación {setup_s:.1f} s)")
+        check.problems("ráfaga completa y available cuadra", live_problems(clock.now)
+                       + ([] if done == args.burst else [f"{done} != {args.burst}"]))
+
+    check.exit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Idempotency-Key en POST /api/reservations/ y /api/payments/pay-reservation/<rid>.
+
+Llena una base local con scripts/generate_dataset.py y verifica que:
+
+  - repetir la petición con la misma llave devuelve la misma respuesta sin
+    volver a reservar (available baja una sola vez) ni cobrar dos veces
+  - N hilos mandando la misma llave a la vez crean una sola reserva / pago
+  - la misma llave con otro cuerpo da 422
+  - si el handler falla (saldo insuficiente) la llave queda libre para reintentar
+  - si falla después del commit (un suscriptor de la señal) la repetición
+    recibe el mismo error y no reserva otra vez
+  - las llaves vencidas (IDEMPOTENCY_TTL_S) se vuelven a ejecutar y se purgan
+
+Uso (desde estacionaPE/backend):
+    python scripts/check_idempotency.py --threads 8
+"""
+import argparse
+import threading
+import time
+from datetime import datetime, timedelta
+
+import _env
+_env.setup("check_idempotency.db")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    from flask_jwt_extended import create_access_token
+    from app import create_app
+    from db import db
+    from models import IdempotencyKey, Parking, Payment, Reservation, User
+    import config
+    import generate_dataset
+    import idempotency
+    import signals
+
+    app = create_app()
+    generate_dataset.generate(app, users=50, parkings=20, reservations=100, seed=args.seed, drop=True)
+    with app.app_context():
+        token = create_access_token(identity="1", additional_claims={"role": "admin"})
+        db.session.execute(Parking.__table__.update().values(capacity=50, available=50))
+        db.session.commit()
+    client = app.test_client()
+    auth = {"Authorization": f"Bearer {token}"}
+
+    check = _env.Checks()
+
+    def available(pid):
+        with app.app_context():
+            return db.session.get(Parking, pid).available
+
+    def count(model, **filters):
+        with app.app_context():
+            return model.query.filter_by(**filters).count()
+
+    def reservation_body(parking_id, user_id, hour):
+        # Ventana en curso (hora Lima = UTC-5 al guardar): ocupa el espacio en vivo
+        start = datetime.utcnow() + timedelta(hours=hour, minutes=-10)
+        return {"parking_id": parking_id, "user_id": user_id, "total_amount": "12.00",
+                "start_time": start.isoformat(), "end_time": (start + timedelta(minutes=50)).isoformat()}
+
+    def post(path, body, key, c=client):
+        return c.post(path, json=body, headers={**auth, "Idempotency-Key": key})
+
+    print("\nReservas:")
+    before, n_before = available(1), count(Reservation, parking_id=1)
+    body = reservation_body(1, 2, 0)
+    r1 = post("/api/reservations/", body, "res-1")
+    r2 = post("/api/reservations/", body, "res-1")
+    check(f"repetida -> misma respuesta ({r1.status_code}, {r2.status_code}, "
+          f"Idempotent-Replayed={r2.headers.get('Idempotent-Replayed')})",
+          r1.status_code == 201 and r2.get_data() == r1.get_data() and r2.headers.get("Idempotent-Replayed") == "true")
+    check(f"available bajó una sola vez ({before} -> {available(1)})", available(1) == before - 1)
+    check("una sola reserva creada", count(Reservation, parking_id=1) == n_before + 1)
+
+    r3 = post("/api/reservations/", reservation_body(1, 3, 2), "res-1")
+    check(f"misma llave, otro cuerpo -> {r3.status_code}", r3.status_code == 422)
+
+    # Concurrentes: todas esperan a la primera y devuelven lo mismo
+    before, n_before = available(2), count(Reservation, parking_id=2)
+    body = reservation_body(2, 4, 0)
+    results, barrier = [], threading.Barrier(args.threads)
+
+    def worker():
+        c = app.test_client()
+        barrier.wait()
+        results.append(post("/api/reservations/", body, "res-concurrente", c))
+    hilos = [threading.Thread(target=worker) for _ in range(args.threads)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    codes = sorted(r.status_code for r in results)
+    bodies = {r.get_data() for r in results if r.status_code == 201}
+    check(f"{args.threads} hilos con la misma llave: {codes}, {len(bodies)} cuerpo(s) distinto(s)",
+          set(codes) <= {201, 409} and len(bodies) == 1)
+    check(f"una sola reserva y un solo espacio ({before} -> {available(2)})",
+          count(Reservation, parking_id=2) == n_before + 1 and available(2) == before - 1)
+
+    # Falla después del commit: un suscriptor de parking_changed revienta
+    def explota(sender, **kwargs):
+        raise RuntimeError("suscriptor roto")
+    signals.parking_changed.connect(explota)
+    before, n_before = available(5), count(Reservation, parking_id=5)
+    body = reservation_body(5, 8, 0)
+    try:
+        r1 = post("/api/reservations/", body, "res-post-commit")
+    except RuntimeError:
+        r1 = None
+    signals.parking_changed.disconnect(explota)
+    r2 = post("/api/reservations/", body, "res-post-commit")
+    check(f"falla tras el commit -> repetición {r2.status_code} "
+          f"(Idempotent-Replayed={r2.headers.get('Idempotent-Replayed')}), available {before} -> {available(5)}",
+          r2.headers.get("Idempotent-Replayed") == "true" and available(5) == before - 1
+          and count(Reservation, parking_id=5) == n_before + 1)
+
+    print("\nPagos:")
+    with app.app_context():
+        db.session.execute(User.__table__.update().where(User.id == 5).values(balance=5))
+        db.session.commit()
+    rid = post("/api/reservations/", reservation_body(3, 5, 3), "res-pago").get_json()["id"]
+    pay = {"method": "saldo"}
+    r = post(f"/api/payments/pay-reservation/{rid}", pay, "pago-1")
+    check(f"saldo insuficiente -> {r.status_code}, la llave se libera",
+          r.status_code == 400 and count(IdempotencyKey, key=f"1:payments.pay_reservation:pago-1") == 0)
+    with app.app_context():
+        db.session.execute(User.__table__.update().where(User.id == 5).values(balance=100))
+        db.session.commit()
+
+    results.clear()
+    barrier = threading.Barrier(args.threads)
+
+    def pay_worker():
+        c = app.test_client()
+        barrier.wait()
+        results.append(post(f"/api/payments/pay-reservation/{rid}", pay, "pago-1", c))
+    hilos = [threading.Thread(target=pay_worker) for _ in range(args.threads)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    with app.app_context():
+        balance = db.session.get(User, 5).balance
+    check(f"{args.threads} reintentos del pago: {sorted(r.status_code for r in results)}, "
+          f"saldo 100 -> {balance}", balance == 100 - 12 and count(Payment, reservation_id=rid) == 1)
+
+    print("\nVencimiento:")
+    with app.app_context():
+        db.session.execute(IdempotencyKey.__table__.update().where(IdempotencyKey.key.like("%res-1"))
+                           .values(created_at=datetime.utcnow() - timedelta(seconds=config.IDEMPOTENCY_TTL_S + 1)))
+        db.session.commit()
+    r = post("/api/reservations/", reservation_body(1, 6, 4), "res-1")
+    check(f"llave vencida se vuelve a ejecutar ({r.status_code}, replay={r.headers.get('Idempotent-Replayed')})",
+          r.status_code == 201 and "Idempotent-Replayed" not in r.headers)
+    with app.app_context():
+        db.session.execute(IdempotencyKey.__table__.update()
+                           .values(created_at=datetime.utcnow() - timedelta(seconds=config.IDEMPOTENCY_TTL_S + 1)))
+        db.session.commit()
+    idempotency._last_purge = time.monotonic() - config.IDEMPOTENCY_PURGE_S
+    post("/api/reservations/", reservation_body(4, 7, 0), "res-nueva")
+    check(f"purga de vencidas (quedan {count(IdempotencyKey)})", count(IdempotencyKey) == 1)
+
+    check.exit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Borrar una cochera que ya tuvo reservas (DELETE /api/parkings/<id>).
+
+Las reservas dejan filas derivadas que apuntan a la cochera aunque se
+cancelen o se borren: bloques del calendario (parking_capacity_buckets, ver
+capacity.py) en 0 y rollups diarios (daily_parking_stats, ver rollups.py).
+Con las claves foráneas activas (SQLite con PRAGMA foreign_keys=ON, o la
+base de DATABASE_URL) verifica que:
+
+  - crear la cochera, reservarla, cancelar y borrar la reserva deja filas derivadas
+  - aun así DELETE de la cochera responde 200 y no queda nada que la referencie
+
+Uso (desde estacionaPE/backend):
+    python scripts/check_parking_delete.py
+"""
+import argparse
+from datetime import datetime, timedelta
+
+import _env
+_env.setup("check_parking_delete.db")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    from flask_jwt_extended import create_access_token
+    from sqlalchemy import event
+    from app import create_app
+    from db import db
+    from models import CapacityBucket, DailyParkingStats, Parking, ParkingSearchTerm
+    import generate_dataset
+
+    app = create_app()
+    generate_dataset.generate(app, users=10, parkings=5, reservations=20, seed=args.seed, drop=True)
+    with app.app_context():
+        token = create_access_token(identity="1", additional_claims={"role": "admin"})
+        if db.engine.dialect.name == "sqlite":
+            # SQLite no revisa las FK salvo que se pida en cada conexión
+            event.listen(db.engine, "connect", lambda conn, _: conn.execute("PRAGMA foreign_keys=ON"))
+            db.engine.dispose()
+    client = app.test_client()
+    auth = {"Authorization": f"Bearer {token}"}
+
+    check = _env.Checks()
+
+    def derived(pid):
+        with app.app_context():
+            return {model.__tablename__: model.query.filter_by(parking_id=pid).count()
+                    for model in (ParkingSearchTerm, CapacityBucket, DailyParkingStats)}
+
+    print("\nCochera con una reserva cancelada y borrada:")
+    r = client.post("/api/parkings/", json={
+        "name": "Cochera de prueba", "address": "Av. Arequipa 123", "district": "Lince",
+        "lat": -12.08, "lng": -77.03, "price_per_hour": "5.00", "capacity": 10, "available": 10,
+    }, headers=auth)
+    check(f"crear cochera -> {r.status_code}", r.status_code == 201)
+    pid = r.get_json()["id"]
+
+    start = datetime.utcnow() + timedelta(days=1)
+    r = client.post("/api/reservations/", json={
+        "parking_id": pid, "user_id": 2, "total_amount": "10.00",
+        "start_time": start.isoformat(), "end_time": (start + timedelta(hours=2)).isoformat(),
+    }, headers=auth)
+    check(f"reservar -> {r.status_code}", r.status_code == 201)
+    rid = r.get_json()["id"]
+
+    r = client.put(f"/api/reservations/{rid}", json={"status": "cancelled"}, headers=auth)
+    check(f"cancelar -> {r.status_code}", r.status_code == 200)
+    r = client.delete(f"/api/reservations/{rid}", headers=auth)
+    check(f"borrar la reserva -> {r.status_code}", r.status_code == 200)
+
+    before = derived(pid)
+    check(f"quedan filas derivadas {before}",
+          before[CapacityBucket.__tablename__] and before[DailyParkingStats.__tablename__])
+
+    r = client.delete(f"/api/parkings/{pid}", headers=auth)
+    check(f"borrar la cochera -> {r.status_code}", r.status_code == 200, r.get_data(as_text=True)[:200])
+    after = derived(pid)
+    check(f"nada apunta a la cochera {after}", not any(after.values()))
+    with app.app_context():
+        check("la cochera ya no existe", db.session.get(Parking, pid) is None)
+
+    check.exit()
+
+
+if __name__ == "__main__":
+    main()
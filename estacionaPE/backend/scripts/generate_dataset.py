@@ -0,0 +1,317 @@
+"""
+Generador de datos sintéticos a escala de producción.
+
+Crea usuarios, cocheras repartidas por los distritos de Lima, reservas con
+horarios realistas (picos de mañana y tarde, menos movimiento el fin de
+semana), sus pagos y promociones. Todo sale de una semilla, así que dos
+corridas con los mismos parámetros producen exactamente los mismos datos.
+
+Las filas se escriben con INSERT por lotes (executemany de Core), sin pasar
+por el ORM; al final se reconstruyen los derivados que normalmente
+mantienen los listeners: trigramas del buscador, rollups de reportes y
+calendario de capacidad.
+
+Uso (desde estacionaPE/backend):
+    python scripts/generate_dataset.py --users 100000 --parkings 20000 --reservations 2000000
+    DATABASE_URL=mysql+pymysql://... python scripts/generate_dataset.py --drop
+Usa DATABASE_URL si está definida; si no, un SQLite temporal (muestra la ruta).
+"""
+import argparse
+import os
+import random
+import time
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+
+import _env
+_env.setup("dataset.db")
+
+from werkzeug.security import generate_password_hash
+from db import db
+from models import User, Parking, ParkingSearchTerm, Reservation, Payment, Promotion
+from geo import cell_for
+import capacity
+import rollups
+import text_search
+
+# (distrito, lat, lng, peso, recargo de tarifa)
+DISTRICTS = [
+    ("Miraflores", -12.1211, -77.0297, 14, 1.5),
+    ("San Isidro", -12.0977, -77.0365, 13, 1.6),
+    ("Santiago de Surco", -12.1459, -76.9910, 11, 1.2),
+    ("San Borja", -12.1080, -77.0020, 8, 1.2),
+    ("Barranco", -12.1497, -77.0210, 6, 1.3),
+    ("Lince", -12.0847, -77.0352, 6, 1.0),
+    ("Jesús María", -12.0757, -77.0491, 6, 1.0),
+    ("Magdalena del Mar", -12.0907, -77.0717, 5, 1.0),
+    ("Pueblo Libre", -12.0740, -77.0630, 5, 0.9),
+    ("La Molina", -12.0820, -76.9270, 6, 1.1),
+    ("Cercado de Lima", -12.0464, -77.0428, 10, 0.9),
+    ("San Miguel", -12.0772, -77.0897, 5, 0.9),
+    ("Surquillo", -12.1140, -77.0160, 5, 0.9),
+    ("La Victoria", -12.0650, -77.0300, 6, 0.8),
+    ("Chorrillos", -12.1700, -77.0150, 4, 0.8),
+]
+STREETS = ["Av. Larco", "Av. Arequipa", "Av. Javier Prado", "Av. Benavides", "Av. Pardo", "Av. Angamos",
+           "Av. Brasil", "Av. La Marina", "Av. Primavera", "Av. Petit Thouars", "Jr. de la Unión",
+           "Calle Schell", "Av. Salaverry", "Av. Aviación", "Av. Caminos del Inca", "Av. Conquistadores"]
+FIRST_NAMES = ["Luis", "María", "José", "Rosa", "Carlos", "Ana", "Jorge", "Lucía", "Miguel", "Carmen",
+               "Diego", "Valeria", "Renzo", "Camila", "Piero", "Fernanda", "Andrés", "Daniela"]
+LAST_NAMES = ["Quispe", "Flores", "Rodríguez", "Huamán", "García", "Chávez", "Rojas", "Mendoza",
+              "Torres", "Vargas", "Castillo", "Ramírez", "Paredes", "Salazar", "Gutiérrez"]
+HOURS = ["24 horas", "06:00 - 23:00", "07:00 - 22:00", "08:00 - 20:00"]
+PAYMENT_METHODS = [("qr", 35), ("yape", 40), ("saldo", 15), ("card", 10)]
+ROLES = [("client", 90), ("owner", 9), ("admin", 1)]
+
+# Demanda relativa por hora del día (0-23): picos de 8-10 y 18-20
+HOUR_WEIGHTS = [1, 1, 1, 1, 1, 2, 4, 8, 12, 11, 8, 7, 8, 7, 6, 6, 7, 9, 12, 11, 8, 5, 3, 2]
+WEEKDAY_WEIGHTS = [10, 10, 10, 10, 11, 7, 5]           # lunes .. domingo
+DURATION_HOURS = [(1, 30), (2, 30), (3, 15), (4, 10), (6, 8), (8, 5), (12, 2)]
+
+
+def _weighted(rnd, pairs):
+    values, weights = zip(*pairs)
+    return rnd.choices(values, weights=weights)[0]
+
+
+class Generator:
+
+    def __init__(self, seed, days, now):
+        self.rnd = random.Random(seed)
+        self.days = days
+        self.now = now.replace(second=0, microsecond=0)
+        self._district_weights = [d[3] for d in DISTRICTS]
+        self._day_weights = [WEEKDAY_WEIGHTS[(self.now - timedelta(days=d)).weekday()] for d in range(days)]
+
+    # --- Usuarios ---
+
+    def users(self, start_id, count, password_hash):
+        rnd = self.rnd
+        for i in range(start_id, start_id + count):
+            first, last = rnd.choice(FIRST_NAMES), rnd.choice(LAST_NAMES)
+            yield {
+                "id": i, "name": f"{first} {last}", "email": f"user{i}@estaciona.pe",
+                "password": password_hash, "role": _weighted(rnd, ROLES),
+                "balance": Decimal(rnd.randint(0, 300)), "dni": f"{rnd.randint(10000000, 79999999)}",
+                "phone": f"9{rnd.randint(10000000, 99999999)}",
+                "plate": f"{''.join(rnd.choices('ABCDEFGHJKLMNPRSTUVWXYZ', k=3))}-{rnd.randint(100, 999)}",
+                "gender": rnd.choice(("M", "F")),
+                "created_at": self.now - timedelta(days=rnd.randint(0, self.days), minutes=rnd.randint(0, 1439)),
+            }
+
+    # --- Cocheras ---
+
+    def parkings(self, start_id, count, owner_ids):
+        rnd = self.rnd
+        for i in range(start_id, start_id + count):
+            name, lat0, lng0, _, premium = rnd.choices(DISTRICTS, weights=self._district_weights)[0]
+            lat, lng = rnd.gauss(lat0, 0.008), rnd.gauss(lng0, 0.008)
+            spaces = max(5, min(400, int(rnd.lognormvariate(3.2, 0.6))))
+            street = rnd.choice(STREETS)
+            yield {
+                "id": i, "owner_id": rnd.choice(owner_ids) if owner_ids else None,
+                "name": f"Cochera {street.split(' ', 1)[1]} {i}", "address": f"{street} {rnd.randint(100, 3999)}",
+                "district": name, "lat": round(lat, 6), "lng": round(lng, 6), "geo_cell": cell_for(lat, lng),
+                "price_per_hour": (Decimal(rnd.randint(30, 90)) / 10 * Decimal(str(premium))).quantize(Decimal("0.10")),
+                "capacity": spaces, "available": rnd.randint(0, spaces), "hours": rnd.choice(HOURS),
+                "description": None, "image_url": None,
+                "created_at": self.now - timedelta(days=self.days + rnd.randint(0, 365)),
+            }
+
+    # --- Reservas y pagos ---
+
+    def _created_at(self):
+        rnd = self.rnd
+        day = rnd.choices(range(self.days), weights=self._day_weights)[0]
+        hour = rnd.choices(range(24), weights=HOUR_WEIGHTS)[0]
+        return (self.now - timedelta(days=day)).replace(hour=hour, minute=rnd.randrange(0, 60, 5))
+
+    def reservations(self, start_id, count, parkings, user_ids, payment_start_id):
+        """Genera (reserva, pago o None). `parkings` es una lista de (id, precio)."""
+        rnd = self.rnd
+        payment_id = payment_start_id
+        # Algunas cocheras son mucho más populares que otras (Zipf aproximado)
+        weights = [1.0 / (k + 1) ** 0.8 for k in range(len(parkings))]
+        cum = list(_accumulate(weights))
+        for i in range(start_id, start_id + count):
+            parking_id, price = parkings[_bisect_pick(rnd, cum)]
+            created = self._created_at()
+            # La mayoría reserva con poca anticipación
+            start = created + timedelta(minutes=15 * int(rnd.expovariate(1 / 8)))
+            hours = _weighted(rnd, DURATION_HOURS)
+            end = start + timedelta(hours=hours)
+            total = (price * hours).quantize(Decimal("0.01"))
+
+            if end <= self.now:
+                status = _weighted(rnd, [("completed", 70), ("paid", 15), ("cancelled", 15)])
+            elif start <= self.now:
+                status = _weighted(rnd, [("paid", 80), ("reserved", 20)])
+            else:
+                status = _weighted(rnd, [("reserved", 55), ("paid", 35), ("pending", 10)])
+
+            payment = None
+            if status in ("paid", "completed") or rnd.random() < 0.02:
+                paid_ok = status in ("paid", "completed")
+                payment = {
+                    "id": payment_id, "reservation_id": i, "amount": total,
+                    "method": _weighted(rnd, PAYMENT_METHODS),
+                    "status": "paid" if paid_ok else "failed",
+                    "provider_ref": f"SYN-{payment_id}",
+                    "created_at": min(start, self.now) if paid_ok else created,
+                }
+                payment_id += 1
+
+            yield {
+                "id": i, "parking_id": parking_id, "user_id": rnd.choice(user_ids),
+                "start_time": start, "end_time": end, "status": status,
+                "total_amount": total, "paid": payment is not None and payment["status"] == "paid",
+                "created_at": created,
+            }, payment
+
+    # --- Promociones ---
+
+    def promotions(self, parking_ids, ratio):
+        rnd = self.rnd
+        for pid in parking_ids:
+            if rnd.random() >= ratio:
+                continue
+            start = self.now - timedelta(days=rnd.randint(0, 30))
+            percent = rnd.random() < 0.7
+            yield {
+                "parking_id": pid,
+                "title": f"{rnd.choice((10, 15, 20, 25, 30))}% de descuento" if percent else "Primera hora gratis",
+                "description": None,
+                "discount_percent": Decimal(rnd.choice((10, 15, 20, 25, 30))) if percent else None,
+                "flat_amount": None if percent else Decimal(rnd.randint(3, 8)),
+                "start_date": start, "end_date": start + timedelta(days=rnd.choice((7, 14, 30, 60, 90))),
+                "is_active": rnd.random() < 0.9,
+            }
+
+
+def _accumulate(values):
+    total = 0.0
+    for v in values:
+        total += v
+        yield total
+
+
+def _bisect_pick(rnd, cum):
+    return bisect_left(cum, rnd.random() * cum[-1])
+
+
+# ============================================================
+# CARGA
+# ============================================================
+
+def _insert_batches(table, rows, batch, label):
+    """Inserta un iterable de dicts por lotes, un commit por lote"""
+    total, chunk, t0 = 0, [], time.perf_counter()
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= batch:
+            db.session.execute(table.insert(), chunk)
+            db.session.commit()
+            total += len(chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(table.insert(), chunk)
+        db.session.commit()
+        total += len(chunk)
+    elapsed = time.perf_counter() - t0
+    print(f"  {label:<14} {total:>10} filas  {elapsed:7.1f} s  ({total / max(elapsed, 1e-9):,.0f}/s)")
+    return total
+
+
+def generate(app, users=10000, parkings=2000, reservations=200000, promotions_ratio=0.15,
+             days=90, seed=42, batch=10000, drop=False, now=None):
+    """Llena la base de `app` con un dataset sintético. Devuelve los conteos."""
+    now = now or datetime.utcnow() - timedelta(hours=5)      # Hora Lima, como el resto de la API
+    gen = Generator(seed, days, now)
+    counts = {}
+    with app.app_context():
+        if drop:
+            db.drop_all()
+        db.create_all()
+
+        base = {m: (db.session.query(db.func.max(m.id)).scalar() or 0)
+                for m in (User, Parking, Reservation, Payment)}
+        print("Generando:")
+
+        # Todos comparten la misma contraseña de prueba: se hashea una sola vez
+        password_hash = generate_password_hash("estaciona123")
+        user_rows = list(gen.users(base[User] + 1, users, password_hash))
+        counts["users"] = _insert_batches(User.__table__, user_rows, batch, "usuarios")
+        user_ids = [u["id"] for u in user_rows]
+        owner_ids = [u["id"] for u in user_rows if u["role"] == "owner"]
+        del user_rows
+
+        parking_rows = list(gen.parkings(base[Parking] + 1, parkings, owner_ids))
+        counts["parkings"] = _insert_batches(Parking.__table__, parking_rows, batch, "cocheras")
+        counts["search_terms"] = _insert_batches(
+            ParkingSearchTerm.__table__,
+            ({"parking_id": p["id"], "term": t}
+             for p in parking_rows for t in text_search.parking_terms(SimpleNamespace(**p))),
+            batch, "trigramas")
+        parking_prices = [(p["id"], p["price_per_hour"]) for p in parking_rows]
+        gen.rnd.shuffle(parking_prices)          # la popularidad no depende del id
+        del parking_rows
+
+        counts["promotions"] = _insert_batches(
+            Promotion.__table__, gen.promotions([p for p, _ in parking_prices], promotions_ratio),
+            batch, "promociones")
+
+        # Reservas y pagos salen juntos: cada lote escribe sus reservas y luego sus pagos
+        t0 = time.perf_counter()
+        counts["reservations"] = counts["payments"] = 0
+        rows = gen.reservations(base[Reservation] + 1, reservations, parking_prices, user_ids, base[Payment] + 1)
+        while True:
+            chunk = [pair for _, pair in zip(range(batch), rows)]
+            if not chunk:
+                break
+            db.session.execute(Reservation.__table__.insert(), [res for res, _ in chunk])
+            pays = [pay for _, pay in chunk if pay]
+            if pays:
+                db.session.execute(Payment.__table__.insert(), pays)
+            db.session.commit()
+            counts["reservations"] += len(chunk)
+            counts["payments"] += len(pays)
+        elapsed = time.perf_counter() - t0
+        total = counts["reservations"] + counts["payments"]
+        print(f"  {'reservas+pagos':<14} {total:>10} filas  {elapsed:7.1f} s  ({total / max(elapsed, 1e-9):,.0f}/s)")
+
+        print("Derivados:")
+        t0 = time.perf_counter()
+        counts["daily_stats"] = rollups.rebuild()
+        print(f"  {'rollups':<14} {counts['daily_stats']:>10} filas  {time.perf_counter() - t0:7.1f} s")
+        t0 = time.perf_counter()
+        counts["capacity_buckets"] = capacity.rebuild(now, batch)
+        print(f"  {'calendario':<14} {counts['capacity_buckets']:>10} filas  {time.perf_counter() - t0:7.1f} s")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--parkings", type=int, default=2000)
+    parser.add_argument("--reservations", type=int, default=200000)
+    parser.add_argument("--promotions-ratio", type=float, default=0.15, help="Fracción de cocheras con promo")
+    parser.add_argument("--days", type=int, default=90, help="Días de historial de reservas")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch", type=int, default=10000, help="Filas por INSERT")
+    parser.add_argument("--drop", action="store_true", help="Borrar y recrear las tablas antes de cargar")
+    args = parser.parse_args()
+
+    from app import create_app
+    app = create_app()
+    print(f"Base: {os.environ['DATABASE_URL']}")
+    t0 = time.perf_counter()
+    generate(app, users=args.users, parkings=args.parkings, reservations=args.reservations,
+             promotions_ratio=args.promotions_ratio, days=args.days, seed=args.seed,
+             batch=args.batch, drop=args.drop)
+    print(f"Listo en {time.perf_counter() - t0:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
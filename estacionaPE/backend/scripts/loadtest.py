@@ -0,0 +1,298 @@
+"""
+Prueba de carga de los caminos calientes de la API.
+
+Levanta create_app() contra una base local (DATABASE_URL o un SQLite
+temporal), la llena con scripts/generate_dataset.py y corre escenarios
+concurrentes contra los blueprints reales:
+
+    map        viewport del mapa: /parkings/nearby?bbox + /promotions/active
+    search     buscador mientras se escribe (un GET por letra)
+    reserve    crear reserva y pagarla (QR)
+    gate       ráfagas de adjust-available (+1/-1) sobre pocas cocheras
+    reports    tablero de reportes
+
+Por escenario reporta p50/p95/p99, RPS y errores, y guarda todo en JSON
+para comparar entre commits.
+
+Uso (desde estacionaPE/backend):
+    python scripts/loadtest.py --threads 8 --duration 10 --out bench.json
+    python scripts/loadtest.py --scenarios map search --compare bench_anterior.json
+    python scripts/loadtest.py --url http://localhost:5000 --token <JWT>   # servidor ya levantado
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+import _env
+_env.setup("loadtest.db")
+
+# Centro de Lima y tamaño aproximado de un viewport de celular
+LIMA_LAT, LIMA_LNG = -12.08, -77.03
+VIEWPORT_DEG = 0.02
+SEARCH_WORDS = ["miraflores", "san isidro", "larco", "arequipa", "surco", "barranco", "javier prado"]
+REPORTS = ["/api/reports/summary", "/api/reports/revenue-by-parking",
+           "/api/reports/reservations-by-day", "/api/reports/best-parkings"]
+
+
+# ============================================================
+# CLIENTES (en proceso o HTTP)
+# ============================================================
+
+class InProcessClient:
+    """Flask test client: mide el costo de la app sin la red"""
+
+    def __init__(self, app, headers):
+        self._client = app.test_client()
+        self._headers = headers
+
+    def request(self, method, path, body=None):
+        r = self._client.open(path, method=method, json=body, headers=self._headers)
+        return r.status_code, r.get_json(silent=True)
+
+
+class HttpClient:
+    """Contra un servidor real (gunicorn), una sesión keep-alive por hilo"""
+
+    def __init__(self, base_url, headers):
+        import requests
+        self._session = requests.Session()
+        self._session.headers.update(headers)
+        self._base = base_url.rstrip("/")
+
+    def request(self, method, path, body=None):
+        r = self._session.request(method, self._base + path, json=body, timeout=30)
+        try:
+            return r.status_code, r.json()
+        except ValueError:
+            return r.status_code, None
+
+
+# ============================================================
+# ESCENARIOS
+# ============================================================
+# Cada escenario hace una "iteración" y llama a `record(status, segundos)`
+# por cada petición.
+
+def _timed(client, record, method, path, body=None):
+    t0 = time.perf_counter()
+    status, data = client.request(method, path, body)
+    record(status, time.perf_counter() - t0)
+    return status, data
+
+
+def scenario_map(client, ctx, rnd, record):
+    lat = LIMA_LAT + rnd.uniform(-0.08, 0.08)
+    lng = LIMA_LNG + rnd.uniform(-0.06, 0.06)
+    bbox = f"{lng - VIEWPORT_DEG:.4f},{lat - VIEWPORT_DEG:.4f},{lng + VIEWPORT_DEG:.4f},{lat + VIEWPORT_DEG:.4f}"
+    _timed(client, record, "GET", f"/api/parkings/nearby?bbox={bbox}")
+    _timed(client, record, "GET", f"/api/promotions/active?bbox={bbox}")
+
+
+def scenario_search(client, ctx, rnd, record):
+    word = rnd.choice(SEARCH_WORDS)
+    for n in range(2, len(word) + 1):
+        _timed(client, record, "GET", f"/api/parkings/search?q={word[:n]}&limit=20")
+
+
+def scenario_reserve(client, ctx, rnd, record):
+    start = datetime(2030, 1, 1) + timedelta(minutes=15 * rnd.randrange(0, 96 * 365))
+    status, data = _timed(client, record, "POST", "/api/reservations/", {
+        "parking_id": rnd.choice(ctx["parking_ids"]),
+        "user_id": rnd.choice(ctx["user_ids"]),
+        "start_time": start.isoformat(),
+        "end_time": (start + timedelta(hours=rnd.randint(1, 3))).isoformat(),
+        "total_amount": "10.00",
+    })
+    if status == 201 and data:
+        _timed(client, record, "POST", f"/api/payments/pay-reservation/{data['id']}", {"method": "qr"})
+
+
+def scenario_gate(client, ctx, rnd, record):
+    pid = rnd.choice(ctx["parking_ids"][:5])
+    for _ in range(rnd.randint(3, 8)):
+        _timed(client, record, "POST", f"/api/parkings/{pid}/adjust-available",
+               {"delta": rnd.choice((-1, 1))})
+
+
+def scenario_reports(client, ctx, rnd, record):
+    for path in REPORTS:
+        _timed(client, record, "GET", path)
+
+
+SCENARIOS = {
+    "map": scenario_map,
+    "search": scenario_search,
+    "reserve": scenario_reserve,
+    "gate": scenario_gate,
+    "reports": scenario_reports,
+}
+
+
+# ============================================================
+# DATOS DE PRUEBA
+# ============================================================
+
+def seed_database(app, parkings, users, reservations, seed):
+    import generate_dataset
+    generate_dataset.generate(app, users=users, parkings=parkings, reservations=reservations,
+                              seed=seed, drop=True)
+    return {"parking_ids": list(range(1, parkings + 1)), "user_ids": list(range(1, users + 1))}
+
+
+def remote_context(client):
+    _, parkings = client.request("GET", "/api/parkings/?limit=500")
+    _, users = client.request("GET", "/api/users/?limit=500")
+    return {"parking_ids": [p["id"] for p in parkings or []] or [1],
+            "user_ids": [u["id"] for u in users or []] or [1]}
+
+
+# ============================================================
+# EJECUCIÓN Y REPORTE
+# ============================================================
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+def run_scenario(name, make_client, ctx, threads, duration, seed):
+    fn = SCENARIOS[name]
+    latencies, statuses = [], Counter()
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads + 1)
+    deadline = [0.0]
+
+    def worker(n):
+        client = make_client()
+        rnd = random.Random(f"{seed}-{name}-{n}")
+        local_lat, local_status = [], Counter()
+
+        def record(status, seconds):
+            local_lat.append(seconds)
+            local_status[status] += 1
+
+        barrier.wait()
+        while time.perf_counter() < deadline[0]:
+            fn(client, ctx, rnd, record)
+        with lock:
+            latencies.extend(local_lat)
+            statuses.update(local_status)
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for t in pool:
+        t.start()
+    deadline[0] = time.perf_counter() + duration
+    t0 = time.perf_counter()
+    barrier.wait()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    latencies.sort()
+    ms = [x * 1000 for x in latencies]
+    errors = sum(n for status, n in statuses.items() if status >= 400)
+    return {
+        "requests": len(ms),
+        "errors": errors,
+        "rps": round(len(ms) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(ms, 50), 2),
+        "p95_ms": round(percentile(ms, 95), 2),
+        "p99_ms": round(percentile(ms, 99), 2),
+        "mean_ms": round(sum(ms) / len(ms), 2) if ms else 0.0,
+        "max_ms": round(ms[-1], 2) if ms else 0.0,
+        "status": {str(k): v for k, v in sorted(statuses.items())},
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, previous=None):
+    print(f"\n{'escenario':<10} {'req':>7} {'err':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for name, r in results.items():
+        line = (f"{name:<10} {r['requests']:>7} {r['errors']:>5} {r['rps']:>8.1f} "
+                f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f}")
+        old = (previous or {}).get(name)
+        if old and old["rps"]:
+            line += (f"   rps {100 * (r['rps'] / old['rps'] - 1):+.0f}%  "
+                     f"p95 {r['p95_ms'] - old['p95_ms']:+.2f} ms")
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0, help="Segundos por escenario")
+    parser.add_argument("--parkings", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--reservations", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--url", help="Probar un servidor ya levantado en vez de la app en proceso")
+    parser.add_argument("--token", default=os.getenv("LOADTEST_TOKEN"), help="JWT para --url")
+    parser.add_argument("--out", help="Guardar resultados en JSON")
+    parser.add_argument("--compare", help="JSON de una corrida anterior para comparar")
+    args = parser.parse_args()
+
+    if args.url:
+        headers = {"Authorization": f"Bearer {args.token}"} if args.token else {}
+        make_client = lambda: HttpClient(args.url, headers)
+        ctx = remote_context(make_client())
+        target = args.url
+    else:
+        from flask_jwt_extended import create_access_token
+        from app import create_app
+        app = create_app()
+        ctx = seed_database(app, args.parkings, args.users, args.reservations, args.seed)
+        with app.app_context():
+            token = create_access_token(identity="1", additional_claims={"role": "admin"})
+        headers = {"Authorization": f"Bearer {token}"}
+        make_client = lambda: InProcessClient(app, headers)
+        target = os.environ["DATABASE_URL"].split("://")[0]
+
+    results = {}
+    for name in args.scenarios:
+        print(f"Corriendo {name} ({args.threads} hilos, {args.duration:g} s)...")
+        results[name] = run_scenario(name, make_client, ctx, args.threads, args.duration, args.seed)
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)["scenarios"]
+    print_results(results, previous)
+
+    if args.out:
+        report = {
+            "meta": {
+                "commit": git_commit(),
+                "date": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+                "target": target,
+                "threads": args.threads,
+                "duration_s": args.duration,
+                "parkings": args.parkings,
+                "users": args.users,
+                "reservations": args.reservations,
+                "seed": args.seed,
+            },
+            "scenarios": results,
+        }
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResultados guardados en {args.out}")
+
+
+if __name__ == "__main__":
+    main()
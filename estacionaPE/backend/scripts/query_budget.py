@@ -0,0 +1,127 @@
+"""
+Revisa los presupuestos de consultas SQL (query_profiler.BUDGETS) y busca
+N+1 recorriendo los endpoints principales sobre un SQLite temporal.
+
+Uso (desde estacionaPE/backend):
+    python scripts/query_budget.py            # resumen por endpoint
+    python scripts/query_budget.py --verbose  # además, cada sentencia
+Termina con código 1 si algún endpoint se pasa de su presupuesto o repite
+la misma consulta (N+1), así se puede correr en CI.
+"""
+import argparse
+import sys
+from datetime import datetime, timedelta
+
+import _env
+_env.setup("query_budget.db", temp_db=True)
+
+from flask_jwt_extended import create_access_token
+from app import create_app
+from db import db
+from models import User, Parking, Promotion
+from geo import cell_for
+import capacity
+import query_profiler
+
+
+def seed(app, parkings=30):
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id=1, name="Prueba", email="prueba@estaciona.pe", role="admin", balance=1000))
+        for i in range(parkings):
+            lat, lng = -12.12 + i * 0.001, -77.03 + i * 0.001
+            db.session.add(Parking(
+                name=f"Cochera Miraflores {i}", address=f"Av. Larco {100 + i}", district="Miraflores",
+                lat=lat, lng=lng, geo_cell=cell_for(lat, lng), price_per_hour=5 + i % 4,
+                capacity=20, available=20, owner_id=1
+            ))
+        db.session.flush()
+        now = datetime.utcnow()
+        for i in range(1, parkings + 1, 3):
+            db.session.add(Promotion(parking_id=i, title=f"Promo {i}", discount_percent=10,
+                                     start_date=now - timedelta(days=1), end_date=now + timedelta(days=30),
+                                     is_active=True))
+        db.session.commit()
+        # Como en un despliegue: entrypoint.sh arma el calendario antes de atender
+        capacity.rebuild(now - timedelta(hours=5))
+        return {"Authorization": "Bearer " + create_access_token(identity="1", additional_claims={"role": "admin"})}
+
+
+def scenario(client, headers):
+    """Pasos (etiqueta, función) en el orden en que los haría la app"""
+    start = (datetime.utcnow() + timedelta(days=1)).replace(microsecond=0)
+    bbox = "-77.04,-12.13,-77.0,-12.09"
+    state = {}
+
+    def crear_reserva():
+        r = client.post("/api/reservations/", headers=headers, json={
+            "parking_id": 1, "user_id": 1, "total_amount": "10.00",
+            "start_time": start.isoformat(), "end_time": (start + timedelta(hours=2)).isoformat()})
+        state["rid"] = r.get_json()["id"]
+        return r
+
+    def reserva_en_curso():
+        # Hora Lima = UTC-5 al guardar: empezó hace 10 minutos y ocupa el espacio en vivo
+        now = datetime.utcnow().replace(microsecond=0)
+        return client.post("/api/reservations/", headers=headers, json={
+            "parking_id": 2, "user_id": 1, "total_amount": "10.00",
+            "start_time": (now - timedelta(minutes=10)).isoformat(),
+            "end_time": (now + timedelta(hours=1)).isoformat()})
+
+    return [
+        ("GET /api/parkings/", lambda: client.get("/api/parkings/?limit=50", headers=headers)),
+        ("POST /api/parkings/", lambda: client.post("/api/parkings/", headers=headers, json={
+            "name": "Nueva", "address": "Jr. Prueba 1", "district": "Barranco", "lat": -12.14, "lng": -77.02,
+            "price_per_hour": "4.50", "capacity": 10, "available": 10, "owner_id": 1})),
+        ("GET /api/parkings/search", lambda: client.get("/api/parkings/search?q=miraf", headers=headers)),
+        ("GET /api/parkings/nearby", lambda: client.get("/api/parkings/nearby?lat=-12.11&lng=-77.02", headers=headers)),
+        ("POST /api/reservations/", crear_reserva),
+        ("POST /api/reservations/", reserva_en_curso),
+        ("GET /api/reservations/", lambda: client.get("/api/reservations/", headers=headers)),
+        ("GET /api/reservations/estimate-batch", lambda: client.get(
+            f"/api/reservations/estimate-batch?bbox={bbox}&start={start.isoformat()}"
+            f"&end={(start + timedelta(hours=3)).isoformat()}", headers=headers)),
+        ("POST /api/payments/pay-reservation/<int:rid>", lambda: client.post(
+            f"/api/payments/pay-reservation/{state['rid']}", headers=headers, json={"method": "saldo"})),
+        ("GET /api/promotions/active", lambda: client.get(f"/api/promotions/active?bbox={bbox}", headers=headers)),
+        ("GET /api/reports/summary", lambda: client.get("/api/reports/summary", headers=headers)),
+        ("GET /api/reports/revenue-by-parking", lambda: client.get("/api/reports/revenue-by-parking", headers=headers)),
+        ("GET /api/reports/reservations-by-day", lambda: client.get("/api/reports/reservations-by-day", headers=headers)),
+        ("GET /api/reports/best-parkings", lambda: client.get("/api/reports/best-parkings", headers=headers)),
+        ("DELETE /api/reservations/<int:rid>", lambda: client.delete(
+            f"/api/reservations/{state['rid']}", headers=headers)),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--verbose", action="store_true", help="Muestra cada sentencia SQL")
+    args = parser.parse_args()
+
+    app = create_app()
+    headers = seed(app)
+    client = app.test_client()
+
+    failed = 0
+    print(f"{'endpoint':<48} {'status':>6} {'consultas':>9} {'presup.':>7} {'ms SQL':>7}")
+    for key, call in scenario(client, headers):
+        with query_profiler.capture() as cap:
+            response = call()
+        problems = query_profiler.check(key, cap)
+        if response.status_code >= 400:
+            problems.append(f"respuesta {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        budget = query_profiler.BUDGETS.get(key, "-")
+        mark = "FALLA" if problems else "ok"
+        print(f"{key:<48} {response.status_code:>6} {cap.count:>9} {budget:>7} {cap.total_time * 1000:>7.2f}  {mark}")
+        for problem in problems:
+            print(f"    - {problem}")
+        if args.verbose or problems:
+            print("    " + cap.report().replace("\n", "\n    "))
+        failed += bool(problems)
+
+    print(f"\n{failed} endpoint(s) con problemas")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Prueba de estrés de slots.py: muchos hilos compitiendo por los espacios
+de pocas cocheras. Verifica que nunca se venda más que la capacidad y
+reporta el throughput por cochera.
+
+Uso (desde estacionaPE/backend):
+    python scripts/stress_slots.py --threads 16 --parkings 4 --capacity 200
+    python scripts/stress_slots.py --naive   # versión anterior (leer/escribir en Python)
+Usa DATABASE_URL si está definida; si no, un SQLite temporal.
+"""
+import argparse
+import sys
+import threading
+import time
+from collections import Counter
+
+import _env
+_env.setup("stress_slots.db")
+
+from app import create_app
+from db import db
+from models import Parking
+import slots
+
+
+def naive_take(parking_id):
+    """Lo que hacía ReservationsList.post antes: leer, restar y guardar"""
+    p = db.session.get(Parking, parking_id)
+    if p.available <= 0:
+        return False
+    p.available -= 1
+    return True
+
+
+def worker(app, parking_ids, take_fn, sold, lock, barrier):
+    with app.app_context():
+        barrier.wait()
+        pendientes = list(parking_ids)
+        while pendientes:
+            for pid in list(pendientes):
+                ok = slots.with_retry(lambda: take_fn(pid))
+                db.session.expire_all()
+                if ok:
+                    with lock:
+                        sold[pid] += 1
+                else:
+                    pendientes.remove(pid)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--parkings", type=int, default=4)
+    parser.add_argument("--capacity", type=int, default=200)
+    parser.add_argument("--naive", action="store_true")
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        for i in range(args.parkings):
+            db.session.add(Parking(name=f"Stress {i}", lat=-12.1, lng=-77.0, price_per_hour=5,
+                                   capacity=args.capacity, available=args.capacity))
+        db.session.commit()
+        parking_ids = [p.id for p in Parking.query.all()]
+
+    sold, lock = Counter(), threading.Lock()
+    barrier = threading.Barrier(args.threads)
+    take_fn = naive_take if args.naive else slots.take
+    hilos = [threading.Thread(target=worker, args=(app, parking_ids, take_fn, sold, lock, barrier))
+             for _ in range(args.threads)]
+
+    t0 = time.perf_counter()
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    elapsed = time.perf_counter() - t0
+
+    oversold = False
+    with app.app_context():
+        print(f"{'cochera':>8}{'vendidos':>10}{'capacidad':>11}{'available':>11}{'ops/s':>10}")
+        for pid in parking_ids:
+            available = db.session.get(Parking, pid).available
+            oversold |= sold[pid] > args.capacity or available < 0
+            print(f"{pid:>8}{sold[pid]:>10}{args.capacity:>11}{available:>11}{sold[pid] / elapsed:>10.0f}")
+    print(f"\n{args.threads} hilos, {elapsed:.2f}s en total")
+    print("SOBREVENTA DETECTADA" if oversold else "OK: sin sobreventa")
+    sys.exit(1 if oversold else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+import codecs
+import re
+from decimal import Decimal
+from json.encoder import encode_basestring_ascii
+from flask.json.provider import DefaultJSONProvider
+from marshmallow import fields
+from marshmallow.decorators import PRE_DUMP, POST_DUMP
+import config
+
+try:
+    import orjson
+except ImportError:         # Opcional: sin orjson se usa el json de la stdlib
+    orjson = None
+
+# ============================================================
+# SERIALIZACIÓN RÁPIDA (schemas de salida + JSON)
+# ============================================================
+# marshmallow recorre campo por campo con get_value/serialize para cada fila
+# y luego el JSON provider vuelve a recorrer todo. Para listados grandes
+# (mapa, listados, exportaciones a JSON) eso es la mayor parte del tiempo.
+#
+# - compile_dumper(schema) genera una función Python por schema que arma
+#   el dict de cada fila en una sola expresión, con las mismas conversiones
+#   que marshmallow (int(), float(), format(Decimal, "f"), isoformat()).
+#   Si el schema usa algo que no sabe replicar (Nested, Method, hooks,
+#   formatos de fecha, places...) devuelve None y se usa marshmallow.
+# - FastJSONProvider usa orjson cuando está instalado y el resultado sería
+#   idéntico al de json.dumps(sort_keys=True, ensure_ascii=True): el texto
+#   no ASCII se escapa igual que la stdlib (\u00e9) y si hay floats que la
+#   stdlib escribe en notación exponencial se usa la stdlib. Única diferencia:
+#   NaN/Infinity salen como null (la stdlib escribe NaN, que no es JSON
+#   válido); los schemas de entrada no aceptan NaN, así que no hay en la base.
+# - columns_for(schema, Model) da las columnas que el schema necesita, para
+#   consultas que devuelven tuplas en vez de objetos del ORM.
+#
+# La salida es la misma byte a byte (scripts/bench_serialization.py lo
+# verifica). FAST_SERIALIZATION=0 desactiva todo.
+
+# --- Dumpers precompilados ---
+
+_NUMBER = "None if (v := obj.{attr}) is None else {conv}(v)"
+_TEXT = "None if (v := obj.{attr}) is None else (v if v.__class__ is str else _text(v))"
+_DECIMAL_STR = "None if (v := obj.{attr}) is None else format(v if v.__class__ is Decimal else Decimal(str(v)), 'f')"
+_DECIMAL = "None if (v := obj.{attr}) is None else Decimal(str(v))"
+_DATETIME = "None if (v := obj.{attr}) is None else v.isoformat()"
+_FIELD = "_f{i}._serialize(obj.{attr}, {attr!r}, obj)"
+
+
+def _text(value):
+    # Igual que marshmallow.utils.ensure_text_type
+    return value.decode("utf-8") if isinstance(value, bytes) else str(value)
+
+
+def _expression(i, field, attr):
+    kind = type(field)
+    if kind in (fields.Integer, fields.Float):
+        if field.as_string:
+            return None
+        return _NUMBER.format(attr=attr, conv="int" if kind is fields.Integer else "float")
+    if kind is fields.Decimal:
+        if field.places is not None or field.allow_nan:
+            return None
+        return (_DECIMAL_STR if field.as_string else _DECIMAL).format(attr=attr)
+    if kind in (fields.String, fields.Email):
+        return _TEXT.format(attr=attr)
+    if kind is fields.DateTime and (field.format or "iso") in ("iso", "iso8601"):
+        return _DATETIME.format(attr=attr)
+    if kind is fields.Boolean:
+        return _FIELD.format(i=i, attr=attr)
+    return None
+
+
+def compile_dumper(schema):
+    """(dump_one, dump_many) para el schema, o None si hay que usar marshmallow"""
+    if schema._hooks[PRE_DUMP] or schema._hooks[POST_DUMP]:
+        return None
+    namespace = {"Decimal": Decimal, "_text": _text}
+    items = []
+    for i, (name, field) in enumerate(schema.dump_fields.items()):
+        attr = field.attribute or name
+        if not attr.isidentifier() or field.dump_default is not fields.missing_:
+            return None
+        expr = _expression(i, field, attr)
+        if expr is None:
+            return None
+        namespace[f"_f{i}"] = field
+        items.append(f"{field.data_key or name!r}: {expr}")
+    body = "{" + ", ".join(items) + "}"
+    source = (f"def dump_one(obj):\n    return {body}\n"
+              f"def dump_many(objs):\n    return [{body} for obj in objs]\n")
+    exec(compile(source, f"<dumper {type(schema).__name__}>", "exec"), namespace)
+    return namespace["dump_one"], namespace["dump_many"]
+
+
+# Un dumper por clase de schema y selección de campos, no por instancia:
+# `ParkingOut(many=True).dump(...)` dentro de un handler no vuelve a compilar
+_dumpers = {}
+
+
+def _dumper_key(schema):
+    return (type(schema), frozenset(schema.only) if schema.only is not None else None,
+            frozenset(schema.exclude), frozenset(schema.load_only))
+
+
+def fast_dump(schema, obj, many):
+    """Resultado del dumper precompilado, o None para seguir con marshmallow"""
+    if not config.FAST_SERIALIZATION:
+        return None
+    dumper = schema.__dict__.get("_fast_dumper", False)
+    if dumper is False:
+        key = _dumper_key(schema)
+        dumper = _dumpers.get(key, False)
+        if dumper is False:
+            dumper = _dumpers[key] = compile_dumper(schema)
+        schema._fast_dumper = dumper
+    if dumper is None or isinstance(obj, dict):
+        return None
+    try:
+        return dumper[1](obj) if many else dumper[0](obj)
+    except AttributeError:
+        # Filas sin algún atributo (dicts, objetos a medias): marshmallow lo omite
+        return None
+
+
+def columns_for(schema, model):
+    """Columnas del modelo que el schema vuelca, para query.with_entities()"""
+    return [getattr(model, field.attribute or name) for name, field in schema.dump_fields.items()]
+
+
+# --- JSON ---
+
+# Floats que json.dumps escribe distinto que orjson: |x| >= 1e16 (1e+16 vs 1e16)
+# y |x| < 1e-4 (1e-05 vs 0.00001). Empiezan con un literal para que la búsqueda
+# sea rápida; un texto que se parezca (un hash hexadecimal) solo hace usar la stdlib
+_EXPONENT = re.compile(rb"e(?<=[0-9]e)")
+_SMALL = re.compile(rb"0\.0000(?<![0-9]0\.0000)")
+_ORJSON_OPTIONS = 0
+if orjson is not None:
+    _ORJSON_OPTIONS = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+                       | orjson.OPT_PASSTHROUGH_SUBCLASS)
+
+
+def _json_ascii(error):
+    # Escapa igual que json.dumps(ensure_ascii=True): \u00e9 y pares sustitutos
+    return encode_basestring_ascii(error.object[error.start:error.end])[1:-1], error.end
+
+
+codecs.register_error("estacionape_json_ascii", _json_ascii)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+
+    def dumps_compact(self, obj):
+        """Bytes iguales a dumps(obj, separators=(",", ":")).encode()"""
+        if orjson is not None and config.FAST_SERIALIZATION:
+            option = _ORJSON_OPTIONS | (orjson.OPT_SORT_KEYS if self.sort_keys else 0)
+            try:
+                out = orjson.dumps(obj, default=self.default, option=option)
+            except TypeError:       # Llaves no str, enteros > 64 bits, tipos raros
+                out = None
+            if out is not None and not _EXPONENT.search(out) and not _SMALL.search(out):
+                if self.ensure_ascii and not out.isascii():
+                    out = out.decode().encode("ascii", "estacionape_json_ascii")
+                if self.ensure_ascii and b"\x7f" in out:
+                    out = out.replace(b"\x7f", b"\\u007f")   # DEL es ASCII pero json lo escapa
+                return out
+        return DefaultJSONProvider.dumps(self, obj, separators=(",", ":")).encode()
+
+    def response(self, *args, **kwargs):
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_compact(obj) + b"\n", mimetype=self.mimetype)
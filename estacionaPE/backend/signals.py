@@ -0,0 +1,15 @@
+from blinker import Namespace
+
+# ============================================================
+# SEÑALES INTERNAS
+# ============================================================
+# Se envían DESPUÉS del commit para que los suscriptores (stream en vivo,
+# cachés, etc.) vean datos ya confirmados.
+
+_signals = Namespace()
+
+# sender: nombre del origen (ej. "adjust_available"); kwargs: parking_ids=[...]
+parking_changed = _signals.signal("parking-changed")
+
+# sender: nombre del origen; kwargs: promotion_ids=[...], parking_ids=[...]
+promotion_changed = _signals.signal("promotion-changed")
@@ -0,0 +1,85 @@
+import time
+from sqlalchemy import case
+from sqlalchemy.exc import OperationalError
+from db import db
+from models import Parking
+
+# ============================================================
+# ASIGNACIÓN DE ESPACIOS (SIN CARRERAS)
+# ============================================================
+# Nunca leemos `available` a Python para después escribirlo: cada cambio es
+# un UPDATE condicional que la base aplica de forma atómica. Si dos pedidos
+# llegan a la vez por el último espacio, solo uno ve rowcount == 1.
+
+RETRY_ATTEMPTS = 3
+RETRY_BACKOFF_S = 0.05
+RETRY_MYSQL_ERRORS = (1205, 1213)      # Lock wait timeout, deadlock
+
+_table = Parking.__table__
+
+
+def take(parking_id):
+    """Ocupa un espacio. Devuelve False si la cochera está llena."""
+    result = db.session.execute(
+        _table.update()
+        .where(_table.c.id == parking_id, _table.c.available > 0)
+        .values(available=_table.c.available - 1)
+    )
+    return result.rowcount == 1
+
+
+def release(parking_id):
+    """Libera un espacio sin pasar de la capacidad. Devuelve False si ya estaba lleno."""
+    result = db.session.execute(
+        _table.update()
+        .where(_table.c.id == parking_id, _table.c.available < _table.c.capacity)
+        .values(available=_table.c.available + 1)
+    )
+    return result.rowcount == 1
+
+
+def _clamped(delta):
+    nuevo = _table.c.available + delta
+    return case(
+        (nuevo < 0, 0),
+        (nuevo > _table.c.capacity, _table.c.capacity),
+        else_=nuevo
+    )
+
+
+def adjust(parking_id, delta):
+    """Suma `delta` a available, recortado entre 0 y la capacidad. Devuelve el nuevo valor."""
+    db.session.execute(
+        _table.update().where(_table.c.id == parking_id).values(available=_clamped(delta))
+    )
+    return db.session.query(Parking.available).filter(Parking.id == parking_id).scalar()
+
+
+def adjust_many(parking_ids, delta):
+    """Igual que adjust() pero para varias cocheras en un solo UPDATE"""
+    db.session.execute(
+        _table.update().where(_table.c.id.in_(parking_ids)).values(available=_clamped(delta))
+    )
+
+
+def _retryable(error):
+    """Solo vale la pena reintentar si la base abortó por bloqueos; el resto falla igual"""
+    args = getattr(error.orig, "args", ())
+    if args and args[0] in RETRY_MYSQL_ERRORS:
+        return True
+    # SQLite (scripts locales): su equivalente al lock wait timeout
+    return "database is locked" in str(error.orig)
+
+
+def with_retry(fn):
+    """Ejecuta fn() y hace commit; reintenta si la base aborta por deadlock o lock timeout."""
+    for intento in range(RETRY_ATTEMPTS):
+        try:
+            result = fn()
+            db.session.commit()
+            return result
+        except OperationalError as e:
+            db.session.rollback()
+            if intento == RETRY_ATTEMPTS - 1 or not _retryable(e):
+                raise
+            time.sleep(RETRY_BACKOFF_S * (intento + 1))
@@ -0,0 +1,54 @@
+import math
+import re
+import unicodedata
+
+# ============================================================
+# BÚSQUEDA POR TRIGRAMAS
+# ============================================================
+# Cada cochera guarda en `parking_search_terms` los trigramas de su nombre,
+# dirección y distrito (sin tildes, en minúsculas). Buscar es contar cuántos
+# trigramas de la consulta tiene cada cochera: usa el índice por término,
+# ordena por parecido y tolera errores de tipeo.
+
+SEARCH_FIELDS = ("name", "address", "district")
+MIN_SIMILARITY = 0.5     # Fracción de trigramas de la consulta que deben coincidir
+
+_NO_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def normalize(text):
+    """Minúsculas, sin tildes y solo letras/números separados por espacio"""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return _NO_ALNUM.sub(" ", text.casefold()).strip()
+
+
+def word_trigrams(word, prefix=False):
+    """Trigramas de una palabra con relleno (estilo pg_trgm).
+    Con prefix=True no se cierra el final, para buscar mientras se escribe."""
+    padded = "  " + word + ("" if prefix else " ")
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def parking_terms(parking):
+    """Conjunto de trigramas a indexar para una cochera"""
+    terms = set()
+    for field in SEARCH_FIELDS:
+        for word in normalize(getattr(parking, field, None)).split():
+            terms |= word_trigrams(word)
+    return terms
+
+
+def query_terms(q):
+    """Trigramas de la consulta (la última palabra se toma como prefijo)"""
+    words = normalize(q).split()
+    terms = set()
+    for i, word in enumerate(words):
+        terms |= word_trigrams(word, prefix=(i == len(words) - 1))
+    return terms
+
+
+def min_matches(n_terms):
+    return max(1, math.ceil(n_terms * MIN_SIMILARITY))
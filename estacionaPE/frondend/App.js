@@ -100,6 +100,20 @@ const formatStaticTime = (isoString) => {
     } catch (e) { return "--:--"; }
 };
 
+// --- UTILS: LISTADOS PAGINADOS ---
+// Los listados del backend vienen por páginas: se sigue next_cursor (cabecera X-Pagination)
+const fetchAllPages = async (url, options = {}) => {
+    let items = [];
+    let cursor = null;
+    do {
+        const r = await fetch(`${url}?limit=500${cursor ? `&cursor=${encodeURIComponent(cursor)}` : ''}`, options);
+        if (!r.ok) throw new Error('Error en API');
+        items = items.concat(await r.json());
+        cursor = JSON.parse(r.headers.get('X-Pagination') || '{}').next_cursor;
+    } while (cursor);
+    return items;
+};
+
 const getLocalISOString = (date) => {
     const offset = date.getTimezoneOffset() * 60000;
     const localDate = new Date(date.getTime() - offset);
@@ -448,9 +462,8 @@ function MapScreen({ route }) {
 
   useEffect(() => {
     const fetchParkings = () => {
-        fetch(`${API_URL}/parkings/`)
-        .then(r => { if (!r.ok) throw new Error('Error en API'); return r.json(); })
-        .then(data => { if (Array.isArray(data)) setParkings(data); })
+        fetchAllPages(`${API_URL}/parkings/`)
+        .then(data => setParkings(data))
         .catch(e => console.log("Error cargando parkings:", e));
     }
     fetchParkings();
@@ -742,12 +755,10 @@ function DashboardScreen() {
   const fetchData = async () => {
     if(!user) return;
     try {
-        const resPark = await fetch(`${API_URL}/parkings/`);
-        const parkData = await resPark.json();
+        const parkData = await fetchAllPages(`${API_URL}/parkings/`);
         setParkings(parkData);
         
-        const resRes = await fetch(`${API_URL}/reservations/`, { headers: getHeaders() });
-        const allReservations = await resRes.json();
+        const allReservations = await fetchAllPages(`${API_URL}/reservations/`, { headers: getHeaders() });
         
         const myReservations = allReservations.filter(r => r.user_id === user.id);
         
@@ -815,7 +826,7 @@ function PagoQRScreen({ route, navigation }) {
                 <View style={{backgroundColor:'white', padding: 10, borderRadius: 10}}><QRCode value={`PAY:${res.id}`} size={120} /></View>
                 <Text style={{color: COLORS.textWhite, fontSize: 20, fontWeight: 'bold', marginTop: 10}}>S/ {res.total_amount}</Text>
             </View>
-            {res.status !== 'paid' ? (
+            {res.status !== 'paid' && !res.paid ? (
                 <>
                     <Text style={{color: COLORS.warning, textAlign:'center', marginBottom: 10}}>Estado: Pendiente</Text>
                     <Button text="PAGAR CON SALDO" onPress={() => handlePayment('saldo')} style={{marginBottom: 10}} />
@@ -940,7 +951,7 @@ function ProfileScreen({ navigation }) {
 function HomeScreen({ navigation }) {
   const { user, refreshUser } = useAuth();
   const [parkings, setParkings] = useState([]);
-  useFocusEffect(useCallback(() => { refreshUser(); fetch(`${API_URL}/parkings/`).then(r=>r.json()).then(data=>setParkings(data)).catch(e=>console.error(e)); }, []));
+  useFocusEffect(useCallback(() => { refreshUser(); fetchAllPages(`${API_URL}/parkings/`).then(data=>setParkings(data)).catch(e=>console.error(e)); }, []));
   const handleRegisterGarage = () => { Alert.alert("Registra tu Cochera", "Contáctanos:\n📞 +51 987 654 321", [{ text: "Llamar", onPress: () => Linking.openURL('tel:987654321') }, { text: "Cerrar" }]); }
   return (
     <SafeAreaView style={styles.container}>